@@ -0,0 +1,157 @@
+"""
+Admission control for voice sessions.
+
+Every voice session holds a live model connection, so a pod can only serve a limited number of calls well.
+The admission controller caps concurrent sessions, lets a few connections wait briefly for a free slot and
+rejects the rest immediately with a retry hint. On SIGTERM it stops admitting and waits for active calls
+to finish before handing the signal on to uvicorn.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+import threading
+from collections.abc import AsyncIterator
+from types import FrameType
+
+from telemetry import meter
+
+active_sessions_gauge = meter.create_up_down_counter(
+    "voice_agent.active_sessions",
+    description="Voice sessions with a live model connection",
+)
+queued_sessions_gauge = meter.create_up_down_counter(
+    "voice_agent.queued_sessions",
+    description="Voice connections waiting for a free session slot",
+)
+rejected_sessions_counter = meter.create_counter(
+    "voice_agent.rejected_sessions",
+    description="Voice connections rejected by admission control",
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a session is not admitted. Clients should retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Limits concurrent voice sessions with a short, bounded wait queue."""
+
+    def __init__(
+        self,
+        max_sessions: int,
+        max_queued: int,
+        queue_timeout: float,
+        retry_after: int,
+        drain_timeout: float,
+    ):
+        self.max_sessions = max_sessions
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.drain_timeout = drain_timeout
+        self.active = 0
+        self.queued = 0
+        self.draining = False
+        self._slots = asyncio.Semaphore(max_sessions)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._drain_task: asyncio.Task | None = None
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Read the limits from VOICE_AGENT_* environment variables."""
+        return cls(
+            max_sessions=int(os.environ.get("VOICE_AGENT_MAX_SESSIONS", 20)),
+            max_queued=int(os.environ.get("VOICE_AGENT_MAX_QUEUED_SESSIONS", 5)),
+            queue_timeout=float(os.environ.get("VOICE_AGENT_QUEUE_TIMEOUT_SECONDS", 2)),
+            retry_after=int(os.environ.get("VOICE_AGENT_RETRY_AFTER_SECONDS", 5)),
+            drain_timeout=float(os.environ.get("VOICE_AGENT_DRAIN_TIMEOUT_SECONDS", 25)),
+        )
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        rejected_sessions_counter.add(1, {"reason": reason})
+        return AdmissionRejected(reason, self.retry_after)
+
+    async def _acquire(self) -> None:
+        if self.draining:
+            raise self._reject("draining")
+        if self._slots.locked() and self.queued >= self.max_queued:
+            raise self._reject("overloaded")
+
+        self.queued += 1
+        queued_sessions_gauge.add(1)
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            raise self._reject("queue_timeout") from None
+        finally:
+            self.queued -= 1
+            queued_sessions_gauge.add(-1)
+
+        if self.draining:
+            self._slots.release()
+            raise self._reject("draining")
+
+    @contextlib.asynccontextmanager
+    async def session(self) -> AsyncIterator[None]:
+        """Hold a session slot for the duration of the block. Raises AdmissionRejected if none is available."""
+        await self._acquire()
+        self.active += 1
+        self._idle.clear()
+        active_sessions_gauge.add(1)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            active_sessions_gauge.add(-1)
+            self._slots.release()
+            if self.active == 0:
+                self._idle.set()
+
+    async def drain(self) -> None:
+        """Stop admitting new sessions and wait until the active ones have ended or the drain timeout passes."""
+        self.draining = True
+        logging.info(f"Draining {self.active} active voice sessions")
+        try:
+            async with asyncio.timeout(self.drain_timeout):
+                await self._idle.wait()
+        except TimeoutError:
+            logging.warning(f"Drain timeout reached with {self.active} active voice sessions")
+
+    def install_drain_handler(self) -> None:
+        """
+        Intercept SIGTERM to drain active sessions before the server's own shutdown handler runs.
+
+        Must be called from the main thread after the server installed its signal handlers (e.g. on startup).
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        server_handler = signal.getsignal(signal.SIGTERM)
+
+        async def drain_and_exit(sig: int) -> None:
+            await self.drain()
+            if callable(server_handler):
+                server_handler(sig, None)
+            else:
+                signal.raise_signal(sig)
+
+        def start_drain(sig: int) -> None:
+            self._drain_task = loop.create_task(drain_and_exit(sig))
+
+        def handle_sigterm(sig: int, frame: FrameType | None) -> None:
+            # A second SIGTERM goes straight to the server handler and skips the drain
+            signal.signal(signal.SIGTERM, server_handler)
+            self.draining = True
+            loop.call_soon_threadsafe(start_drain, sig)
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
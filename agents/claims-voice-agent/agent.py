@@ -1,18 +1,27 @@
 import logging
-from datetime import datetime
-from zoneinfo import ZoneInfo
+import os
 
+from bootstrap import CachedToolset
+from context_compaction import compact_tool_response, compaction_config
+from date_tools import get_current_date, resolve_incident_date, validate_incident_date
 from google.adk.agents import Agent
-from google.adk.planners.built_in_planner import BuiltInPlanner
 from google.adk.tools.mcp_tool.mcp_session_manager import StreamableHTTPConnectionParams
 from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
-from google.genai import types
-
-# Create MCP toolset for claims tools
-customer_database_toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url="http://customer-database:8000/mcp/",
+from planner_policy import LiveThinkingPlanner, thinking_policy
+
+# Create MCP toolset for claims tools, whose tool list is cached instead of fetched for every session
+customer_database_toolset = CachedToolset(
+    MCPToolset(
+        connection_params=StreamableHTTPConnectionParams(
+            url="http://customer-database:8000/mcp/",
+            # Live calls are admitted ahead of batch clients by the customer database, if they present its token
+            headers={
+                "X-Client-Priority": "interactive",
+                "X-Client-Token": os.environ.get("INTERACTIVE_CLIENT_TOKEN", ""),
+            },
+        ),
     ),
+    ttl_seconds=float(os.environ.get("VOICE_AGENT_TOOLS_CACHE_SECONDS", 300)),
 )
 
 
@@ -34,7 +43,7 @@ root_agent = Agent(
     model="gemini-2.5-flash-native-audio-latest",
     # model="gemini-2.5-flash-native-audio-preview-09-2025",
     name="claims_voice_agent",
-    instruction=f"""
+    instruction="""
         # Insurance Claims Agent - Strict Protocol
 
         You are a professional insurance claims specialist following a strict systematic protocol. Handle each claim step-by-step in the exact order specified.
@@ -69,14 +78,16 @@ root_agent = Agent(
         5. **License Plate**
            - Ask for license plate of damaged vehicle
            - If there is information about one or more vehicles in the user data, ask if one of them is involved in the incident, if not ask for license plate
+           - For a plate that is not in the user data, pass the caller's statement unchanged to find_by_license_plate(plate) and use the license_plate of the returned vehicle; if not_found, note the plate as stated
            - Acknowledge: "Notiert"
 
         6. **Incident Date/Time**
            - Ask when incident occurred
-           - If relative date ("gestern", "vorgestern"): use current date to calculate
-           - Current date is: {datetime.now(tz=ZoneInfo("Europe/Berlin")).strftime("%A - %d.%m.%Y, %H:%M Uhr, %Z")}
-           - Validate date is not in the future (date as well as time, e.g. if it is 10 am the incident can't happen at 4 pm at the same day) - if future date, ask for clarification
-           - ONLY repeat calculated dates: "Verstanden, den [specific date]"
+           - Pass the caller's statement unchanged to resolve_incident_date(expression) - do not calculate dates yourself
+           - If the result has is_future = true, ask for clarification
+           - If the result is not_understood, ask for the date again
+           - If the caller names an explicit date in a later turn, check it with validate_incident_date(incident_date, incident_time)
+           - ONLY repeat the returned "spoken" date: "Verstanden, den [spoken]"
 
         7. **Location**
            - Ask where incident occurred (city and street/address)
@@ -114,7 +125,7 @@ root_agent = Agent(
         - Always repeat/paraphrase user input immediately for confirmation
         - Brief acknowledgments after confirmation - vary between: "Verstanden", "Notiert", "In Ordnung", "Alles klar", "Okay", "Danke"
         - Move immediately to next step after acknowledgment
-        - Use tools proactively (get_current_date for relative dates)
+        - Use tools proactively (resolve_incident_date for any date statement)
         - Use any information already volunteered - skip questions if information was already provided
         - Listen for multiple pieces of information in one response (e.g. when the customer greets you and provides their name in one sentence or if they provide the driver when describing the incident)
 
@@ -125,7 +136,8 @@ root_agent = Agent(
         - Accept future dates without clarification
 
         ## Date Validation
-        - Use get_current_date() for any relative references
+        - Use resolve_incident_date(expression) for any date or time statement, relative or explicit
+        - Use get_current_date() only if you need today's date for anything else
         - If incident date is in the future, respond: "Das Datum liegt in der Zukunft. Können Sie das nochmal überprüfen?"
         - Only accept valid past dates or today's date
 
@@ -133,7 +145,7 @@ root_agent = Agent(
 
         **Using provided information:**
         Caller: "Gestern um 15 Uhr in München, Marienplatz hatte ich einen Auffahrunfall"
-        Agent: [uses get_current_date] "Also den 24. September 2025 um 15 Uhr in München, Marienplatz, ein Auffahrunfall bei dem Sie gefahren sind. Alles klar. Wie lautet Ihr Kennzeichen?"
+        Agent: [uses resolve_incident_date("gestern um 15 Uhr")] "Also den 24. September 2025 um 15 Uhr in München, Marienplatz, ein Auffahrunfall bei dem Sie gefahren sind. Alles klar. Wie lautet Ihr Kennzeichen?"
         [Agent extracts: Date, Location, Incident Description, Driver = Customer]
 
         **Standard flow:**
@@ -144,6 +156,11 @@ root_agent = Agent(
     tools=[
         customer_database_toolset,
         send_message,
+        get_current_date,
+        resolve_incident_date,
+        validate_incident_date,
     ],
-    planner=BuiltInPlanner(thinking_config=types.ThinkingConfig(include_thoughts=True)),
+    planner=LiveThinkingPlanner(thinking_policy),
+    # Tool responses enter the context of the live session compacted, with the claim slots filled so far
+    after_tool_callback=compact_tool_response if compaction_config.enabled else None,
 )
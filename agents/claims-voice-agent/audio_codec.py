@@ -0,0 +1,215 @@
+"""
+Audio formats of the voice WebSocket.
+
+The live model always receives 16 kHz and produces 24 kHz 16-bit mono PCM. Clients can negotiate a different
+codec and sample rates with the `codec`, `input_rate` and `output_rate` query parameters; the server converts
+between the client format and the model format, so the model input is the same for every client.
+
+- `pcm` (default): base64 encoded 16-bit PCM, as sent by the bundled frontend
+- `opus`: base64 encoded Opus packets, each prefixed with its length as 2 byte big-endian integer.
+  Needs libopus on the host and cuts the bandwidth per call by roughly an order of magnitude.
+"""
+
+import base64
+import logging
+import struct
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+try:
+    import opuslib  # type: ignore[import-untyped]
+
+    OPUS_AVAILABLE = True
+except Exception:
+    # opuslib raises a plain Exception if the libopus shared library is missing
+    opuslib = None
+    OPUS_AVAILABLE = False
+
+MODEL_INPUT_RATE = 16000
+MODEL_OUTPUT_RATE = 24000
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+OPUS_FRAME_MS = 20
+OPUS_BITRATE = 24000
+# Largest Opus packet duration is 120 ms
+OPUS_MAX_FRAME_MS = 120
+SUPPORTED_PCM_RATES = range(8000, 48001)
+
+_PACKET_LENGTH = struct.Struct(">H")
+
+
+class Resampler:
+    """
+    Streaming resampler for 16-bit mono PCM using vectorized linear interpolation.
+
+    When downsampling, a windowed-sinc low-pass filter removes frequencies above the new Nyquist frequency first.
+    Filter history and interpolation phase are carried across chunks, so chunk boundaries do not click.
+    """
+
+    def __init__(self, from_rate: int, to_rate: int, taps: int = 31):
+        # numpy is only imported by sessions that need resampling
+        import numpy as np
+
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self.step = from_rate / to_rate
+        self.fir: "np.ndarray | None" = None
+        if to_rate < from_rate:
+            cutoff = 0.45 * to_rate / from_rate
+            n = np.arange(taps) - (taps - 1) / 2
+            fir = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+            self.fir = fir / fir.sum()
+            self._history = np.zeros(taps - 1)
+        self._previous = 0.0
+        self._position = 1.0
+
+    def process(self, pcm: bytes) -> bytes:
+        """Resample a chunk of PCM. The output length follows the rate ratio across calls, not per chunk."""
+        import numpy as np
+
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float64)
+        if samples.size == 0:
+            return b""
+        if self.fir is not None:
+            padded = np.concatenate((self._history, samples))
+            self._history = padded[-(self.fir.size - 1) :]
+            samples = np.convolve(padded, self.fir, mode="valid")
+
+        # Interpolate on a block starting with the last sample of the previous chunk
+        block = np.concatenate(([self._previous], samples))
+        times = np.arange(self._position, block.size - 1, self.step)
+        output = np.interp(times, np.arange(block.size), block)
+        self._position = (times[-1] + self.step if times.size else self._position) - (block.size - 1)
+        self._previous = block[-1]
+        return np.clip(np.rint(output), -32768, 32767).astype("<i2").tobytes()
+
+
+def pack_packets(packets: list[bytes]) -> bytes:
+    """Concatenate Opus packets, each prefixed with its length."""
+    return b"".join(_PACKET_LENGTH.pack(len(packet)) + packet for packet in packets)
+
+
+def unpack_packets(data: bytes) -> list[bytes]:
+    """Split length-prefixed Opus packets."""
+    packets = []
+    offset = 0
+    while offset + _PACKET_LENGTH.size <= len(data):
+        (length,) = _PACKET_LENGTH.unpack_from(data, offset)
+        offset += _PACKET_LENGTH.size
+        packets.append(data[offset : offset + length])
+        offset += length
+    return packets
+
+
+class AudioChannel:
+    """Base64 PCM audio in the client's sample rates, resampled from and to the model rates if they differ."""
+
+    codec = "pcm"
+    mime_type = "audio/pcm"
+
+    def __init__(self, input_rate: int = MODEL_INPUT_RATE, output_rate: int = MODEL_OUTPUT_RATE):
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self._upsampler = Resampler(input_rate, MODEL_INPUT_RATE) if input_rate != MODEL_INPUT_RATE else None
+        self._downsampler = Resampler(MODEL_OUTPUT_RATE, output_rate) if output_rate != MODEL_OUTPUT_RATE else None
+        # Payload bytes on the wire, to compare the bandwidth of the codecs
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+    def describe(self) -> dict:
+        """The negotiated format, as sent to the client."""
+        return {"codec": self.codec, "input_rate": self.input_rate, "output_rate": self.output_rate}
+
+    def _decode_audio(self, payload: bytes) -> bytes:
+        return payload
+
+    def _encode_audio(self, pcm: bytes) -> bytes:
+        return pcm
+
+    def decode(self, data: str) -> bytes:
+        """Convert a client audio message to PCM for the model."""
+        self.bytes_received += len(data)
+        pcm = self._decode_audio(base64.b64decode(data))
+        return self._upsampler.process(pcm) if self._upsampler else pcm
+
+    def encode(self, pcm: bytes) -> str | None:
+        """Convert model PCM to a client audio message. Returns None if the audio is buffered for a later message."""
+        if self._downsampler:
+            pcm = self._downsampler.process(pcm)
+        payload = self._encode_audio(pcm)
+        if not payload:
+            return None
+        data = base64.b64encode(payload).decode("ascii")
+        self.bytes_sent += len(data)
+        return data
+
+    def flush(self) -> str | None:
+        """Emit audio still buffered at the end of a turn."""
+        return None
+
+    def reset(self) -> None:
+        """Drop audio still buffered, e.g. when the caller interrupts the agent."""
+
+
+class OpusChannel(AudioChannel):
+    """Opus packets of 20 ms in the client's sample rates."""
+
+    codec = "opus"
+    mime_type = "audio/opus"
+
+    def __init__(self, input_rate: int = MODEL_INPUT_RATE, output_rate: int = MODEL_OUTPUT_RATE):
+        super().__init__(input_rate, output_rate)
+        self._decoder = opuslib.Decoder(input_rate, 1)
+        self._encoder = opuslib.Encoder(output_rate, 1, opuslib.APPLICATION_VOIP)
+        self._encoder.bitrate = OPUS_BITRATE
+        self._max_decode_samples = input_rate * OPUS_MAX_FRAME_MS // 1000
+        self._frame_bytes = output_rate * OPUS_FRAME_MS // 1000 * 2
+        self._pending = b""
+
+    def _decode_audio(self, payload: bytes) -> bytes:
+        return b"".join(self._decoder.decode(packet, self._max_decode_samples) for packet in unpack_packets(payload))
+
+    def _encode_audio(self, pcm: bytes) -> bytes:
+        pcm = self._pending + pcm
+        usable = len(pcm) - len(pcm) % self._frame_bytes
+        self._pending = pcm[usable:]
+        frame_samples = self._frame_bytes // 2
+        packets = [
+            self._encoder.encode(pcm[offset : offset + self._frame_bytes], frame_samples)
+            for offset in range(0, usable, self._frame_bytes)
+        ]
+        return pack_packets(packets)
+
+    def flush(self) -> str | None:
+        if not self._pending:
+            return None
+        # Pad the last partial frame with silence
+        pcm = self._pending + bytes(self._frame_bytes - len(self._pending))
+        self._pending = b""
+        data = base64.b64encode(self._encode_audio(pcm)).decode("ascii")
+        self.bytes_sent += len(data)
+        return data
+
+    def reset(self) -> None:
+        self._pending = b""
+
+
+def negotiate_audio_channel(codec: str | None, input_rate: str | None, output_rate: str | None) -> AudioChannel:
+    """Create the audio channel for the requested format, falling back to the model format where unsupported."""
+    try:
+        rates = (int(input_rate or MODEL_INPUT_RATE), int(output_rate or MODEL_OUTPUT_RATE))
+    except ValueError:
+        rates = (MODEL_INPUT_RATE, MODEL_OUTPUT_RATE)
+
+    if codec == "opus":
+        if not OPUS_AVAILABLE:
+            logging.warning("Opus requested but libopus is not available, falling back to PCM")
+        elif all(rate in OPUS_RATES for rate in rates):
+            return OpusChannel(*rates)
+        else:
+            logging.warning(f"Unsupported Opus sample rates {rates}, falling back to PCM")
+
+    if all(rate in SUPPORTED_PCM_RATES for rate in rates):
+        return AudioChannel(*rates)
+    return AudioChannel()
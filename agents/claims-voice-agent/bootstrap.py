@@ -0,0 +1,173 @@
+"""
+Concurrent setup of a voice session.
+
+A call only starts once the model is connected, and the steps before ran one after the other: accepting the
+WebSocket, admission, loading or creating the session, listing the tools of the customer database (an MCP round
+trip on every connection, made by ADK before it connects the model) and finally the model connection, which only
+started when the first live event was read. The bootstrap overlaps them, so the setup takes about as long as its
+slowest step:
+
+- `CachedToolset` serves the tool list from memory and refreshes it in the background, so listing the tools costs
+  nothing once warmed up. The session is created while the list is fetched on a cold cache.
+- `LiveEventStream` starts the model connection as soon as the session exists, while the rest of the session is
+  set up and the greeting is sent.
+- Audio the client sends during the connect waits in the live request queue and is sent once the model is
+  connected.
+
+`BootstrapTimer` records the duration of every phase as `voice_agent.session_bootstrap` and logs them per call, up
+to the model connection, which `ConnectSignalingQueue` reports.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from typing import Any
+
+from google.adk.agents import LiveRequestQueue
+from google.adk.agents.live_request_queue import LiveRequest
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.events.event import Event
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+from telemetry import meter
+
+session_bootstrap = meter.create_histogram(
+    "voice_agent.session_bootstrap",
+    unit="ms",
+    description="Duration of the phases of a voice session's setup by phase, 'total' up to the model connection",
+)
+
+
+class BootstrapTimer:
+    """Durations of the setup phases of one session, from its creation to the model connection."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.phases: dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._last = self._started
+        self._connecting: float | None = None
+
+    def _record(self, phase: str, since: float) -> None:
+        duration_ms = (time.perf_counter() - since) * 1000
+        self.phases[phase] = duration_ms
+        session_bootstrap.record(duration_ms, {"phase": phase})
+
+    def lap(self, phase: str) -> None:
+        """End a phase that ran after the previous lap."""
+        self._record(phase, self._last)
+        self._last = time.perf_counter()
+
+    async def measure[T](self, phase: str, awaitable: Awaitable[T]) -> T:
+        """Await a phase that runs concurrently with others."""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self._record(phase, started)
+
+    def connecting(self) -> None:
+        self._connecting = time.perf_counter()
+
+    def connected(self) -> None:
+        """Called when the model connection is set up. Ends the bootstrap and logs it."""
+        if self._connecting is not None:
+            self._record("model_connect", self._connecting)
+        self._record("total", self._started)
+        phases = ", ".join(f"{phase} {duration_ms:.0f} ms" for phase, duration_ms in self.phases.items())
+        logging.info(f"Client #{self.user_id} bootstrap: {phases}")
+
+
+class ConnectSignalingQueue(LiveRequestQueue):
+    """Live request queue calling `on_connect` when ADK starts to read it, right after the model is connected."""
+
+    def __init__(self, on_connect: Callable[[], None] | None = None):
+        super().__init__()
+        self._on_connect = on_connect
+
+    async def get(self) -> LiveRequest:
+        if self._on_connect:
+            on_connect, self._on_connect = self._on_connect, None
+            on_connect()
+        return await super().get()
+
+
+class LiveEventStream:
+    """The live events of a session. Reading the first event, which connects the model, starts at construction."""
+
+    def __init__(self, events: AsyncGenerator[Event, None]):
+        self._events = events
+        self._first: asyncio.Future[Event] | None = asyncio.ensure_future(anext(events))
+
+    def __aiter__(self) -> "LiveEventStream":
+        return self
+
+    async def __anext__(self) -> Event:
+        if self._first is not None:
+            first, self._first = self._first, None
+            return await first
+        return await anext(self._events)
+
+    async def aclose(self) -> None:
+        """Stop a connect still in progress, then close the stream and with it the model connection."""
+        if self._first is not None:
+            self._first.cancel()
+            try:
+                await self._first
+            except BaseException:
+                # Cancelled, or the stream ended or failed before it was read
+                pass
+            self._first = None
+        await self._events.aclose()
+
+
+class CachedToolset(BaseToolset):
+    """
+    Serves the tool list of a toolset from memory. After `ttl_seconds`, the cached list is still returned while a
+    new one is fetched in the background. For toolsets whose tools do not depend on the context.
+    """
+
+    def __init__(self, toolset: BaseToolset, ttl_seconds: float):
+        super().__init__()
+        self.toolset = toolset
+        self.ttl_seconds = ttl_seconds
+        self._tools: list[BaseTool] | None = None
+        self._fetched_at = 0.0
+        self._fetch: asyncio.Task[list[BaseTool]] | None = None
+
+    async def _fetch_tools(self) -> list[BaseTool]:
+        tools = await self.toolset.get_tools()
+        self._tools = tools
+        self._fetched_at = time.monotonic()
+        return tools
+
+    def _start_fetch(self) -> asyncio.Task[list[BaseTool]]:
+        if self._fetch is None or self._fetch.done():
+            self._fetch = asyncio.create_task(self._fetch_tools())
+            self._fetch.add_done_callback(_log_fetch_failure)
+        return self._fetch
+
+    async def get_tools(self, readonly_context: ReadonlyContext | None = None) -> list[Any]:
+        if self._tools is None:
+            # Concurrent sessions on a cold cache share one fetch
+            return await asyncio.shield(self._start_fetch())
+        if time.monotonic() - self._fetched_at > self.ttl_seconds:
+            self._start_fetch()
+        return self._tools
+
+    async def close(self) -> None:
+        await self.toolset.close()
+
+
+def _log_fetch_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and (error := task.exception()):
+        logging.warning(f"Fetching the tool list failed: {error!r}")
+
+
+async def prefetch_tools(toolset: BaseToolset) -> None:
+    """Fill the tool cache, failures are left to the model connection, which lists the tools again."""
+    try:
+        await toolset.get_tools()
+    except Exception:
+        pass
@@ -0,0 +1,319 @@
+"""
+Recording and transcript archive of voice calls for the post-call analysis.
+
+Every call gets a directory in VOICE_AGENT_ARCHIVE_DIR. The caller and agent audio (PCM as exchanged with the
+model) and the text and transcription chunks of both sides are appended as records to segment files, which are
+rotated at a size limit. A compact transcript document (`transcript.json`) is rewritten at every completed turn
+and finalized when the call ends, so analysis flows don't have to reconstruct it from the client side.
+
+All file access happens on one writer thread. The event loop only queues records; if the writer falls behind by
+more than VOICE_AGENT_ARCHIVE_MAX_PENDING_BYTES, audio records are dropped instead of buffering without bound.
+Archived calls are read back with memory-mapped segments by `ArchiveReader`.
+"""
+
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, BinaryIO
+
+from telemetry import meter
+from transcript import CALLER, Transcript
+
+archive_bytes = meter.create_counter(
+    "voice_agent.archive_bytes",
+    unit="By",
+    description="Payload bytes written to the call archive, by record kind",
+)
+archive_dropped_bytes = meter.create_counter(
+    "voice_agent.archive_dropped_bytes",
+    unit="By",
+    description="Audio bytes not archived because the archive writer fell behind",
+)
+
+SEGMENT_MAGIC = b"VCA1"
+# Record kind, seconds since the start of the call, payload length
+RECORD_HEADER = struct.Struct("<BdI")
+TRANSCRIPT_FILE = "transcript.json"
+# Sample rates of the PCM exchanged with the live model
+INBOUND_SAMPLE_RATE = 16000
+OUTBOUND_SAMPLE_RATE = 24000
+
+
+class RecordKind(IntEnum):
+    INBOUND_AUDIO = 1
+    OUTBOUND_AUDIO = 2
+    CALLER_TEXT = 3
+    AGENT_TEXT = 4
+    # JSON payload with turn_complete / interrupted
+    TURN = 5
+
+
+@dataclass(frozen=True)
+class ArchiveRecord:
+    kind: RecordKind
+    offset_seconds: float
+    # Points into the mapped segment, valid until the reader is closed
+    payload: memoryview
+
+
+@dataclass(frozen=True)
+class ArchiveConfig:
+    # No directory disables the archive
+    directory: str | None = None
+    record_audio: bool = True
+    segment_bytes: int = 16 * 1024 * 1024
+    max_pending_bytes: int = 8 * 1024 * 1024
+
+    @classmethod
+    def from_env(cls) -> "ArchiveConfig":
+        """Read the configuration from VOICE_AGENT_ARCHIVE_* environment variables."""
+        defaults = cls()
+        return cls(
+            directory=os.environ.get("VOICE_AGENT_ARCHIVE_DIR") or None,
+            record_audio=os.environ.get("VOICE_AGENT_ARCHIVE_AUDIO", "true").lower() == "true",
+            segment_bytes=int(os.environ.get("VOICE_AGENT_ARCHIVE_SEGMENT_BYTES", defaults.segment_bytes)),
+            max_pending_bytes=int(os.environ.get("VOICE_AGENT_ARCHIVE_MAX_PENDING_BYTES", defaults.max_pending_bytes)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+
+class _ArchiveWriter:
+    """Runs the file operations of all calls in order on a single thread and bounds the queued bytes."""
+
+    def __init__(self, max_pending_bytes: int):
+        self.max_pending_bytes = max_pending_bytes
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="call-archive")
+        self._lock = threading.Lock()
+        self._pending_bytes = 0
+
+    def submit(self, size: int, droppable: bool, function: Callable[..., None], *args: Any) -> bool:
+        """Queue a file operation, returns False if it was dropped."""
+        with self._lock:
+            if droppable and self._pending_bytes + size > self.max_pending_bytes:
+                return False
+            self._pending_bytes += size
+        future = self._executor.submit(function, *args)
+        future.add_done_callback(lambda done: self._done(size, done))
+        return True
+
+    def _done(self, size: int, future: Future) -> None:
+        with self._lock:
+            self._pending_bytes -= size
+        if error := future.exception():
+            logging.error(f"Error writing the call archive: {error!r}")
+
+
+_writer: _ArchiveWriter | None = None
+
+
+def _get_writer(config: ArchiveConfig) -> _ArchiveWriter:
+    global _writer
+    if _writer is None:
+        _writer = _ArchiveWriter(config.max_pending_bytes)
+    return _writer
+
+
+class _SegmentLog:
+    """Append-only, rotating segment files of one call. Only used on the writer thread."""
+
+    def __init__(self, directory: str, segment_bytes: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segments: list[str] = []
+        self._file: BinaryIO | None = None
+        self._size = 0
+
+    def _rotate(self) -> None:
+        if self._file:
+            self._file.close()
+        name = f"segment-{len(self.segments):05d}.seg"
+        self.segments.append(name)
+        self._file = open(os.path.join(self.directory, name), "ab")
+        self._file.write(SEGMENT_MAGIC)
+        self._size = len(SEGMENT_MAGIC)
+
+    def append(self, record: bytes) -> None:
+        if self._file is None or self._size + len(record) > self.segment_bytes:
+            self._rotate()
+        assert self._file is not None
+        self._file.write(record)
+        self._size += len(record)
+
+    def flush(self) -> None:
+        if self._file:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def _write_json_atomically(path: str, document: dict) -> None:
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump(document, file, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temporary_path, path)
+
+
+class CallRecorder:
+    """Archives one call. All methods only queue work and return immediately."""
+
+    def __init__(self, config: ArchiveConfig, user_id: str, transcript: Transcript):
+        self.config = config
+        self.user_id = user_id
+        self.transcript = transcript
+        safe_user_id = re.sub(r"[^A-Za-z0-9_.-]", "_", user_id)
+        self.call_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{safe_user_id}-{uuid.uuid4().hex[:8]}"
+        assert config.directory is not None
+        self.directory = os.path.join(config.directory, self.call_id)
+        self.started_at = time.time()
+        self.inbound_audio_bytes = 0
+        self.outbound_audio_bytes = 0
+        self.dropped_bytes = 0
+        self._start = time.monotonic()
+        self._closed = False
+        self._log = _SegmentLog(self.directory, config.segment_bytes)
+        self._writer = _get_writer(config)
+        self._writer.submit(0, False, os.makedirs, self.directory, 0o755, True)
+
+    def _offset(self) -> float:
+        return time.monotonic() - self._start
+
+    def _append(self, kind: RecordKind, payload: bytes, droppable: bool = False) -> None:
+        record = RECORD_HEADER.pack(kind, self._offset(), len(payload)) + payload
+        if self._writer.submit(len(record), droppable, self._log.append, record):
+            archive_bytes.add(len(payload), {"kind": kind.name.lower()})
+        else:
+            self.dropped_bytes += len(payload)
+            archive_dropped_bytes.add(len(payload))
+
+    def inbound_audio(self, pcm: bytes) -> None:
+        """Caller audio as sent to the model (16 kHz PCM)."""
+        if self.config.record_audio and not self._closed:
+            self.inbound_audio_bytes += len(pcm)
+            self._append(RecordKind.INBOUND_AUDIO, pcm, droppable=True)
+
+    def outbound_audio(self, pcm: bytes) -> None:
+        """Agent audio as received from the model (24 kHz PCM)."""
+        if self.config.record_audio and not self._closed:
+            self.outbound_audio_bytes += len(pcm)
+            self._append(RecordKind.OUTBOUND_AUDIO, pcm, droppable=True)
+
+    def text(self, speaker: str, text: str) -> None:
+        """A text message or transcription chunk of the caller or the agent."""
+        if not self._closed:
+            self._append(RecordKind.CALLER_TEXT if speaker == CALLER else RecordKind.AGENT_TEXT, text.encode())
+
+    def turn(self, turn_complete: bool, interrupted: bool) -> None:
+        """Mark the end of a turn and update the transcript document from the call's transcript."""
+        if self._closed:
+            return
+        self._append(RecordKind.TURN, json.dumps({"turn_complete": turn_complete, "interrupted": interrupted}).encode())
+        self._write_transcript(complete=False)
+
+    def _write_transcript(self, complete: bool) -> None:
+        document = {
+            "call_id": self.call_id,
+            "user_id": self.user_id,
+            "started_at": self.started_at,
+            "ended_at": time.time() if complete else None,
+            "complete": complete,
+            "turns": self.transcript.turns,
+            "entries": list(self.transcript.entries),
+            "audio": {
+                "inbound_sample_rate": INBOUND_SAMPLE_RATE,
+                "inbound_bytes": self.inbound_audio_bytes,
+                "outbound_sample_rate": OUTBOUND_SAMPLE_RATE,
+                "outbound_bytes": self.outbound_audio_bytes,
+                "dropped_bytes": self.dropped_bytes,
+            },
+        }
+        self._writer.submit(0, False, self._flush_and_write, document, complete)
+
+    def _flush_and_write(self, document: dict, complete: bool) -> None:
+        # Runs on the writer thread, after all records queued before it
+        if complete:
+            self._log.close()
+        else:
+            self._log.flush()
+        document["segments"] = list(self._log.segments)
+        _write_json_atomically(os.path.join(self.directory, TRANSCRIPT_FILE), document)
+
+    def close(self) -> None:
+        """Finalize the transcript document and close the segment file. Safe to call more than once."""
+        if self._closed:
+            return
+        self._write_transcript(complete=True)
+        self._closed = True
+
+
+class ArchiveReader:
+    """Reads an archived call with memory-mapped segment files, for batch analysis."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._maps: list[mmap.mmap] = []
+
+    def __enter__(self) -> "ArchiveReader":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def transcript(self) -> dict:
+        with open(os.path.join(self.directory, TRANSCRIPT_FILE), encoding="utf-8") as file:
+            return json.load(file)
+
+    def _segment_maps(self) -> list[mmap.mmap]:
+        if not self._maps:
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(".seg"):
+                    continue
+                with open(os.path.join(self.directory, name), "rb") as file:
+                    if os.fstat(file.fileno()).st_size <= len(SEGMENT_MAGIC):
+                        continue
+                    segment = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if segment[: len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                    segment.close()
+                    raise ValueError(f"Not a call archive segment: {name}")
+                self._maps.append(segment)
+        return self._maps
+
+    def records(self, *kinds: RecordKind) -> Iterator[ArchiveRecord]:
+        """All records of the call in order, optionally only of the given kinds. Payloads are not copied."""
+        for segment in self._segment_maps():
+            view = memoryview(segment)
+            position = len(SEGMENT_MAGIC)
+            # A record cut off by a crash ends the segment
+            while position + RECORD_HEADER.size <= len(segment):
+                kind, offset_seconds, length = RECORD_HEADER.unpack_from(segment, position)
+                start = position + RECORD_HEADER.size
+                if start + length > len(segment):
+                    break
+                position = start + length
+                if not kinds or kind in kinds:
+                    yield ArchiveRecord(RecordKind(kind), offset_seconds, view[start:position])
+
+    def audio(self, kind: RecordKind) -> bytes:
+        """The concatenated PCM of one direction."""
+        return b"".join(record.payload for record in self.records(kind))
+
+    def close(self) -> None:
+        """Unmap the segments. Payloads of records must not be used anymore."""
+        for segment in self._maps:
+            segment.close()
+        self._maps.clear()
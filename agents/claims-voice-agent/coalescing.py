@@ -0,0 +1,106 @@
+"""
+Outbound message coalescing for the voice WebSocket.
+
+The live model emits text and transcription in many tiny chunks. Instead of one WebSocket frame (and one
+json.dumps) per chunk, consecutive text chunks of the same kind are merged for a short window or up to a size
+limit. Turn boundaries (`turn_complete` / `interrupted`) flush immediately, so the client never sees the end of
+a turn before its text.
+"""
+
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+
+from telemetry import meter
+
+frames_saved_counter = meter.create_counter(
+    "voice_agent.coalesced_frames_saved",
+    description="WebSocket frames saved by merging consecutive text chunks",
+)
+
+
+@dataclass(frozen=True)
+class CoalescingConfig:
+    # A window of 0 sends every chunk on its own
+    window_ms: int = 40
+    max_bytes: int = 1024
+
+    @classmethod
+    def from_env(cls) -> "CoalescingConfig":
+        """Read the configuration from VOICE_AGENT_COALESCE_* environment variables."""
+        defaults = cls()
+        return cls(
+            window_ms=int(os.environ.get("VOICE_AGENT_COALESCE_WINDOW_MS", defaults.window_ms)),
+            max_bytes=int(os.environ.get("VOICE_AGENT_COALESCE_MAX_BYTES", defaults.max_bytes)),
+        )
+
+
+class OutboundCoalescer:
+    """Serializes all outbound messages of a session and merges consecutive text chunks."""
+
+    def __init__(self, websocket, config: CoalescingConfig):
+        self.websocket = websocket
+        self.config = config
+        self.frames_sent = 0
+        self.frames_saved = 0
+        self._lock = asyncio.Lock()
+        self._pending: list[str] = []
+        self._pending_size = 0
+        self._pending_is_user_input = False
+        self._timer: asyncio.Task | None = None
+
+    async def _send(self, message: dict) -> None:
+        await self.websocket.send_text(json.dumps(message))
+        self.frames_sent += 1
+
+    async def _flush_pending(self) -> None:
+        if self._timer and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        if not self._pending:
+            return
+        message: dict = {"mime_type": "text/plain", "data": "".join(self._pending)}
+        if self._pending_is_user_input:
+            message["is_user_input"] = True
+        if saved := len(self._pending) - 1:
+            self.frames_saved += saved
+            frames_saved_counter.add(saved)
+        self._pending.clear()
+        self._pending_size = 0
+        await self._send(message)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.config.window_ms / 1000)
+        async with self._lock:
+            try:
+                await self._flush_pending()
+            except Exception as e:
+                # The messaging task notices a closed connection on its next send
+                print(f"Error flushing coalesced text: {e!r}")
+
+    async def send_text_chunk(self, text: str, is_user_input: bool = False) -> None:
+        """Queue a text chunk; it is sent with the following chunks of the same kind within the window."""
+        async with self._lock:
+            if self._pending and self._pending_is_user_input != is_user_input:
+                await self._flush_pending()
+            self._pending.append(text)
+            self._pending_size += len(text)
+            self._pending_is_user_input = is_user_input
+            if self.config.window_ms <= 0 or self._pending_size >= self.config.max_bytes:
+                await self._flush_pending()
+            elif self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def send(self, message: dict, flush: bool = False) -> None:
+        """Send a message right away. With `flush`, pending text is sent first (e.g. at turn boundaries)."""
+        async with self._lock:
+            if flush:
+                await self._flush_pending()
+            await self._send(message)
+
+    def close(self) -> None:
+        """Cancel a pending flush. Buffered text is dropped, the connection is gone at this point."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
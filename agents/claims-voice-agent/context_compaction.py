@@ -0,0 +1,259 @@
+"""
+Context compaction for long calls.
+
+A live model processes its whole context again on every turn. In a full claims call, that context grows with every
+step: the audio and transcriptions of both sides and the complete customer records of the lookups. The later
+steps, up to the summary, then answer slower and slower. Three measures keep the context per turn roughly flat:
+
+- Tool responses enter the context compact. `compact_tool_response`, the after tool callback of the agent, reduces
+  the customer records of get_user_data and find_by_license_plate to the fields the protocol uses. It also records
+  the claim slots the tools filled (name, customer, vehicles, plate, incident date, submission) in the session
+  state.
+- The live connection uses Gemini's context window compression. Once the context exceeds `trigger_tokens`, the
+  server drops the oldest turns down to `target_tokens`; the system instruction always stays. Every tool response
+  carries the claim slots filled so far, so they survive the turns they were filled in.
+- A conversation restored without a resumption handle is compacted before it is sent to the model. The earlier
+  turns are replaced by one summary of the claim slots and the caller's latest `summary_statements` statements as
+  said. Only the last `recent_turns` turns are kept in full. The tool calls, stale payloads and agent turns before
+  them are dropped. A summary of an earlier compaction is merged into the new one.
+
+`voice_agent.context_tokens` records the prompt tokens of every model turn, which shows whether the context stays
+flat over a call.
+"""
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from google.adk.events.event import Event
+from google.adk.events.event_actions import EventActions
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+from telemetry import meter
+
+context_tokens = meter.create_histogram(
+    "voice_agent.context_tokens",
+    unit="{token}",
+    description="Prompt tokens of the live model per turn, i.e. the size of the context it processed",
+)
+
+# Session state key of the claim slots filled by the tools
+SLOTS_KEY = "claim_slots"
+# Custom metadata key of the summary event, holds the statements it summarizes and the number of omitted ones
+SUMMARY_KEY = "compaction_summary"
+LOOKUP_TOOL = "get_user_data"
+PLATE_TOOL = "find_by_license_plate"
+CUSTOMER_FIELDS = ("first_name", "last_name", "birth_date", "customer_id")
+# Owners of vehicles found by plate need no identity verification
+OWNER_FIELDS = ("first_name", "last_name", "customer_id")
+POLICY_FIELDS = ("policy_id", "type", "status")
+VEHICLE_FIELDS = ("license_plate", "make", "model")
+
+
+@dataclass(frozen=True)
+class CompactionConfig:
+    enabled: bool = True
+    trigger_tokens: int = 16000
+    target_tokens: int = 8000
+    # Turns of a restored conversation that are kept in full, counted from the latest caller statement
+    recent_turns: int = 3
+    # Caller statements kept in the summary of the earlier turns, the latest ones
+    summary_statements: int = 20
+
+    @classmethod
+    def from_env(cls) -> "CompactionConfig":
+        """Read the configuration from VOICE_AGENT_CONTEXT_* environment variables."""
+        defaults = cls()
+        return cls(
+            enabled=os.environ.get("VOICE_AGENT_CONTEXT_COMPACTION_ENABLED", "true").lower() == "true",
+            trigger_tokens=int(os.environ.get("VOICE_AGENT_CONTEXT_TRIGGER_TOKENS", defaults.trigger_tokens)),
+            target_tokens=int(os.environ.get("VOICE_AGENT_CONTEXT_TARGET_TOKENS", defaults.target_tokens)),
+            recent_turns=int(os.environ.get("VOICE_AGENT_CONTEXT_RECENT_TURNS", defaults.recent_turns)),
+            summary_statements=int(
+                os.environ.get("VOICE_AGENT_CONTEXT_SUMMARY_STATEMENTS", defaults.summary_statements)
+            ),
+        )
+
+    def context_window_compression(self) -> types.ContextWindowCompressionConfig:
+        """Sliding window over the context of the live connection."""
+        return types.ContextWindowCompressionConfig(
+            trigger_tokens=self.trigger_tokens,
+            sliding_window=types.SlidingWindow(target_tokens=self.target_tokens),
+        )
+
+
+def _payload(response: dict) -> dict:
+    """The JSON payload of an MCP tool response, or the response of a function tool itself."""
+    for item in response.get("content") or []:
+        if item.get("type") == "text":
+            try:
+                payload = json.loads(item["text"])
+            except ValueError:
+                return response
+            return payload if isinstance(payload, dict) else response
+    return response
+
+
+def _compact_customer(customer: dict) -> dict:
+    compact = {field: customer[field] for field in CUSTOMER_FIELDS if field in customer}
+    compact["policies"] = [
+        {field: policy[field] for field in POLICY_FIELDS if field in policy}
+        | {
+            "vehicles": [
+                {field: vehicle[field] for field in VEHICLE_FIELDS if field in vehicle}
+                for vehicle in policy.get("vehicles", [])
+            ]
+        }
+        for policy in customer.get("policies", [])
+    ]
+    return compact
+
+
+def _fill_slots(slots: dict[str, Any], tool: str, args: dict[str, Any], payload: dict) -> None:
+    status = payload.get("status")
+    if tool == LOOKUP_TOOL and status == "success":
+        customer = payload["customer"]
+        slots["name"] = f"{customer.get('first_name', '')} {customer.get('last_name', '')}".strip()
+        slots["customer_id"] = customer.get("customer_id")
+        slots["vehicles"] = [
+            vehicle["license_plate"]
+            for policy in customer.get("policies", [])
+            for vehicle in policy.get("vehicles", [])
+            if "license_plate" in vehicle
+        ]
+    elif tool == PLATE_TOOL:
+        matches = payload.get("matches") or []
+        slots["license_plate"] = matches[0]["vehicle"]["license_plate"] if matches else args.get("plate")
+    elif tool == "resolve_incident_date" and status == "success" and not payload.get("is_future"):
+        slots["incident_date"] = payload["date"]
+        slots["incident_time"] = payload.get("time")
+    elif tool == "validate_incident_date" and payload.get("valid"):
+        slots["incident_date"] = args.get("incident_date")
+        slots["incident_time"] = args.get("incident_time") or None
+    elif tool == "send_message" and status == "success":
+        slots["claim_submitted"] = True
+
+
+def compact_tool_response(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, tool_response: dict
+) -> dict | None:
+    """
+    After tool callback: records the claim slots the response fills and returns the response as it enters the
+    context, with compacted customer records and the slots filled so far. None keeps a response unchanged.
+    """
+    if not isinstance(tool_response, dict):
+        return None
+    payload = _payload(tool_response)
+    slots = dict(tool_context.state.get(SLOTS_KEY) or {})
+    _fill_slots(slots, tool.name, args, payload)
+    # Assigned anew, the state only tracks changes of its top-level keys
+    tool_context.state[SLOTS_KEY] = slots
+
+    if tool.name == LOOKUP_TOOL and payload.get("status") == "success":
+        # Without the slots, they repeat what the customer record says
+        return {"status": "success", "customer": _compact_customer(payload["customer"])}
+    if tool.name == PLATE_TOOL and payload.get("matches"):
+        payload = payload | {
+            "matches": [
+                match | {"customer": {field: match.get("customer", {}).get(field) for field in OWNER_FIELDS}}
+                for match in payload["matches"]
+            ]
+        }
+    if slots:
+        payload = payload | {"claim_so_far": slots}
+    return None if payload is tool_response else payload
+
+
+def record_context_size(usage: types.GenerateContentResponseUsageMetadata) -> None:
+    if usage.prompt_token_count:
+        context_tokens.record(usage.prompt_token_count)
+
+
+def _summary(event: Event) -> dict | None:
+    """The summarized statements of a summary event of an earlier compaction, None for other events."""
+    return (event.custom_metadata or {}).get(SUMMARY_KEY)
+
+
+def _caller_text(event: Event) -> str | None:
+    if _summary(event) is not None:
+        # Written as the user, but not said by the caller
+        return None
+    transcription = event.input_transcription
+    if transcription and transcription.text and transcription.text.strip():
+        return transcription.text.strip()
+    if event.author == "user" and event.content and event.content.parts:
+        text = "".join(part.text or "" for part in event.content.parts if not part.thought).strip()
+        return text or None
+    return None
+
+
+def summarize_history(slots: dict[str, Any], statements: list[str], omitted: int = 0) -> str:
+    """The text replacing the compacted turns of a conversation."""
+    lines = ["Summary of the earlier part of this call, continue the protocol from here."]
+    if slots:
+        lines.append(f"Claim data recorded so far: {json.dumps(slots, ensure_ascii=False)}")
+    if statements:
+        lines.append("The caller said, in this order:")
+        if omitted:
+            lines.append(f"- ({omitted} earlier statements omitted)")
+        lines.extend(f"- {statement}" for statement in statements)
+    return "\n".join(lines)
+
+
+async def compact_session(session_service: BaseSessionService, session: Session, config: CompactionConfig) -> Session:
+    """
+    Replace a session with a compacted copy: the turns before the last `recent_turns` caller statements become one
+    summary, which also takes over the statements of the summary of an earlier compaction. Sessions with fewer
+    turns are returned as they are.
+    """
+    turn_starts = [
+        index
+        for index, event in enumerate(session.events)
+        if _caller_text(event) and (index == 0 or not _caller_text(session.events[index - 1]))
+    ]
+    if len(turn_starts) <= config.recent_turns:
+        return session
+    split = turn_starts[-config.recent_turns] if config.recent_turns else len(session.events)
+    statements: list[str] = []
+    omitted = 0
+    for event in session.events[:split]:
+        if (earlier := _summary(event)) is not None:
+            statements.extend(earlier["statements"])
+            omitted += earlier["omitted"]
+        elif text := _caller_text(event):
+            statements.append(text)
+    # Only the latest statements are kept, so that the summary does not grow with the call
+    dropped = max(0, len(statements) - config.summary_statements)
+    statements = statements[dropped:]
+    omitted += dropped
+    slots = session.state.get(SLOTS_KEY) or {}
+
+    compacted = await session_service.create_session(
+        app_name=session.app_name, user_id=session.user_id, state={SLOTS_KEY: slots}
+    )
+    summary = Event(
+        author="user",
+        content=types.Content(
+            role="user", parts=[types.Part.from_text(text=summarize_history(slots, statements, omitted))]
+        ),
+        custom_metadata={SUMMARY_KEY: {"statements": statements, "omitted": omitted}},
+        # Session services order the events by time, the summary takes the place of the events it replaces
+        timestamp=session.events[split - 1].timestamp,
+    )
+    await session_service.append_event(compacted, summary)
+    for event in session.events[split:]:
+        # The state the events changed is already part of the copied state
+        await session_service.append_event(compacted, event.model_copy(update={"actions": EventActions()}))
+    await session_service.delete_session(app_name=session.app_name, user_id=session.user_id, session_id=session.id)
+    logging.info(
+        f"Compacted the history of user {session.user_id}: {len(session.events)} events, "
+        f"{len(statements)} caller statements summarized, {len(compacted.events) - 1} events kept"
+    )
+    return compacted
+
+
+compaction_config = CompactionConfig.from_env()
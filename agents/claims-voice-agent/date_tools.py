@@ -0,0 +1,241 @@
+"""
+In-process date tools for the claims voice agent.
+
+The live model calls these instead of reasoning about calendar arithmetic itself. All tools are pure
+functions over the Europe/Berlin wall clock and return plain dicts, so they answer without a network hop.
+"""
+
+import re
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+TIMEZONE = ZoneInfo("Europe/Berlin")
+
+WEEKDAYS = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"]
+MONTHS = [
+    "Januar",
+    "Februar",
+    "März",
+    "April",
+    "Mai",
+    "Juni",
+    "Juli",
+    "August",
+    "September",
+    "Oktober",
+    "November",
+    "Dezember",
+]
+
+_WEEKDAY_INDEX = {name.lower(): index for index, name in enumerate(WEEKDAYS)}
+_MONTH_INDEX = {name.lower(): index + 1 for index, name in enumerate(MONTHS)}
+_MONTH_INDEX["maerz"] = 3
+
+_DAY_OFFSETS = {"heute": 0, "gestern": 1, "vorgestern": 2}
+_NUMBER_WORDS = {
+    "einem": 1,
+    "einen": 1,
+    "einer": 1,
+    "eins": 1,
+    "ein": 1,
+    "zwei": 2,
+    "drei": 3,
+    "vier": 4,
+    "fünf": 5,
+    "sechs": 6,
+    "sieben": 7,
+    "acht": 8,
+    "neun": 9,
+    "zehn": 10,
+    "elf": 11,
+    "zwölf": 12,
+}
+# Day parts shift ambiguous 12-hour statements ("um 3 Uhr nachmittags") into the afternoon
+_AFTERNOON_WORDS = ("nachmittag", "abend")
+# At night, only late evening hours are shifted ("um 10 Uhr nachts"), early hours stay ("um 2 Uhr nachts")
+_NIGHT_WORDS = ("nacht",)
+_LATE_EVENING_HOURS = range(9, 12)
+
+_NUMBER = r"(\d+|" + "|".join(_NUMBER_WORDS) + r")"
+_RE_RELATIVE_DAY = re.compile(r"\b(vorgestern|gestern|heute)\b")
+_RE_DAYS_AGO = re.compile(r"\bvor\s+" + _NUMBER + r"\s+tag(?:en)?\b")
+_RE_WEEKS_AGO = re.compile(r"\bvor\s+" + _NUMBER + r"\s+woche(?:n)?\b")
+_RE_WEEKDAY = re.compile(r"\b(letzte[nrsm]?\s+)?(" + "|".join(_WEEKDAY_INDEX) + r")\b")
+_RE_NUMERIC_DATE = re.compile(r"\b(\d{1,2})\.\s?(\d{1,2})\.(?:\s?(\d{2,4}))?")
+_RE_ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_RE_SPOKEN_DATE = re.compile(r"\b(\d{1,2})\.?\s+(" + "|".join(_MONTH_INDEX) + r")(?:\s+(\d{4}))?\b")
+_RE_CLOCK_TIME = re.compile(r"\b(\d{1,2})[:.](\d{2})\b(?!\.)")
+_RE_HOUR_TIME = re.compile(r"\b(\d{1,2})\s*uhr(?:\s*(\d{1,2}))?\b")
+_RE_HALF_HOUR = re.compile(r"\bhalb\s+" + _NUMBER + r"\b")
+_RE_AT_HOUR = re.compile(r"\bum\s+(\d{1,2})\b(?![.:])")
+
+
+def _now() -> datetime:
+    return datetime.now(tz=TIMEZONE)
+
+
+def _to_int(value: str) -> int:
+    return int(value) if value.isdigit() else _NUMBER_WORDS[value]
+
+
+def format_date(value: date) -> str:
+    """Format a date the way the agent reads it back, e.g. 'Mittwoch, 24. September 2025'."""
+    return f"{WEEKDAYS[value.weekday()]}, {value.day}. {MONTHS[value.month - 1]} {value.year}"
+
+
+def _format_datetime(value: datetime, has_time: bool) -> str:
+    spoken = format_date(value.date())
+    if has_time:
+        spoken += f" um {value.strftime('%H:%M')} Uhr"
+    return spoken
+
+
+def _recent_date(month: int, day: int, today: date) -> date:
+    """A date stated without year: this year's, or last year's if this year's still lies ahead."""
+    if (month, day) > (today.month, today.day):
+        return date(today.year - 1, month, day)
+    return date(today.year, month, day)
+
+
+def _parse_date(text: str, today: date) -> date | None:
+    if match := _RE_ISO_DATE.search(text):
+        return date(int(match[1]), int(match[2]), int(match[3]))
+    if match := _RE_SPOKEN_DATE.search(text):
+        if match[3]:
+            return date(int(match[3]), _MONTH_INDEX[match[2]], int(match[1]))
+        return _recent_date(_MONTH_INDEX[match[2]], int(match[1]), today)
+    if match := _RE_NUMERIC_DATE.search(text):
+        if match[3]:
+            return date(int(match[3]) + (2000 if len(match[3]) == 2 else 0), int(match[2]), int(match[1]))
+        return _recent_date(int(match[2]), int(match[1]), today)
+    if match := _RE_RELATIVE_DAY.search(text):
+        return today - timedelta(days=_DAY_OFFSETS[match[1]])
+    if match := _RE_DAYS_AGO.search(text):
+        return today - timedelta(days=_to_int(match[1]))
+    if match := _RE_WEEKS_AGO.search(text):
+        return today - timedelta(weeks=_to_int(match[1]))
+    if match := _RE_WEEKDAY.search(text):
+        # A bare weekday refers to its most recent occurrence, "letzten Montag" to the one of the previous week
+        days_back = (today.weekday() - _WEEKDAY_INDEX[match[2]]) % 7
+        if match[1] and days_back == 0:
+            days_back = 7
+        return today - timedelta(days=days_back)
+    return None
+
+
+def _parse_time(text: str) -> time | None:
+    hour: int | None = None
+    minute = 0
+    if match := _RE_CLOCK_TIME.search(text):
+        hour, minute = int(match[1]), int(match[2])
+    elif match := _RE_HOUR_TIME.search(text):
+        hour, minute = int(match[1]), int(match[2] or 0)
+    elif match := _RE_HALF_HOUR.search(text):
+        hour, minute = (_to_int(match[1]) - 1) % 24, 30
+    elif match := _RE_AT_HOUR.search(text):
+        hour = int(match[1])
+    if hour is None:
+        return None
+    if any(word in text for word in _NIGHT_WORDS):
+        if hour == 12:
+            hour = 0
+        elif hour in _LATE_EVENING_HOURS:
+            hour += 12
+    elif hour < 12 and any(word in text for word in _AFTERNOON_WORDS):
+        hour += 12
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def get_current_date() -> dict:
+    """
+    Get the current date and time in Germany (Europe/Berlin).
+
+    Returns:
+        Dictionary with the current date (YYYY-MM-DD), weekday, time (HH:MM) and a spoken German form.
+    """
+    now = _now()
+    return {
+        "status": "success",
+        "date": now.date().isoformat(),
+        "weekday": WEEKDAYS[now.weekday()],
+        "time": now.strftime("%H:%M"),
+        "timezone": now.strftime("%Z"),
+        "spoken": _format_datetime(now, has_time=True),
+    }
+
+
+def resolve_incident_date(expression: str) -> dict:
+    """
+    Resolve a German date/time statement of the caller to a concrete timestamp in Europe/Berlin.
+
+    Understands relative days ("gestern", "vorgestern", "vor 3 Tagen", "letzten Montag"), explicit dates
+    ("24.09.2025", "24. September") and times ("um 15 Uhr", "15:30", "halb drei nachmittags").
+    The result is also validated against the current time.
+
+    Args:
+        expression: The caller's statement about when the incident happened, e.g. "gestern um 15 Uhr"
+
+    Returns:
+        Dictionary with the resolved date (YYYY-MM-DD), time (HH:MM or null if not stated), whether the
+        timestamp lies in the future, and the spoken German form to repeat to the caller.
+    """
+    now = _now()
+    text = expression.lower().strip()
+    try:
+        incident_date = _parse_date(text, now.date())
+    except ValueError:
+        incident_date = None
+    if incident_date is None:
+        return {
+            "status": "not_understood",
+            "message": "Could not determine a date from the statement. Ask the caller for the date.",
+        }
+
+    incident_time = _parse_time(text)
+    timestamp = datetime.combine(incident_date, incident_time or time(0, 0), tzinfo=TIMEZONE)
+    is_future = timestamp > now if incident_time else incident_date > now.date()
+    return {
+        "status": "success",
+        "date": incident_date.isoformat(),
+        "time": incident_time.strftime("%H:%M") if incident_time else None,
+        "timestamp": timestamp.isoformat() if incident_time else None,
+        "is_future": is_future,
+        "spoken": _format_datetime(timestamp, has_time=incident_time is not None),
+    }
+
+
+def validate_incident_date(incident_date: str, incident_time: str = "") -> dict:
+    """
+    Check that an incident date (and optional time) is not in the future.
+
+    Args:
+        incident_date: Date of the incident in YYYY-MM-DD or DD.MM.YYYY format
+        incident_time: Optional time of the incident in HH:MM format
+
+    Returns:
+        Dictionary with "valid" set to false if the timestamp lies in the future or could not be parsed.
+    """
+    now = _now()
+    try:
+        if "." in incident_date:
+            parsed_date = datetime.strptime(incident_date.strip(), "%d.%m.%Y").date()
+        else:
+            parsed_date = date.fromisoformat(incident_date.strip())
+        parsed_time = time.fromisoformat(incident_time.strip()) if incident_time.strip() else None
+    except ValueError:
+        return {"status": "invalid", "valid": False, "message": "Date or time format not recognized."}
+
+    if parsed_time is None:
+        is_future = parsed_date > now.date()
+    else:
+        is_future = datetime.combine(parsed_date, parsed_time, tzinfo=TIMEZONE) > now
+    return {
+        "status": "success",
+        "valid": not is_future,
+        "is_future": is_future,
+        "spoken": _format_datetime(
+            datetime.combine(parsed_date, parsed_time or time(0, 0)), has_time=parsed_time is not None
+        ),
+    }
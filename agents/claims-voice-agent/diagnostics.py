@@ -0,0 +1,164 @@
+"""
+Diagnostics of the event loop for stuttering calls.
+
+All sessions of a worker share one asyncio loop, so a callback that blocks it, e.g. encoding a large message, a
+synchronous print to a slow stdout or a send that does not yield, delays the audio of every call. The loop lag
+monitor schedules a tick every interval and records how late it runs as `voice_agent.event_loop_lag`. A watchdog
+thread checks that the ticks keep coming: when the loop is blocked for longer than the slow callback threshold, it
+logs the stack of the loop thread at that moment, which shows the blocking code itself.
+
+The sampling profiler behind `/admin/profile` samples the stacks of all threads for a few seconds and returns them
+in the collapsed stack format ("thread;frame;frame count" per line), which flamegraph.pl, speedscope and inferno
+read directly. It is only available with VOICE_AGENT_ADMIN_TOKEN set and requires that token as a bearer token.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from dataclasses import dataclass
+from types import FrameType
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from telemetry import meter
+
+event_loop_lag = meter.create_histogram(
+    "voice_agent.event_loop_lag",
+    unit="ms",
+    description="Delay of the loop lag monitor's ticks behind their schedule",
+)
+event_loop_stalls = meter.create_counter(
+    "voice_agent.event_loop_stalls",
+    description="Times the event loop was blocked for longer than the slow callback threshold",
+)
+
+ADMIN_TOKEN = os.environ.get("VOICE_AGENT_ADMIN_TOKEN")
+MAX_PROFILE_SECONDS = 60.0
+MIN_PROFILE_INTERVAL_MS = 1.0
+
+
+@dataclass(frozen=True)
+class LoopMonitorConfig:
+    enabled: bool = True
+    interval_ms: float = 50.0
+    slow_callback_ms: float = 100.0
+
+    @classmethod
+    def from_env(cls) -> "LoopMonitorConfig":
+        """Read the settings from VOICE_AGENT_LOOP_* environment variables."""
+        return cls(
+            enabled=os.environ.get("VOICE_AGENT_LOOP_MONITOR_ENABLED", "true").lower() == "true",
+            interval_ms=float(os.environ.get("VOICE_AGENT_LOOP_MONITOR_INTERVAL_MS", cls.interval_ms)),
+            slow_callback_ms=float(os.environ.get("VOICE_AGENT_LOOP_SLOW_CALLBACK_MS", cls.slow_callback_ms)),
+        )
+
+
+class LoopLagMonitor:
+    """Measures the lag of the running loop and logs the stack of the loop thread when it is blocked."""
+
+    def __init__(self, config: LoopMonitorConfig):
+        self.config = config
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start monitoring the running loop. Must be called on the loop."""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _tick(self) -> None:
+        interval = self.config.interval_ms / 1000
+        while True:
+            scheduled = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag_ms = (now - scheduled) * 1000
+            event_loop_lag.record(lag_ms)
+            if lag_ms > self.config.slow_callback_ms:
+                logging.warning(f"Event loop was blocked for {lag_ms:.0f} ms")
+
+    def _watch(self) -> None:
+        """Log the stack of the loop thread once per stall, while it is still blocked."""
+        threshold = self.config.slow_callback_ms / 1000
+        reported = 0.0
+        while not self._stopped.wait(self.config.interval_ms / 1000):
+            heartbeat = self._heartbeat
+            if heartbeat == reported or time.monotonic() - heartbeat <= threshold + self.config.interval_ms / 1000:
+                continue
+            reported = heartbeat
+            event_loop_stalls.add(1)
+            frame = sys._current_frames().get(self._loop_thread_id or 0)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(loop thread not found)\n"
+            logging.warning(f"Event loop blocked for more than {self.config.slow_callback_ms:.0f} ms in:\n{stack}")
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def sample_stacks(seconds: float, interval: float) -> str:
+    """Sample the stacks of all other threads and return them as collapsed stacks, most frequent first."""
+    threads = {thread.ident: thread.name for thread in threading.enumerate()}
+    own_id = threading.get_ident()
+    stacks: Counter[str] = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            current: FrameType | None = frame
+            while current is not None:
+                labels.append(_frame_label(current))
+                current = current.f_back
+            labels.append(threads.get(thread_id, f"thread-{thread_id}"))
+            stacks[";".join(reversed(labels))] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+_profile_lock = asyncio.Lock()
+
+
+async def profile_endpoint(request: Request) -> Response:
+    """Profile all threads for `seconds` (default 10) every `interval_ms` (default 10) as collapsed stacks."""
+    if not ADMIN_TOKEN:
+        return JSONResponse({"error": "not found"}, status_code=404)
+    token = request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    try:
+        seconds = float(request.query_params.get("seconds", 10))
+        interval_ms = float(request.query_params.get("interval_ms", 10))
+    except ValueError:
+        return JSONResponse({"error": "seconds and interval_ms must be numbers"}, status_code=400)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or interval_ms < MIN_PROFILE_INTERVAL_MS:
+        return JSONResponse(
+            {"error": f"seconds must be up to {MAX_PROFILE_SECONDS}, interval_ms at least {MIN_PROFILE_INTERVAL_MS}"},
+            status_code=400,
+        )
+    if _profile_lock.locked():
+        return JSONResponse({"error": "a profile is already running"}, status_code=409)
+
+    async with _profile_lock:
+        logging.info(f"Profiling for {seconds}s every {interval_ms} ms")
+        # The sampler runs on its own thread, so the loop keeps serving calls and shows up in the samples
+        profile = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000)
+    return PlainTextResponse(profile)
@@ -0,0 +1,267 @@
+"""
+Recording and replay of the live event stream of voice sessions, to reproduce latency problems offline.
+
+With VOICE_AGENT_EVENT_LOG_DIR set, every session writes a binary log with the exact sequence and timing of the
+events from `runner.run_live` and of the frames received from the client. Audio of events is stored raw next to
+the event JSON instead of base64 encoded. Records are buffered and written on a background thread.
+
+A log is replayed through the real messaging functions of main.py, against a fake WebSocket and without a model
+connection, at the original or an accelerated speed:
+
+    uv run python event_log.py <log file> [--speed 10]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import struct
+import time
+import uuid
+from collections import deque
+from collections.abc import AsyncGenerator, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import BinaryIO
+
+from google.adk.events.event import Event
+
+EVENT_LOG_DIR = os.environ.get("VOICE_AGENT_EVENT_LOG_DIR")
+
+LOG_MAGIC = b"VEL1"
+# Record kind, seconds since the start of the session, payload length
+RECORD_HEADER = struct.Struct("<BdI")
+# Length of the event JSON in an event record, followed by the raw audio of the event
+EVENT_JSON_LENGTH = struct.Struct("<I")
+FLUSH_BYTES = 64 * 1024
+# Audio is the inline data of the first part, see agent_to_client_messaging
+_EXCLUDE_AUDIO = {"content": {"parts": {0: {"inline_data": {"data"}}}}}
+
+
+class RecordKind(IntEnum):
+    # JSON with the connection parameters of the session
+    METADATA = 0
+    EVENT = 1
+    CLIENT_FRAME = 2
+    # End of the session
+    CLOSE = 3
+
+
+@dataclass(frozen=True)
+class LoggedRecord:
+    kind: RecordKind
+    offset_seconds: float
+    payload: bytes
+
+    def event(self) -> Event:
+        """The live event of an EVENT record."""
+        (json_length,) = EVENT_JSON_LENGTH.unpack_from(self.payload)
+        start = EVENT_JSON_LENGTH.size
+        event = Event.model_validate_json(self.payload[start : start + json_length])
+        if audio := self.payload[start + json_length :]:
+            assert event.content and event.content.parts and event.content.parts[0].inline_data
+            event.content.parts[0].inline_data.data = audio
+        return event
+
+
+_writer: ThreadPoolExecutor | None = None
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+    if _writer is None:
+        _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-log")
+    return _writer
+
+
+class EventLogRecorder:
+    """Records the live events and client frames of one session. Only buffers on the event loop."""
+
+    def __init__(self, path: str, metadata: dict):
+        self.path = path
+        self._start = time.monotonic()
+        self._buffer = bytearray(LOG_MAGIC)
+        self._file: BinaryIO | None = None
+        self._closed = False
+        self._append(RecordKind.METADATA, json.dumps(metadata).encode())
+
+    @classmethod
+    def for_session(cls, user_id: str, metadata: dict) -> "EventLogRecorder":
+        """A recorder writing to a new file in EVENT_LOG_DIR."""
+        assert EVENT_LOG_DIR is not None
+        safe_user_id = re.sub(r"[^A-Za-z0-9_.-]", "_", user_id)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{safe_user_id}-{uuid.uuid4().hex[:8]}.evlog"
+        return cls(os.path.join(EVENT_LOG_DIR, name), metadata)
+
+    def _append(self, kind: RecordKind, *payload: bytes) -> None:
+        self._buffer += RECORD_HEADER.pack(kind, time.monotonic() - self._start, sum(map(len, payload)))
+        for part in payload:
+            self._buffer += part
+        if len(self._buffer) >= FLUSH_BYTES:
+            self._flush()
+
+    def _flush(self) -> None:
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        _get_writer().submit(self._write, chunk)
+
+    def _write(self, chunk: bytes | None) -> None:
+        # Runs on the writer thread, None closes the file
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        if chunk is None:
+            self._file.close()
+        else:
+            self._file.write(chunk)
+
+    def event(self, event: Event) -> None:
+        if self._closed:
+            return
+        part = event.content and event.content.parts and event.content.parts[0]
+        audio = part.inline_data.data if part and part.inline_data and part.inline_data.data else b""
+        event_json = event.model_dump_json(exclude_none=True, exclude=_EXCLUDE_AUDIO if audio else None).encode()
+        self._append(RecordKind.EVENT, EVENT_JSON_LENGTH.pack(len(event_json)), event_json, audio)
+
+    def client_frame(self, text: str) -> None:
+        if not self._closed:
+            self._append(RecordKind.CLIENT_FRAME, text.encode())
+
+    def close(self) -> None:
+        """Write the remaining records and close the file. Safe to call more than once."""
+        if self._closed:
+            return
+        self._append(RecordKind.CLOSE)
+        self._closed = True
+        self._flush()
+        _get_writer().submit(self._write, None)
+
+
+def read_event_log(path: str) -> Iterator[LoggedRecord]:
+    """The records of a log in order. A record cut off by a crash ends the log."""
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(LOG_MAGIC):
+        raise ValueError(f"Not an event log: {path}")
+    position = len(LOG_MAGIC)
+    while position + RECORD_HEADER.size <= len(data):
+        kind, offset_seconds, length = RECORD_HEADER.unpack_from(data, position)
+        start = position + RECORD_HEADER.size
+        if start + length > len(data):
+            return
+        position = start + length
+        yield LoggedRecord(RecordKind(kind), offset_seconds, data[start:position])
+
+
+class _ReplayClock:
+    """Maps the offsets of the log to the replay time. A speed of 0 replays as fast as possible."""
+
+    def __init__(self, speed: float):
+        self.speed = speed
+        self._start = time.monotonic()
+
+    async def wait_until(self, offset_seconds: float) -> None:
+        if self.speed <= 0:
+            await asyncio.sleep(0)
+            return
+        await asyncio.sleep(max(0.0, self._start + offset_seconds / self.speed - time.monotonic()))
+
+
+class ReplayWebSocket:
+    """Stands in for the client: sends the logged client frames on time and counts what the server sends."""
+
+    def __init__(self, frames: list[LoggedRecord], end_offset: float, clock: _ReplayClock):
+        self.frames = deque(frames)
+        self.end_offset = end_offset
+        self.clock = clock
+        # The client only disconnects after the last event, also when replaying without waiting
+        self.events_replayed = asyncio.Event()
+        self.frames_sent = 0
+        self.bytes_sent = 0
+
+    async def receive_text(self) -> str:
+        from starlette.websockets import WebSocketDisconnect
+
+        if not self.frames:
+            await self.clock.wait_until(self.end_offset)
+            await self.events_replayed.wait()
+            raise WebSocketDisconnect()
+        frame = self.frames.popleft()
+        await self.clock.wait_until(frame.offset_seconds)
+        return frame.payload.decode()
+
+    async def send_text(self, text: str) -> None:
+        self.frames_sent += 1
+        self.bytes_sent += len(text)
+
+
+async def _replay_events(events: list[LoggedRecord], websocket: ReplayWebSocket) -> AsyncGenerator[Event]:
+    for record in events:
+        await websocket.clock.wait_until(record.offset_seconds)
+        yield record.event()
+    websocket.events_replayed.set()
+    # Like a live stream, the events only end with the session
+    await asyncio.Event().wait()
+
+
+async def replay(path: str, speed: float = 1.0) -> dict:
+    """Replay a log through the messaging functions of main.py and return statistics of the run."""
+    import main
+    from audio_codec import negotiate_audio_channel
+    from bootstrap import LiveEventStream
+    from coalescing import OutboundCoalescer
+    from google.adk.agents import LiveRequestQueue
+    from telemetry import TurnLatencyTracker
+    from transcript import Transcript
+    from vad import VoiceActivityDetector
+    from voice_session import VoiceSession
+
+    records = list(read_event_log(path))
+    metadata = json.loads(records[0].payload)
+    end_offset = records[-1].offset_seconds
+    events = [record for record in records if record.kind is RecordKind.EVENT]
+    frames = [record for record in records if record.kind is RecordKind.CLIENT_FRAME]
+
+    clock = _ReplayClock(speed)
+    websocket = ReplayWebSocket(frames, end_offset, clock)
+    live_events = LiveEventStream(_replay_events(events, websocket))
+    live_request_queue = LiveRequestQueue()
+    is_audio = metadata.get("is_audio", "false")
+    audio_channel = negotiate_audio_channel(
+        metadata.get("codec"), metadata.get("input_rate"), metadata.get("output_rate")
+    )
+    vad = VoiceActivityDetector(main.vad_config) if is_audio == "true" and main.vad_config.enabled else None
+    session = VoiceSession(
+        metadata.get("user_id", "replay"),
+        live_events,
+        live_request_queue,
+        TurnLatencyTracker({"thinking_policy": "replay", "is_audio": is_audio}),
+        audio_channel,
+        OutboundCoalescer(websocket, main.coalescing_config),
+        Transcript(),
+        vad,
+    )
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    await session.run(
+        main.agent_to_client_messaging(websocket, live_events, session),
+        main.client_to_agent_messaging(websocket, live_request_queue, session),
+    )
+    return {
+        "log_seconds": round(end_offset, 3),
+        "replay_seconds": round(time.perf_counter() - wall_start, 3),
+        "cpu_seconds": round(time.process_time() - cpu_start, 3),
+        "events": len(events),
+        "client_frames": len(frames),
+        "frames_sent": websocket.frames_sent,
+        "bytes_sent": websocket.bytes_sent,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the event log of a voice session")
+    parser.add_argument("path", help="Event log file")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor, 0 replays without waiting")
+    arguments = parser.parse_args()
+    print(json.dumps(asyncio.run(replay(arguments.path, arguments.speed)), indent=2))
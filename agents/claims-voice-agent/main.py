@@ -1,102 +1,220 @@
 import asyncio
-import base64
+import contextlib
 import json
 import os
 import warnings
 
-from agent import root_agent
+from admission import AdmissionController, AdmissionRejected
+from agent import customer_database_toolset, root_agent
+from audio_codec import negotiate_audio_channel
+from bootstrap import BootstrapTimer, ConnectSignalingQueue, LiveEventStream, prefetch_tools
+from call_archive import ArchiveConfig, CallRecorder
+from coalescing import CoalescingConfig, OutboundCoalescer
+from context_compaction import compact_session, compaction_config, record_context_size
+from diagnostics import LoopLagMonitor, LoopMonitorConfig, profile_endpoint
+from event_log import EVENT_LOG_DIR, EventLogRecorder
 from agenticlayer.agent_to_a2a import to_a2a  # type: ignore[import-untyped]
 from dotenv import load_dotenv
-from google.adk.agents import LiveRequestQueue
 from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.events.event import Event
-from google.adk.runners import InMemoryRunner
 from google.genai import types
 from google.genai.types import (
     Blob,
     Content,
     Part,
 )
-from starlette.responses import RedirectResponse
+from planner_policy import thinking_policy
+from post_call import PostCallAnalyzer, PostCallConfig
+from prompt_audio import GREETING, PROMPT_PHRASES, PromptAudioCache, PromptAudioConfig, play_prompt
+from session_state import create_runner, create_session_state_store, issue_resume_token
+from readiness import Readiness
+from starlette.responses import JSONResponse, RedirectResponse
 from starlette.routing import Route, WebSocketRoute
 from starlette.websockets import WebSocket
+from telemetry import TurnLatencyTracker
+from transcript import AGENT, CALLER, Transcript
+from vad import VadConfig, VadSignal, VoiceActivityDetector
+from voice_session import VoiceSession
 
 warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 
 load_dotenv()
 
-APP_NAME = "Claims Voice Agent"
+if os.environ.get("AGENT_OTEL_ENABLED", "false").lower() == "true":
+    from agenticlayer.otel import setup_otel  # type: ignore[import-untyped]
 
+    setup_otel()
 
-async def start_agent_session(user_id, is_audio=False):
-    """Starts an agent session"""
+APP_NAME = "Claims Voice Agent"
+VOICE_NAME = "Charon"  # See available voices at https://ai.google.dev/gemini-api/docs/speech-generation#voices
+LANGUAGE_CODE = "de-DE"
+
+admission = AdmissionController.from_env()
+vad_config = VadConfig.from_env()
+coalescing_config = CoalescingConfig.from_env()
+archive_config = ArchiveConfig.from_env()
+post_call_config = PostCallConfig.from_env()
+loop_monitor_config = LoopMonitorConfig.from_env()
+prompt_audio_config = PromptAudioConfig.from_env()
+prompt_audio = PromptAudioCache(prompt_audio_config, VOICE_NAME, LANGUAGE_CODE) if prompt_audio_config.enabled else None
+post_call = PostCallAnalyzer(post_call_config, [customer_database_toolset]) if post_call_config.enabled else None
+session_store = create_session_state_store()
+readiness = Readiness()
+
+
+async def start_agent_session(user_id, resume_token=None, is_audio=False, greeting=None, on_connect=None):
+    """
+    Starts an agent session and its model connection, calling on_connect once connected. A greeting text is added
+    to the history of a new conversation as said by the agent, returns whether it was added. Returns the resume
+    token of the call as well: the one presented if it continues a call, or a new one.
+    """
 
     # Create a Runner
-    runner = InMemoryRunner(
-        app_name=APP_NAME,
-        agent=root_agent,
-    )
+    runner = create_runner(APP_NAME, root_agent)
+
+    # Continue the call of the resume token, possibly served by another worker: resume the live session with its
+    # handle, or restore the conversation history if only the session is left
+    previous = await session_store.load(user_id, resume_token)
+    if previous is None:
+        resume_token = issue_resume_token()
+    resumption_handle = previous.resumption_handle if previous else None
+    previous_session = None
+    if previous:
+        previous_session = await runner.session_service.get_session(
+            app_name=APP_NAME,
+            user_id=user_id,
+            session_id=previous.session_id,
+        )
+    session = None
+    if previous_session is not None and not resumption_handle:
+        session = previous_session
+        # The whole history is sent to the model on connect, long calls continue with a compacted one
+        if compaction_config.enabled:
+            session = await compact_session(runner.session_service, session, compaction_config)
 
     # Create a Session
-    session = await runner.session_service.create_session(
-        app_name=APP_NAME,
-        user_id=user_id,
-    )
+    greeted = False
+    replaced_session = None
+    if session is None:
+        # Resumed with a handle, the model still has the conversation and would receive the history once more: the
+        # session starts without history, but with the state of the call, e.g. the claim slots filled so far
+        session = await runner.session_service.create_session(
+            app_name=APP_NAME,
+            user_id=user_id,
+            state=dict(previous_session.state) if previous_session else None,
+        )
+        replaced_session = previous_session
+        # The history is sent to the model on connect, which then waits for the caller instead of greeting
+        if greeting and not resumption_handle:
+            greeting_event = Event(
+                author=root_agent.name, content=Content(role="model", parts=[Part.from_text(text=greeting)])
+            )
+            await runner.session_service.append_event(session, greeting_event)
+            greeted = True
+    expired = await session_store.save(user_id, resume_token, session.id, resumption_handle)
+    # Sessions no call refers to anymore are deleted, a shared session database would grow with every call otherwise
+    stale = [(record.user_id, record.session_id) for record in expired]
+    if replaced_session is not None:
+        stale.append((user_id, replaced_session.id))
+    for stale_user_id, stale_session_id in stale:
+        await runner.session_service.delete_session(
+            app_name=APP_NAME, user_id=stale_user_id, session_id=stale_session_id
+        )
 
     # Set response modality
     modality = "AUDIO" if is_audio else "TEXT"
     run_config = RunConfig(
         response_modalities=[modality],
-        session_resumption=types.SessionResumptionConfig(),
+        session_resumption=types.SessionResumptionConfig(handle=resumption_handle),
         speech_config=types.SpeechConfig(
-            voice_config=types.VoiceConfig(
-                prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                    voice_name="Charon"  # See available voices at https://ai.google.dev/gemini-api/docs/speech-generation#voices
-                )
-            ),
-            language_code="de-DE",
+            voice_config=types.VoiceConfig(prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name=VOICE_NAME)),
+            language_code=LANGUAGE_CODE,
         ),
         streaming_mode=StreamingMode.BIDI,
         output_audio_transcription=types.AudioTranscriptionConfig(),
         input_audio_transcription=types.AudioTranscriptionConfig(),
+        # With server-side VAD, speech is marked by explicit activity signals instead
+        realtime_input_config=vad_config.realtime_input_config() if is_audio and vad_config.enabled else None,
+        # Keeps the context of long calls at a bounded size by dropping the oldest turns
+        context_window_compression=(
+            compaction_config.context_window_compression() if compaction_config.enabled else None
+        ),
     )
 
-    # Create a LiveRequestQueue for this session
-    live_request_queue = LiveRequestQueue()
+    # Create a LiveRequestQueue for this session, it holds the client's input until the model is connected
+    live_request_queue = ConnectSignalingQueue(on_connect)
 
-    # Start agent session
-    live_events = runner.run_live(
-        session=session,
-        live_request_queue=live_request_queue,
-        run_config=run_config,
+    # Start agent session, connecting the model right away
+    live_events = LiveEventStream(
+        runner.run_live(
+            session=session,
+            live_request_queue=live_request_queue,
+            run_config=run_config,
+        )
     )
-    return live_events, live_request_queue
+    return live_events, live_request_queue, greeted, resume_token
 
 
-async def agent_to_client_messaging(websocket, live_events):
+async def agent_to_client_messaging(websocket, live_events, session, greeting_audio=None, resume_token=None):
     """Agent to client communication"""
     from starlette.websockets import WebSocketDisconnect
 
     try:
+        # The client presents the token when it reconnects to continue this call
+        if resume_token:
+            await websocket.send_text(json.dumps({"resume_token": resume_token}))
+
+        # Sent before the first event is awaited, which connects the model: the client plays the greeting meanwhile
+        if greeting_audio:
+            await play_prompt(session, GREETING, greeting_audio)
+
         async for event in live_events:
             event: Event
 
-            # Handle user input transcription chunks (send them as they come)
-            if event.content and event.content.role == "user":
-                if text := event.content.parts[0].text:
-                    print(f"[USER INPUT CHUNK]: {text}")
-                    # Send partial user transcription chunk
-                    user_message = {"mime_type": "text/plain", "data": text, "is_user_input": True}
-                    await websocket.send_text(json.dumps(user_message))
+            if session.event_log:
+                session.event_log.event(event)
+
+            # Transcriptions of both sides are collected for the transcript of the call and sent to the client
+            if transcription := event.input_transcription or event.output_transcription:
+                if transcription.text:
+                    speaker = CALLER if event.input_transcription else AGENT
+                    session.transcript.add(speaker, transcription.text, final=bool(transcription.finished))
+                    if session.recorder:
+                        session.recorder.text(speaker, transcription.text)
+                    # The finished transcription repeats the chunks before it, which the client already has. Chunks
+                    # are merged with the following ones of the same speaker.
+                    if not transcription.finished:
+                        await session.outbound.send_text_chunk(transcription.text, is_user_input=speaker == CALLER)
+                # The end of the caller's speech, unless the VAD already marked it
+                if event.input_transcription and transcription.finished and not session.vad:
+                    session.latency_tracker.caller_input()
+                continue
+
+            if event.usage_metadata:
+                record_context_size(event.usage_metadata)
+                continue
+
+            # Remember the latest resumption handle, so a reconnect to any worker can continue the live session
+            if update := event.live_session_resumption_update:
+                if update.resumable and update.new_handle and resume_token:
+                    await session_store.update_handle(resume_token, update.new_handle)
                 continue
 
             # If the turn complete or interrupted, send it
             if event.turn_complete or event.interrupted:
+                # Send audio still buffered by the codec, or drop it if the caller interrupted the agent
+                if event.interrupted:
+                    session.audio_channel.reset()
+                elif audio_tail := session.audio_channel.flush():
+                    await session.outbound.send({"mime_type": session.audio_channel.mime_type, "data": audio_tail})
                 message = {
                     "turn_complete": event.turn_complete,
                     "interrupted": event.interrupted,
                 }
-                await websocket.send_text(json.dumps(message))
+                await session.outbound.send(message, flush=True)
+                session.transcript.end_turn(bool(event.turn_complete))
+                if session.recorder:
+                    session.recorder.turn(bool(event.turn_complete), bool(event.interrupted))
                 print(f"[AGENT TO CLIENT]: {message}")
                 continue
 
@@ -105,21 +223,32 @@ async def agent_to_client_messaging(websocket, live_events):
             if not part:
                 continue
 
-            # If it's audio, send Base64 encoded audio data
+            # Thought parts are internal reasoning of the model and optionally not forwarded
+            if part.thought and thinking_policy.drop_thoughts:
+                continue
+
+            # If it's audio, send it encoded in the negotiated client format
             is_audio = part.inline_data and part.inline_data.mime_type.startswith("audio/pcm")
             if is_audio:
                 audio_data = part.inline_data and part.inline_data.data
                 if audio_data:
-                    message = {"mime_type": "audio/pcm", "data": base64.b64encode(audio_data).decode("ascii")}
-                    await websocket.send_text(json.dumps(message))
+                    if session.recorder:
+                        session.recorder.outbound_audio(audio_data)
+                    if encoded_audio := session.audio_channel.encode(audio_data):
+                        message = {"mime_type": session.audio_channel.mime_type, "data": encoded_audio}
+                        await session.outbound.send(message)
                     print(f"[AGENT TO CLIENT]: audio/pcm: {len(audio_data)} bytes.")
+                    if (latency_ms := session.latency_tracker.agent_audio()) is not None:
+                        print(f"[TIME TO FIRST AUDIO]: {latency_ms:.0f} ms ({thinking_policy.label()})")
                     continue
 
             # If it's text and a partial text, send it
             if part.text and event.partial:
-                message = {"mime_type": "text/plain", "data": part.text}
-                await websocket.send_text(json.dumps(message))
-                print(f"[AGENT TO CLIENT]: text/plain: {message}")
+                await session.outbound.send_text_chunk(part.text)
+                session.transcript.add(AGENT, part.text, final=False)
+                if session.recorder:
+                    session.recorder.text(AGENT, part.text)
+                print(f"[AGENT TO CLIENT]: text/plain: {part.text}")
     except WebSocketDisconnect:
         # Normal disconnection - client closed the connection
         pass
@@ -128,7 +257,7 @@ async def agent_to_client_messaging(websocket, live_events):
         print(f"Error in agent_to_client_messaging: {e}")
 
 
-async def client_to_agent_messaging(websocket, live_request_queue):
+async def client_to_agent_messaging(websocket, live_request_queue, session):
     """Client to agent communication"""
     from starlette.websockets import WebSocketDisconnect
 
@@ -136,6 +265,8 @@ async def client_to_agent_messaging(websocket, live_request_queue):
         while True:
             # Decode JSON message
             message_json = await websocket.receive_text()
+            if session.event_log:
+                session.event_log.client_frame(message_json)
             message = json.loads(message_json)
             mime_type = message["mime_type"]
             data = message["data"]
@@ -145,11 +276,28 @@ async def client_to_agent_messaging(websocket, live_request_queue):
                 # Send a text message
                 content = Content(role="user", parts=[Part.from_text(text=data)])
                 live_request_queue.send_content(content=content)
+                session.latency_tracker.caller_input()
+                session.transcript.add(CALLER, data, final=True)
+                if session.recorder:
+                    session.recorder.text(CALLER, data)
                 print(f"[CLIENT TO AGENT]: {data}")
-            elif mime_type == "audio/pcm":
-                # Send an audio data
-                decoded_data = base64.b64decode(data)
-                live_request_queue.send_realtime(Blob(data=decoded_data, mime_type=mime_type))
+            elif mime_type == session.audio_channel.mime_type:
+                # Send an audio data, converted to the PCM format of the model
+                decoded_data = session.audio_channel.decode(data)
+                if session.recorder:
+                    session.recorder.inbound_audio(decoded_data)
+                if not session.vad:
+                    live_request_queue.send_realtime(Blob(data=decoded_data, mime_type="audio/pcm"))
+                    continue
+                # Only forward speech, framed by activity signals
+                for item in session.vad.process(decoded_data):
+                    if item is VadSignal.START:
+                        live_request_queue.send_activity_start()
+                    elif item is VadSignal.END:
+                        live_request_queue.send_activity_end()
+                        session.latency_tracker.caller_input()
+                    else:
+                        live_request_queue.send_realtime(Blob(data=item, mime_type="audio/pcm"))
             else:
                 raise ValueError(f"Mime type not supported: {mime_type}")
     except WebSocketDisconnect:
@@ -167,39 +315,169 @@ async def root_endpoint(request):
     return RedirectResponse(url="http://localhost:8080")
 
 
+async def ready_endpoint(request):
+    """Readiness for new calls: warmed up and not draining"""
+    if admission.draining:
+        return JSONResponse({"status": "draining"}, status_code=503)
+    if not readiness.ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return JSONResponse({"status": "ready", "warmup_seconds": readiness.warmup_seconds})
+
+
 async def websocket_endpoint(websocket: WebSocket):
     """Client websocket endpoint"""
     # Get query params
     user_id = websocket.path_params.get("user_id")
     is_audio = websocket.query_params.get("is_audio", "false")
+    codec = websocket.query_params.get("codec")
 
     # Wait for client connection
+    timer = BootstrapTimer(str(user_id))
     await websocket.accept()
+    timer.lap("accept")
     print(f"Client #{user_id} connected, audio mode: {is_audio}")
 
-    # Start agent session
-    user_id_str = str(user_id)
-    live_events, live_request_queue = await start_agent_session(user_id_str, is_audio == "true")
+    try:
+        async with admission.session():
+            timer.lap("admission")
+            await run_agent_session(websocket, str(user_id), is_audio, codec, timer)
+    except AdmissionRejected as e:
+        # Tell the client when to retry, then close with "Try Again Later"
+        print(f"Client #{user_id} rejected: {e.reason}")
+        await websocket.send_text(json.dumps({"error": e.reason, "retry_after": e.retry_after}))
+        await websocket.close(code=1013, reason=f"{e.reason}, retry after {e.retry_after}s")
+        return
 
-    # Start tasks
-    agent_to_client_task = asyncio.create_task(agent_to_client_messaging(websocket, live_events))
-    client_to_agent_task = asyncio.create_task(client_to_agent_messaging(websocket, live_request_queue))
+    # Disconnected
+    print(f"Client #{user_id} disconnected")
 
-    # Wait until the websocket is disconnected or an error occurs
-    tasks = [agent_to_client_task, client_to_agent_task]
-    await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
 
-    # Close LiveRequestQueue
+async def discard_session_start(session_start: asyncio.Future) -> None:
+    """Cancel a session start, or close the live request queue and live event stream if it already finished."""
+    session_start.cancel()
+    try:
+        live_events, live_request_queue, *_ = await session_start
+    except BaseException:
+        # Cancelled or failed before the model connect started
+        return
     live_request_queue.close()
+    await live_events.aclose()
 
-    # Disconnected
-    print(f"Client #{user_id} disconnected")
+
+async def run_agent_session(
+    websocket: WebSocket, user_id: str, is_audio: str, codec: str | None, timer: BootstrapTimer
+):
+    """Runs an agent session for an admitted client until it disconnects"""
+    # Negotiate the audio format, only clients asking for a codec are told the result
+    audio_channel = negotiate_audio_channel(
+        codec, websocket.query_params.get("input_rate"), websocket.query_params.get("output_rate")
+    )
+
+    async def send_audio_format() -> None:
+        if codec:
+            await websocket.send_text(json.dumps({"audio_format": audio_channel.describe()}))
+
+    # Start agent session, greeting new audio callers with the pre-rendered greeting if there is one. The tool list
+    # is needed for the model connection and fetched meanwhile, unless it is cached.
+    greeting_audio = prompt_audio.get(GREETING) if prompt_audio and is_audio == "true" else None
+    greeting_text = PROMPT_PHRASES[GREETING] if greeting_audio else None
+    resume_token = websocket.query_params.get("resume_token")
+    session_start = asyncio.ensure_future(
+        timer.measure(
+            "session", start_agent_session(user_id, resume_token, is_audio == "true", greeting_text, timer.connected)
+        )
+    )
+    try:
+        (live_events, live_request_queue, greeted, resume_token), _, _ = await asyncio.gather(
+            session_start,
+            timer.measure("tools", prefetch_tools(customer_database_toolset)),
+            timer.measure("audio_format", send_audio_format()),
+        )
+    except BaseException:
+        # The model connect starts with the session, it must not outlive a client gone during the setup
+        await discard_session_start(session_start)
+        raise
+    timer.connecting()
+
+    # Run both directions until either ends, then release the session
+    latency_tracker = TurnLatencyTracker({"thinking_policy": thinking_policy.label(), "is_audio": is_audio})
+    vad = VoiceActivityDetector(vad_config) if is_audio == "true" and vad_config.enabled else None
+    outbound = OutboundCoalescer(websocket, coalescing_config)
+    transcript = Transcript()
+    recorder = CallRecorder(archive_config, user_id, transcript) if archive_config.enabled else None
+    event_log = None
+    if EVENT_LOG_DIR:
+        # Everything needed to set up the same session again on replay
+        # Without the resume token, a log must not allow to continue the call
+        metadata = {"user_id": user_id, **websocket.query_params}
+        metadata.pop("resume_token", None)
+        event_log = EventLogRecorder.for_session(user_id, metadata)
+    session = VoiceSession(
+        user_id,
+        live_events,
+        live_request_queue,
+        latency_tracker,
+        audio_channel,
+        outbound,
+        transcript,
+        vad,
+        recorder,
+        event_log,
+    )
+    await session.run(
+        agent_to_client_messaging(websocket, live_events, session, greeting_audio if greeted else None, resume_token),
+        client_to_agent_messaging(websocket, live_request_queue, session),
+    )
+    print(
+        f"Client #{user_id} audio traffic ({audio_channel.codec}): "
+        f"{audio_channel.bytes_received} bytes received, {audio_channel.bytes_sent} bytes sent"
+    )
+    print(f"Client #{user_id} sent {outbound.frames_sent} frames, {outbound.frames_saved} saved by coalescing")
+    if vad:
+        print(f"Client #{user_id} VAD forwarded {vad.bytes_forwarded} of {vad.bytes_in} PCM bytes to the model")
+    if recorder:
+        print(f"Client #{user_id} call archived as {recorder.call_id}, {recorder.dropped_bytes} audio bytes dropped")
+
+    # Hand the finished call to the in-process analysis
+    if post_call:
+        post_call.submit(user_id, transcript, recorder.call_id if recorder else None)
 
 
 # Create A2A app and add custom routes
 app = to_a2a(root_agent)
+a2a_lifespan = app.router.lifespan_context
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """
+    Extends the A2A lifespan with draining of voice sessions on SIGTERM, the post-call analysis workers, the loop
+    lag monitor and the warm-up for readiness
+    """
+    async with a2a_lifespan(app):
+        admission.install_drain_handler()
+        loop_monitor = LoopLagMonitor(loop_monitor_config) if loop_monitor_config.enabled else None
+        if loop_monitor:
+            loop_monitor.start()
+        if post_call:
+            post_call.start()
+        # Modules otherwise imported by the first session using them
+        modules = ["numpy"] if vad_config.enabled else []
+        preloads = [prompt_audio.load(root_agent.canonical_model.api_client)] if prompt_audio else []
+        warm_up = asyncio.create_task(readiness.warm_up(root_agent, [customer_database_toolset], modules, preloads))
+        yield
+        warm_up.cancel()
+        if loop_monitor:
+            loop_monitor.stop()
+        if post_call:
+            await post_call.stop()
+
+
+app.router.lifespan_context = lifespan
 app.routes.insert(0, Route("/", root_endpoint))
-app.routes.insert(1, WebSocketRoute("/ws/{user_id}", websocket_endpoint))
+app.routes.insert(1, Route("/ready", ready_endpoint))
+app.routes.insert(2, WebSocketRoute("/ws/{user_id}", websocket_endpoint))
+app.routes.insert(3, Route("/admin/profile", profile_endpoint, methods=["POST"]))
 
 # Entry point for IDE to start in debug mode
 # Make sure that the IDE uses the .env file
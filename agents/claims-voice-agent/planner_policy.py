@@ -0,0 +1,69 @@
+"""
+Thinking budget policy for the claims voice agent.
+
+Thinking delays the first audio of every answer, so the budget trades answer quality against latency. Live sessions
+receive their thinking config once, when the model connection is established, and keep it for the whole call: the
+budget therefore applies to all steps of the protocol alike.
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+
+from google.adk.models.llm_request import LlmRequest
+from google.adk.planners.built_in_planner import BuiltInPlanner
+from google.genai import types
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class ThinkingPolicy:
+    """
+    Thinking configuration of the voice agent.
+
+    A budget of 0 disables thinking, -1 lets the model decide dynamically.
+    """
+
+    budget: int = -1
+    include_thoughts: bool = True
+    # Drop thought parts in the websocket stream instead of forwarding them to the client as text
+    drop_thoughts: bool = False
+
+    @classmethod
+    def from_env(cls) -> "ThinkingPolicy":
+        """Read the policy from VOICE_AGENT_THINKING_* environment variables, falling back to the defaults."""
+        defaults = cls()
+        return cls(
+            budget=int(os.environ.get("VOICE_AGENT_THINKING_BUDGET", defaults.budget)),
+            include_thoughts=_env_flag("VOICE_AGENT_THINKING_INCLUDE_THOUGHTS", defaults.include_thoughts),
+            drop_thoughts=_env_flag("VOICE_AGENT_THINKING_DROP_THOUGHTS", defaults.drop_thoughts),
+        )
+
+    def label(self) -> str:
+        """Compact description of the policy, used as metric attribute and in logs."""
+        return f"budget={self.budget};thoughts={'drop' if self.drop_thoughts else 'keep'}"
+
+
+class LiveThinkingPlanner(BuiltInPlanner):
+    """Built-in planner that also applies its thinking config to live model connections."""
+
+    def __init__(self, policy: ThinkingPolicy):
+        super().__init__(
+            thinking_config=types.ThinkingConfig(
+                include_thoughts=policy.include_thoughts,
+                thinking_budget=policy.budget,
+            )
+        )
+        self.policy = policy
+
+    def apply_thinking_config(self, llm_request: LlmRequest) -> None:
+        logging.debug("Thinking budget %s", self.thinking_config.thinking_budget)
+        super().apply_thinking_config(llm_request)
+        # ADK does not copy the thinking config into the live connect config on its own
+        llm_request.live_connect_config.thinking_config = self.thinking_config
+
+
+thinking_policy = ThinkingPolicy.from_env()
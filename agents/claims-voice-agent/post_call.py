@@ -0,0 +1,225 @@
+"""
+Optional in-process analysis of finished calls.
+
+Usually a finished call reaches the claims analysis agent through the `Phone call finished` webhook of the n8n
+workflows and the Agent Gateway. With VOICE_AGENT_POST_CALL_ENABLED, the voice agent instead hands the transcript
+it assembled from the live events to a bounded pool of background workers, which run the same analysis in this
+process and push the structured claim to a local sink: a JSON lines file, or the log.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from google.adk.agents import Agent
+from google.adk.runners import InMemoryRunner
+from google.genai.types import Content, Part
+from telemetry import meter
+from transcript import CALLER, Transcript
+
+post_call_analyses = meter.create_counter(
+    "voice_agent.post_call_analyses",
+    description="Finished calls handed to the in-process analysis, by outcome",
+)
+post_call_latency = meter.create_histogram(
+    "voice_agent.post_call_latency",
+    unit="ms",
+    description="Time from the end of a call to its structured claim",
+)
+
+# Same rules as the claims-analysis-agent of the Helm chart
+ANALYSIS_INSTRUCTION = """
+ANALYSE-REGELN:
+Analysiere das folgende Transkript sorgfältig.
+Extrahiere NUR die Informationen für die unten im JSON-Format vorgegebenen Felder.
+Wenn eine Information nicht explizit im Transkript erwähnt wird, setze den Wert für das entsprechende Feld auf null. Erfinde keine Daten.
+Formatiere Datums- und Zeitangaben streng im ISO 8601 Format (YYYY-MM-DDTHH:MM:SSZ). Wenn nur ein Datum genannt wird, verwende Mitternacht als Zeit (YYYY-MM-DDT00:00:00Z).
+Fasse die Beschreibung des Vorfalls (incident_description) in 2-3 neutralen, klaren Sätzen zusammen.
+Ermittle bodily_injury (Personenschaden) als true, wenn Verletzungen erwähnt werden, sonst false.
+Extrahiere strukturierte Daten für accident_location und driver als JSON-Objekte, wie unten gezeigt.
+Ergänze das Feld accident_location.zip_code, wenn Straße und Stadt vorhanden sind, mit der Postleitzahl aus dem Tool "resolve_address". Findet das Tool keine Adresse, setze zip_code auf null.
+
+Extrahiere das Kfz-Kennzeichen als vehicle_id und wandle es in das deutsche Standardformat für Kennzeichen um (z.B. „M AB 1234": Stadt-/Kreis-Kürzel, 1-2 Buchstaben, 1-4 Ziffern, alles mit Leerzeichen getrennt).
+Entferne Sonderzeichen und formatiere alles korrekt.
+Gib keine Erklärung oder einleitenden Text aus. Deine Antwort muss direkt mit { beginnen und mit } enden.
+Material damage (material_damage) bezieht sich ausschließlich auf explizit genannte Sachschäden am Fahrzeug (z.B. „Stoßstange eingedellt", „Kotflügel beschädigt", „Lack zerkratzt").
+Falls mehrere Schäden genannt werden, fasse sie prägnant zusammen, z.B.: "linker Kotflügel eingedrückt, Scheinwerfer beschädigt".
+
+Kundendaten wie die customer_id und die policy_id sind über das Tool "get_user_data" abrufbar.
+Rufe immer das Tool auf, um diese Daten zu erhalten. Diese haben Vorrang vor eventuell im Transkript genannten Daten.
+
+GEWÜNSCHTES AUSGABEFORMAT (JSON):
+  {
+    "claim_number": "string oder null",
+    "customer_id": "string oder null",
+    "policy_id": "string oder null",
+    "incident_date": "YYYY-MM-DDTHH:MM:SSZ oder null",
+    "incident_description": "string",
+    "bodily_injury": "boolean",
+    "accident_location": {
+      "street": "string oder null",
+      "city": "string oder null",
+      "zip_code": "string oder null",
+      "country": "string oder null"
+    },
+    "accident_date": "YYYY-MM-DDTHH:MM:SSZ oder null",
+    "material_damage": "string oder null",
+    "driver": {
+      "first_name": "string oder null",
+      "last_name": "string oder null"
+    },
+    "vehicle_id": "string oder null"
+  }
+"""
+
+
+@dataclass(frozen=True)
+class PostCallConfig:
+    enabled: bool = False
+    model: str = "gemini-3.1-flash-lite"
+    workers: int = 2
+    # Finished calls waiting for a worker; further calls are not analyzed in process
+    max_queued: int = 20
+    # JSON lines file for the results, they are logged if not set
+    results_file: str | None = None
+    shutdown_timeout: float = 20.0
+
+    @classmethod
+    def from_env(cls) -> "PostCallConfig":
+        """Read the configuration from VOICE_AGENT_POST_CALL_* environment variables."""
+        defaults = cls()
+        return cls(
+            enabled=os.environ.get("VOICE_AGENT_POST_CALL_ENABLED", "false").lower() == "true",
+            model=os.environ.get("VOICE_AGENT_POST_CALL_MODEL", defaults.model),
+            workers=int(os.environ.get("VOICE_AGENT_POST_CALL_WORKERS", defaults.workers)),
+            max_queued=int(os.environ.get("VOICE_AGENT_POST_CALL_MAX_QUEUED", defaults.max_queued)),
+            results_file=os.environ.get("VOICE_AGENT_POST_CALL_RESULTS_FILE") or None,
+            shutdown_timeout=float(
+                os.environ.get("VOICE_AGENT_POST_CALL_SHUTDOWN_TIMEOUT_SECONDS", defaults.shutdown_timeout)
+            ),
+        )
+
+
+@dataclass
+class PostCallJob:
+    user_id: str
+    transcript: str
+    call_id: str
+    ended_at: float = field(default_factory=time.time)
+    # For the latency, which is measured with the performance counter
+    ended_perf_counter: float = field(default_factory=time.perf_counter)
+
+
+def parse_claim(text: str) -> dict:
+    """The JSON object of an analysis answer, tolerating surrounding code fences."""
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("No JSON object in the analysis answer")
+    return json.loads(text[start : end + 1])
+
+
+class PostCallAnalyzer:
+    """Analyzes finished calls on a bounded pool of background workers."""
+
+    def __init__(self, config: PostCallConfig, tools: list):
+        self.config = config
+        self.tools = tools
+        self._queue: asyncio.Queue[PostCallJob] = asyncio.Queue(maxsize=config.max_queued)
+        self._workers: list[asyncio.Task] = []
+        self._runner: InMemoryRunner | None = None
+
+    def start(self) -> None:
+        """Start the workers on the running event loop."""
+        agent = Agent(
+            model=self.config.model,
+            name="claims_analysis_agent",
+            description="Analyze insurance claim transcripts and extract structured data.",
+            instruction=ANALYSIS_INSTRUCTION,
+            tools=self.tools,
+        )
+        self._runner = InMemoryRunner(app_name="Claims Analysis", agent=agent)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.config.workers)]
+
+    async def stop(self) -> None:
+        """Wait for queued calls up to the shutdown timeout, then stop the workers."""
+        if self._queue.qsize():
+            logging.info(f"Waiting for the analysis of {self._queue.qsize()} finished calls")
+        try:
+            await asyncio.wait_for(self._queue.join(), self.config.shutdown_timeout)
+        except TimeoutError:
+            logging.warning(f"Analysis of {self._queue.qsize()} finished calls abandoned on shutdown")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def submit(self, user_id: str, transcript: Transcript, call_id: str | None = None) -> bool:
+        """Queue the analysis of a finished call. Returns False if it was skipped or the queue is full."""
+        if not any(entry["role"] == CALLER for entry in transcript.entries):
+            post_call_analyses.add(1, {"outcome": "skipped"})
+            return False
+        job = PostCallJob(user_id, transcript.render(), call_id or uuid.uuid4().hex)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            logging.warning(f"Analysis queue full, call {job.call_id} is not analyzed in process")
+            post_call_analyses.add(1, {"outcome": "rejected"})
+            return False
+        return True
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                result = await self._analyze(job)
+                await self._publish(result)
+            except Exception as e:
+                logging.error(f"Error analyzing call {job.call_id}: {e!r}")
+            finally:
+                self._queue.task_done()
+
+    async def _analyze(self, job: PostCallJob) -> dict:
+        assert self._runner is not None
+        session = await self._runner.session_service.create_session(app_name=self._runner.app_name, user_id=job.user_id)
+        message = Content(
+            role="user", parts=[Part.from_text(text=f"Hier ist das zu analysierende Transkript:\n{job.transcript}\n\n")]
+        )
+        answer = ""
+        try:
+            async for event in self._runner.run_async(user_id=job.user_id, session_id=session.id, new_message=message):
+                if event.is_final_response() and event.content and event.content.parts:
+                    answer = "".join(part.text or "" for part in event.content.parts if not part.thought)
+        finally:
+            await self._runner.session_service.delete_session(
+                app_name=self._runner.app_name, user_id=job.user_id, session_id=session.id
+            )
+
+        result: dict = {"call_id": job.call_id, "user_id": job.user_id, "ended_at": job.ended_at}
+        try:
+            result["claim"] = parse_claim(answer)
+            outcome = "success"
+        except ValueError as e:
+            result["error"] = str(e)
+            result["answer"] = answer
+            outcome = "error"
+        latency_ms = (time.perf_counter() - job.ended_perf_counter) * 1000
+        result["latency_ms"] = round(latency_ms)
+        post_call_analyses.add(1, {"outcome": outcome})
+        post_call_latency.record(latency_ms, {"outcome": outcome})
+        return result
+
+    async def _publish(self, result: dict) -> None:
+        line = json.dumps(result, ensure_ascii=False)
+        if not self.config.results_file:
+            logging.info(f"Claim analysis of call {result['call_id']}: {line}")
+            return
+        await asyncio.to_thread(self._append_result, line)
+
+    def _append_result(self, line: str) -> None:
+        assert self.config.results_file is not None
+        with open(self.config.results_file, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
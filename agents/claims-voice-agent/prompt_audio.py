@@ -0,0 +1,145 @@
+"""
+Pre-rendered audio of the fixed phrases of the protocol.
+
+Every call starts with the same greeting, yet the live model only speaks after its connection is set up and it
+generated the answer, which leaves callers in silence for seconds. The phrases in PROMPT_PHRASES are therefore
+rendered once with the TTS model in the voice and language of the live sessions, as 24 kHz 16-bit PCM like the
+live audio, and kept in memory. A new call plays the greeting as soon as its WebSocket is set up, while the model
+connection is established in parallel. The greeting is added to the session history as said by the agent, so the
+model continues with the caller's answer instead of greeting again.
+
+With VOICE_AGENT_PROMPT_AUDIO_DIR set, rendered phrases are stored there and loaded on the next start instead of
+rendered again. The file names contain the voice, the language and a hash of the text, so a changed phrase is
+rendered anew.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+
+from audio_codec import MODEL_OUTPUT_RATE
+from google.genai import Client, types
+from telemetry import meter
+from transcript import AGENT
+from voice_session import VoiceSession
+
+prompt_audio_played = meter.create_counter(
+    "voice_agent.prompt_audio_played",
+    description="Pre-rendered phrases played to callers, by phrase",
+)
+
+GREETING = "greeting"
+PROMPT_PHRASES = {
+    GREETING: "Guten Tag, hier ist Claimy, Ihr KI-Assistent für Schadensmeldungen. Weshalb rufen Sie heute an?",
+}
+# 100 ms of 24 kHz 16-bit mono PCM, about the size of the chunks of the live model
+CHUNK_BYTES = MODEL_OUTPUT_RATE * 2 // 10
+
+
+@dataclass(frozen=True)
+class PromptAudioConfig:
+    enabled: bool = False
+    directory: str | None = None
+    model: str = "gemini-2.5-flash-preview-tts"
+
+    @classmethod
+    def from_env(cls) -> "PromptAudioConfig":
+        """Read the configuration from VOICE_AGENT_PROMPT_AUDIO_* environment variables."""
+        return cls(
+            enabled=os.environ.get("VOICE_AGENT_PROMPT_AUDIO_ENABLED", "false").lower() == "true",
+            directory=os.environ.get("VOICE_AGENT_PROMPT_AUDIO_DIR"),
+            model=os.environ.get("VOICE_AGENT_PROMPT_AUDIO_MODEL", cls.model),
+        )
+
+
+class PromptAudioCache:
+    """Rendered PCM of the prompt phrases in one voice and language."""
+
+    def __init__(self, config: PromptAudioConfig, voice: str, language: str):
+        self.config = config
+        self.voice = voice
+        self.language = language
+        self._audio: dict[str, bytes] = {}
+
+    def get(self, phrase: str) -> bytes | None:
+        """The PCM of a phrase, None if it is not rendered (yet)."""
+        return self._audio.get(phrase)
+
+    def _path(self, phrase: str) -> str | None:
+        if not self.config.directory:
+            return None
+        digest = hashlib.sha256(PROMPT_PHRASES[phrase].encode()).hexdigest()[:12]
+        return os.path.join(self.config.directory, f"{phrase}-{self.voice}-{self.language}-{digest}.pcm")
+
+    async def _render(self, client: Client, text: str) -> bytes:
+        response = await client.aio.models.generate_content(
+            model=self.config.model,
+            contents=text,
+            config=types.GenerateContentConfig(
+                response_modalities=["AUDIO"],
+                speech_config=types.SpeechConfig(
+                    voice_config=types.VoiceConfig(
+                        prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name=self.voice)
+                    ),
+                    language_code=self.language,
+                ),
+            ),
+        )
+        content = response.candidates[0].content if response.candidates else None
+        blob = content.parts[0].inline_data if content and content.parts else None
+        if blob is None or not blob.data:
+            raise ValueError("The TTS model returned no audio")
+        if f"rate={MODEL_OUTPUT_RATE}" not in (blob.mime_type or ""):
+            raise ValueError(f"The TTS model returned {blob.mime_type}, expected {MODEL_OUTPUT_RATE} Hz PCM")
+        return blob.data
+
+    async def load(self, client: Client) -> None:
+        """Load the phrases from the cache directory, or render and store them. Failed phrases are skipped."""
+        for phrase, text in PROMPT_PHRASES.items():
+            path = self._path(phrase)
+            try:
+                if path and os.path.exists(path):
+                    self._audio[phrase] = await asyncio.to_thread(_read, path)
+                    continue
+                audio = await self._render(client, text)
+                if path:
+                    await asyncio.to_thread(_write, path, audio)
+                self._audio[phrase] = audio
+                logging.info(f"Rendered prompt audio {phrase!r}: {len(audio)} bytes")
+            except Exception as e:
+                logging.warning(f"Prompt audio {phrase!r} not available, the model speaks it instead: {e!r}")
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def _write(path: str, audio: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(audio)
+    os.replace(temporary_path, path)
+
+
+async def play_prompt(session: VoiceSession, phrase: str, audio: bytes) -> None:
+    """Send a rendered phrase to the client as a complete agent turn, like audio of the model."""
+    for start in range(0, len(audio), CHUNK_BYTES):
+        chunk = audio[start : start + CHUNK_BYTES]
+        if session.recorder:
+            session.recorder.outbound_audio(chunk)
+        if encoded_audio := session.audio_channel.encode(chunk):
+            await session.outbound.send({"mime_type": session.audio_channel.mime_type, "data": encoded_audio})
+    if audio_tail := session.audio_channel.flush():
+        await session.outbound.send({"mime_type": session.audio_channel.mime_type, "data": audio_tail})
+    await session.outbound.send({"turn_complete": True, "interrupted": False}, flush=True)
+
+    session.transcript.add(AGENT, PROMPT_PHRASES[phrase], final=True)
+    session.transcript.end_turn(True)
+    if session.recorder:
+        session.recorder.text(AGENT, PROMPT_PHRASES[phrase])
+        session.recorder.turn(True, False)
+    prompt_audio_played.add(1, {"phrase": phrase})
@@ -0,0 +1,64 @@
+"""
+Readiness of the voice agent for new calls.
+
+Some initialization is otherwise done by the first call on a new pod: the model classes and the API client are
+created lazily by ADK, and the MCP session of the customer database is opened on the first tool listing. The
+warm-up does this in the background right after startup, and `/ready` only reports ready once it finished, so a
+scaled-up pod gets no traffic before it can answer as fast as a warm one.
+"""
+
+import asyncio
+import importlib
+import logging
+import time
+from collections.abc import Awaitable, Sequence
+
+from google.adk.agents import LlmAgent
+from google.adk.tools.base_toolset import BaseToolset
+
+# Maximum wait for a tool server during the warm-up; the pod becomes ready anyway and tools connect on first use
+TOOLSET_TIMEOUT_SECONDS = 10
+
+
+class Readiness:
+    def __init__(self) -> None:
+        self.ready = False
+        self.warmup_seconds: float | None = None
+        self._started = time.perf_counter()
+
+    async def warm_up(
+        self,
+        agent: LlmAgent,
+        toolsets: list[BaseToolset],
+        modules: list[str],
+        preloads: Sequence[Awaitable[None]] = (),
+    ) -> None:
+        """
+        Load the model client, open the tool sessions, import the given modules and await the preloads, e.g. of
+        cached audio, then report ready.
+        """
+        try:
+            model = agent.canonical_model
+            # The API client and the live connection are created lazily
+            getattr(model, "api_client", None)
+            importlib.import_module("google.adk.models.gemini_llm_connection")
+            for module in modules:
+                await asyncio.to_thread(importlib.import_module, module)
+        except Exception as e:
+            logging.warning(f"Warm-up of the model failed: {e!r}")
+
+        for toolset in toolsets:
+            try:
+                await asyncio.wait_for(toolset.get_tools(), TOOLSET_TIMEOUT_SECONDS)
+            except Exception as e:
+                logging.warning(f"Warm-up of toolset {type(toolset).__name__} failed: {e!r}")
+
+        for preload in preloads:
+            try:
+                await preload
+            except Exception as e:
+                logging.warning(f"Warm-up preload failed: {e!r}")
+
+        self.warmup_seconds = time.perf_counter() - self._started
+        self.ready = True
+        logging.info(f"Voice agent ready {self.warmup_seconds:.2f}s after startup")
@@ -0,0 +1,152 @@
+"""
+Session state shared between the worker processes of the voice agent.
+
+With several uvicorn workers (WEB_CONCURRENCY), a reconnecting client can land on any worker. The state
+needed to continue its call therefore lives in SQLite files in VOICE_AGENT_STATE_DIR instead of the worker's
+memory: the ADK session with the conversation history, and the latest live session resumption handle of the call.
+Without a state directory, both stay in memory of the worker: a reconnect to the same worker can still resume with
+the handle, but conversation history is released with the connection.
+
+The user_id of a connection is chosen by the client, so it does not prove that the client started the call. A
+new call is therefore issued a random resume token, which is sent to the client, and only a reconnect presenting
+that token continues the call. The store keeps only a hash of the token.
+"""
+
+import asyncio
+import hashlib
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from google.adk.agents import BaseAgent
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.memory import InMemoryMemoryService
+from google.adk.runners import InMemoryRunner, Runner
+from google.adk.sessions import BaseSessionService
+
+STATE_DIR = os.environ.get("VOICE_AGENT_STATE_DIR")
+# Gemini keeps resumable sessions for two hours after a disconnect
+RESUMPTION_TTL_SECONDS = float(os.environ.get("VOICE_AGENT_RESUMPTION_TTL_SECONDS", 7200))
+
+
+@dataclass(frozen=True)
+class SessionRecord:
+    user_id: str
+    session_id: str
+    resumption_handle: str | None
+    updated_at: float
+
+
+def issue_resume_token() -> str:
+    """A new secret token that identifies a call on reconnect."""
+    return secrets.token_urlsafe(32)
+
+
+def _token_hash(resume_token: str) -> str:
+    return hashlib.sha256(resume_token.encode()).hexdigest()
+
+
+class SessionStateStore:
+    """Maps the resume token of a call to its ADK session and the latest resumption handle of its live connection."""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # WAL lets the workers read while another one writes
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA busy_timeout=5000")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS voice_calls (token_hash TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+            "session_id TEXT NOT NULL, resumption_handle TEXT, updated_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS voice_calls_updated_at ON voice_calls (updated_at)")
+
+    def _load(self, user_id: str, resume_token: str) -> SessionRecord | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT user_id, session_id, resumption_handle, updated_at FROM voice_calls "
+                "WHERE token_hash = ? AND user_id = ?",
+                (_token_hash(resume_token), user_id),
+            ).fetchone()
+        if row is None or time.time() - row[3] > self.ttl_seconds:
+            return None
+        return SessionRecord(*row)
+
+    def _save(
+        self, user_id: str, resume_token: str, session_id: str, resumption_handle: str | None
+    ) -> list[SessionRecord]:
+        now = time.time()
+        with self._lock:
+            expired = self._connection.execute(
+                "DELETE FROM voice_calls WHERE updated_at < ? "
+                "RETURNING user_id, session_id, resumption_handle, updated_at",
+                (now - self.ttl_seconds,),
+            ).fetchall()
+            self._connection.execute(
+                "INSERT INTO voice_calls (token_hash, user_id, session_id, resumption_handle, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(token_hash) DO UPDATE SET session_id = excluded.session_id, "
+                "resumption_handle = excluded.resumption_handle, updated_at = excluded.updated_at",
+                (_token_hash(resume_token), user_id, session_id, resumption_handle, now),
+            )
+        return [SessionRecord(*row) for row in expired]
+
+    def _update_handle(self, resume_token: str, resumption_handle: str | None) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE voice_calls SET resumption_handle = ?, updated_at = ? WHERE token_hash = ?",
+                (resumption_handle, time.time(), _token_hash(resume_token)),
+            )
+
+    async def load(self, user_id: str, resume_token: str | None) -> SessionRecord | None:
+        """The state of the call with the resume token, unless it expired or belongs to another user_id."""
+        if not resume_token:
+            return None
+        return await asyncio.to_thread(self._load, user_id, resume_token)
+
+    async def save(
+        self, user_id: str, resume_token: str, session_id: str, resumption_handle: str | None
+    ) -> list[SessionRecord]:
+        """Store the state of the call, returns the calls that expired meanwhile, whose sessions can be deleted."""
+        return await asyncio.to_thread(self._save, user_id, resume_token, session_id, resumption_handle)
+
+    async def update_handle(self, resume_token: str, resumption_handle: str | None) -> None:
+        """Store the latest resumption handle sent by the model for the live connection of the call."""
+        await asyncio.to_thread(self._update_handle, resume_token, resumption_handle)
+
+
+def create_session_state_store() -> SessionStateStore:
+    path = os.path.join(STATE_DIR, "voice-sessions.db") if STATE_DIR else ":memory:"
+    return SessionStateStore(path, RESUMPTION_TTL_SECONDS)
+
+
+def _create_shared_session_service() -> BaseSessionService | None:
+    if not STATE_DIR:
+        return None
+    # Only imported with a state directory, it pulls in the SQLite drivers
+    from google.adk.sessions.sqlite_session_service import SqliteSessionService
+
+    return SqliteSessionService(os.path.join(STATE_DIR, "sessions.db"))
+
+
+_shared_session_service = _create_shared_session_service()
+
+
+def create_runner(app_name: str, agent: BaseAgent) -> Runner:
+    """
+    Runner for one connection. Sessions are stored in the shared database if a state directory is configured,
+    otherwise in memory of the runner, so they are released together with the connection.
+    """
+    if _shared_session_service is None:
+        return InMemoryRunner(app_name=app_name, agent=agent)
+    return Runner(
+        app_name=app_name,
+        agent=agent,
+        session_service=_shared_session_service,
+        artifact_service=InMemoryArtifactService(),
+        memory_service=InMemoryMemoryService(),
+    )
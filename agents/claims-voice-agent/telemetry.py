@@ -0,0 +1,39 @@
+"""
+Metrics for the claims voice agent.
+
+Instruments are created on the global OpenTelemetry meter provider, which is configured by main.py when
+AGENT_OTEL_ENABLED is set. Without it they are no-ops.
+"""
+
+import time
+
+from opentelemetry import metrics
+
+meter = metrics.get_meter("claims-voice-agent")
+
+time_to_first_audio = meter.create_histogram(
+    "voice_agent.time_to_first_audio",
+    unit="ms",
+    description="Time between the latest caller input of a turn and the first audio chunk of the answer",
+)
+
+
+class TurnLatencyTracker:
+    """Measures the time from the latest caller input to the first agent audio chunk of the following answer."""
+
+    def __init__(self, attributes: dict[str, str]):
+        self.attributes = attributes
+        self._last_input: float | None = None
+
+    def caller_input(self) -> None:
+        """Mark caller input (a text message or an input transcription chunk)."""
+        self._last_input = time.perf_counter()
+
+    def agent_audio(self) -> float | None:
+        """Mark an outgoing audio chunk. Returns the latency in ms for the first chunk of an answer."""
+        if self._last_input is None:
+            return None
+        latency_ms = (time.perf_counter() - self._last_input) * 1000
+        self._last_input = None
+        time_to_first_audio.record(latency_ms, self.attributes)
+        return latency_ms
@@ -0,0 +1,65 @@
+import asyncio
+
+from context_compaction import SLOTS_KEY, CompactionConfig, compact_session
+from google.adk.events.event import Event
+from google.adk.sessions import InMemorySessionService, Session
+from google.genai import types
+
+APP_NAME = "test"
+
+
+def caller(text: str) -> Event:
+    return Event(author="user", input_transcription=types.Transcription(text=text, finished=True))
+
+
+def agent(text: str) -> Event:
+    return Event(author="claims_voice_agent", content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+async def call(service: InMemorySessionService, session: Session, turns: range) -> None:
+    for turn in turns:
+        await service.append_event(session, caller(f"statement {turn}"))
+        await service.append_event(session, agent(f"answer {turn}"))
+
+
+def summary_text(session: Session) -> str:
+    content = session.events[0].content
+    assert content is not None and content.parts is not None
+    return content.parts[0].text or ""
+
+
+def test_compacting_again_merges_the_earlier_summary() -> None:
+    async def run() -> None:
+        service = InMemorySessionService()
+        config = CompactionConfig(recent_turns=2, summary_statements=20)
+        session = await service.create_session(app_name=APP_NAME, user_id="4711", state={SLOTS_KEY: {"name": "A"}})
+        await call(service, session, range(5))
+        session = await compact_session(service, session, config)
+        await call(service, session, range(5, 8))
+        session = await compact_session(service, session, config)
+
+        text = summary_text(session)
+        assert "Summary of the earlier part" not in text.split("The caller said")[1]
+        assert [line for line in text.splitlines() if line.startswith("- ")] == [
+            f"- statement {turn}" for turn in range(6)
+        ]
+        # The summary and the two latest turns
+        assert len(session.events) == 5
+
+    asyncio.run(run())
+
+
+def test_the_summary_keeps_only_the_latest_statements() -> None:
+    async def run() -> None:
+        service = InMemorySessionService()
+        config = CompactionConfig(recent_turns=1, summary_statements=3)
+        session = await service.create_session(app_name=APP_NAME, user_id="4711")
+        await call(service, session, range(6))
+        session = await compact_session(service, session, config)
+        await call(service, session, range(6, 10))
+        session = await compact_session(service, session, config)
+
+        lines = [line for line in summary_text(session).splitlines() if line.startswith("- ")]
+        assert lines == ["- (6 earlier statements omitted)", "- statement 6", "- statement 7", "- statement 8"]
+
+    asyncio.run(run())
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import date_tools
+import pytest
+from date_tools import TIMEZONE, resolve_incident_date
+
+
+@pytest.fixture
+def now(monkeypatch: pytest.MonkeyPatch) -> datetime:
+    fixed = datetime(2026, 1, 5, 14, 30, tzinfo=TIMEZONE)
+    monkeypatch.setattr(date_tools, "_now", lambda: fixed)
+    return fixed
+
+
+@pytest.mark.parametrize(
+    ("expression", "expected_time"),
+    [
+        ("heute um 2 uhr nachts", "02:00"),
+        ("heute um 5 uhr in der nacht", "05:00"),
+        ("gestern um 11 uhr nachts", "23:00"),
+        ("gestern um halb zehn nachts", "21:30"),
+        ("heute um 12 uhr nachts", "00:00"),
+        ("gestern um 3 uhr nachmittags", "15:00"),
+        ("gestern um 8 uhr abends", "20:00"),
+    ],
+)
+def test_night_and_afternoon_hours(now: datetime, expression: str, expected_time: str) -> None:
+    result = resolve_incident_date(expression)
+
+    assert result["time"] == expected_time
+    assert result["is_future"] is False
+
+
+@pytest.mark.parametrize("expression", ["am 24. Dezember", "am 24.12.", "24.12. um 15 uhr"])
+def test_date_without_year_in_the_future_is_last_year(now: datetime, expression: str) -> None:
+    result = resolve_incident_date(expression)
+
+    assert result["date"] == "2025-12-24"
+    assert result["is_future"] is False
+
+
+@pytest.mark.parametrize("expression", ["am 3. Januar", "am 3.1.", "am 5. Januar"])
+def test_date_without_year_in_the_past_is_this_year(now: datetime, expression: str) -> None:
+    result = resolve_incident_date(expression)
+
+    assert result["date"].startswith("2026-01-0")
+    assert result["is_future"] is False
+
+
+@pytest.mark.parametrize("expression", ["am 24. Dezember 2026", "am 24.12.2026"])
+def test_date_with_year_in_the_future_is_flagged(now: datetime, expression: str) -> None:
+    result = resolve_incident_date(expression)
+
+    assert result["date"] == "2026-12-24"
+    assert result["is_future"] is True
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from session_state import SessionStateStore, issue_resume_token
+
+
+@pytest.fixture
+def store() -> SessionStateStore:
+    return SessionStateStore(":memory:", ttl_seconds=7200)
+
+
+def test_the_issued_token_continues_the_call(store: SessionStateStore) -> None:
+    async def run() -> None:
+        token = issue_resume_token()
+        await store.save("4711", token, "session-1", None)
+        await store.update_handle(token, "handle-1")
+        record = await store.load("4711", token)
+        assert record is not None
+        assert (record.session_id, record.resumption_handle) == ("session-1", "handle-1")
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    ("user_id", "resume_token"),
+    [
+        # The user_id alone does not continue a call
+        ("4711", None),
+        ("4711", ""),
+        ("4711", "guessed"),
+        # Nor does the token with another user_id
+        ("4712", "issued"),
+    ],
+)
+def test_other_clients_do_not_continue_the_call(store: SessionStateStore, user_id: str, resume_token: str) -> None:
+    async def run() -> None:
+        token = issue_resume_token()
+        await store.save("4711", token, "session-1", "handle-1")
+        assert await store.load(user_id, token if resume_token == "issued" else resume_token) is None
+
+    asyncio.run(run())
+
+
+def test_a_new_call_of_the_same_user_id_keeps_the_previous_one(store: SessionStateStore) -> None:
+    async def run() -> None:
+        first, second = issue_resume_token(), issue_resume_token()
+        await store.save("4711", first, "session-1", "handle-1")
+        await store.save("4711", second, "session-2", None)
+        await store.update_handle(second, "handle-2")
+        record = await store.load("4711", first)
+        assert record is not None
+        assert (record.session_id, record.resumption_handle) == ("session-1", "handle-1")
+
+    asyncio.run(run())
+
+
+def test_expired_calls_are_not_continued() -> None:
+    async def run() -> None:
+        store = SessionStateStore(":memory:", ttl_seconds=-1)
+        token = issue_resume_token()
+        await store.save("4711", token, "session-1", "handle-1")
+        assert await store.load("4711", token) is None
+
+    asyncio.run(run())
+
+
+def test_saving_returns_the_expired_calls() -> None:
+    async def run() -> None:
+        store = SessionStateStore(":memory:", ttl_seconds=-1)
+        assert await store.save("4711", issue_resume_token(), "session-1", "handle-1") == []
+        expired = await store.save("4712", issue_resume_token(), "session-2", None)
+        assert [(record.user_id, record.session_id) for record in expired] == [("4711", "session-1")]
+
+    asyncio.run(run())
@@ -0,0 +1,150 @@
+import asyncio
+import inspect
+from collections.abc import AsyncGenerator
+
+import pytest
+from audio_codec import negotiate_audio_channel
+from bootstrap import LiveEventStream
+from coalescing import CoalescingConfig, OutboundCoalescer
+from google.adk.agents import LiveRequestQueue
+from google.adk.events.event import Event
+from google.genai import types
+from telemetry import TurnLatencyTracker
+from transcript import Transcript
+from voice_session import VoiceSession
+
+CYCLES = 200
+
+
+class FakeWebSocket:
+    def __init__(self, blocks: bool = False) -> None:
+        self.blocks = blocks
+        self.sent: list[str] = []
+
+    async def send_text(self, text: str) -> None:
+        if self.blocks:
+            # A client that stopped reading
+            await asyncio.Event().wait()
+        self.sent.append(text)
+
+
+class FakeLiveRequestQueue(LiveRequestQueue):
+    def __init__(self) -> None:
+        super().__init__()
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+        super().close()
+
+
+async def forward_requests(queue: LiveRequestQueue) -> None:
+    while not (await queue.get()).close:
+        pass
+
+
+async def model_events(queue: LiveRequestQueue, chunks: int) -> AsyncGenerator[Event, None]:
+    """
+    A live model like run_live: forwards the request queue in a task, sends a few text chunks, then keeps its
+    connection open until the stream is closed.
+    """
+    send_task = asyncio.create_task(forward_requests(queue))
+    try:
+        for index in range(chunks):
+            content = types.Content(role="model", parts=[types.Part(text=f"{index}")])
+            yield Event(author="claims_voice_agent", content=content)
+        await asyncio.Event().wait()
+        yield Event(author="claims_voice_agent")
+    finally:
+        send_task.cancel()
+
+
+async def agent_to_client(session: VoiceSession) -> None:
+    async for event in session.live_events:
+        if event.content and event.content.parts and event.content.parts[0].text:
+            await session.outbound.send_text_chunk(event.content.parts[0].text)
+
+
+async def client_disconnects(session: VoiceSession) -> None:
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def client_fails(session: VoiceSession) -> None:
+    await asyncio.sleep(0)
+    raise ValueError("Mime type not supported: video/mp4")
+
+
+async def client_waits(session: VoiceSession) -> None:
+    await asyncio.Event().wait()
+
+
+async def run_cycles(client, chunks: int, send_blocks: bool) -> None:
+    generators: list[AsyncGenerator[Event, None]] = []
+    queues: list[FakeLiveRequestQueue] = []
+    for _ in range(CYCLES):
+        queue = FakeLiveRequestQueue()
+        queues.append(queue)
+        events = model_events(queue, chunks)
+        generators.append(events)
+        # Text is sent at once to a blocking client, else it stays buffered by the coalescer
+        config = CoalescingConfig(window_ms=0 if send_blocks else 1000)
+        session = VoiceSession(
+            "test",
+            LiveEventStream(events),
+            queue,
+            TurnLatencyTracker({}),
+            negotiate_audio_channel(None, None, None),
+            OutboundCoalescer(FakeWebSocket(send_blocks), config),
+            Transcript(),
+        )
+        await session.run(agent_to_client(session), client(session))
+        # Tasks cancelled by the session finish within one iteration of the loop
+        await asyncio.sleep(0)
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    assert all(queue.closed for queue in queues)
+    assert all(inspect.getasyncgenstate(events) == inspect.AGEN_CLOSED for events in generators)
+
+
+@pytest.mark.parametrize(
+    ("client", "chunks", "send_blocks"),
+    [
+        # The client disconnects while the model connection is open, with text still buffered
+        (client_disconnects, 3, False),
+        # The client disconnects before the first event was read, i.e. during the connect
+        (client_disconnects, 0, False),
+        # The client disconnects while the agent direction waits for a send, not for the model
+        (client_disconnects, 1, True),
+        # The client direction fails
+        (client_fails, 1, False),
+    ],
+)
+def test_run_releases_all_resources(client, chunks: int, send_blocks: bool) -> None:
+    asyncio.run(run_cycles(client, chunks, send_blocks))
+
+
+def test_run_releases_all_resources_when_the_model_stream_ends() -> None:
+    async def model_ends() -> AsyncGenerator[Event, None]:
+        yield Event(author="claims_voice_agent")
+
+    async def run() -> None:
+        for _ in range(CYCLES):
+            events = model_ends()
+            queue = FakeLiveRequestQueue()
+            session = VoiceSession(
+                "test",
+                LiveEventStream(events),
+                queue,
+                TurnLatencyTracker({}),
+                negotiate_audio_channel(None, None, None),
+                OutboundCoalescer(FakeWebSocket(), CoalescingConfig()),
+                Transcript(),
+            )
+            await session.run(agent_to_client(session), client_waits(session))
+            await asyncio.sleep(0)
+            assert asyncio.all_tasks() == {asyncio.current_task()}
+            assert queue.closed
+            assert inspect.getasyncgenstate(events) == inspect.AGEN_CLOSED
+
+    asyncio.run(run())
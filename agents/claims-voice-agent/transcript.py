@@ -0,0 +1,49 @@
+"""
+Transcript of a voice call, assembled from the live events.
+
+The model sends the transcription of both sides in partial chunks, followed by the complete text when a
+transcription is finished. Text mode answers only arrive as partial chunks. Chunks are therefore collected per
+speaker until the final text replaces them or the turn ends.
+"""
+
+import time
+
+CALLER = "caller"
+AGENT = "agent"
+
+# Speaker labels of the rendered transcript, as used in the claim analysis flows
+SPEAKER_LABELS = {CALLER: "Anrufer", AGENT: "Agent"}
+
+
+class Transcript:
+    def __init__(self) -> None:
+        self.entries: list[dict] = []
+        self.turns = 0
+        self._start = time.monotonic()
+        self._pending: dict[str, list[str]] = {CALLER: [], AGENT: []}
+
+    def add(self, speaker: str, text: str, final: bool) -> None:
+        """Add a text message or transcription chunk of the caller or the agent."""
+        pending = self._pending[speaker]
+        if not final:
+            pending.append(text)
+            return
+        pending.clear()
+        self._add_entry(speaker, text)
+
+    def _add_entry(self, speaker: str, text: str) -> None:
+        if text := text.strip():
+            self.entries.append({"role": speaker, "text": text, "at": round(time.monotonic() - self._start, 2)})
+
+    def end_turn(self, turn_complete: bool = False) -> None:
+        """Commit the chunks of unfinished texts, e.g. at `turn_complete`, `interrupted` or the end of the call."""
+        for speaker, pending in self._pending.items():
+            if pending:
+                self._add_entry(speaker, "".join(pending))
+                pending.clear()
+        if turn_complete:
+            self.turns += 1
+
+    def render(self) -> str:
+        """The transcript as plain text, one line per entry."""
+        return "\n".join(f"{SPEAKER_LABELS[entry['role']]}: {entry['text']}" for entry in self.entries)
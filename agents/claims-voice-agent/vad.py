@@ -0,0 +1,149 @@
+"""
+Server-side voice activity detection for the upstream audio of a voice session.
+
+The browser recorder streams audio continuously, including long pauses while callers look something up.
+The detector classifies 20 ms frames by energy and zero-crossing rate, forwards only speech (plus a short
+pre-roll and a hangover) and marks speech segments with explicit activity start/end signals. The model's own
+activity detection is disabled while this is active, so end of speech is signalled as soon as the hangover
+has passed.
+"""
+
+import os
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING
+
+from google.genai import types
+from telemetry import meter
+
+if TYPE_CHECKING:
+    import numpy as np
+
+vad_audio_bytes = meter.create_counter(
+    "voice_agent.vad_audio_bytes",
+    unit="By",
+    description="Upstream PCM bytes seen by the voice activity detector, by forwarded or suppressed",
+)
+
+
+class VadSignal(Enum):
+    """Activity signals emitted between the forwarded audio chunks."""
+
+    START = "activity_start"
+    END = "activity_end"
+
+
+@dataclass(frozen=True)
+class VadConfig:
+    enabled: bool = False
+    # Frames quieter than this (dBFS) are silence, regardless of the adaptive noise floor
+    threshold_db: float = -50.0
+    # Required distance of speech above the tracked noise floor
+    noise_margin_db: float = 12.0
+    # Frames with more zero crossings per sample are treated as noise unless they are clearly loud
+    max_zero_crossing_rate: float = 0.3
+    frame_ms: int = 20
+    hangover_ms: int = 400
+    preroll_ms: int = 200
+
+    @classmethod
+    def from_env(cls) -> "VadConfig":
+        """Read the configuration from VOICE_AGENT_VAD_* environment variables."""
+        defaults = cls()
+        return cls(
+            enabled=os.environ.get("VOICE_AGENT_VAD_ENABLED", "false").lower() == "true",
+            threshold_db=float(os.environ.get("VOICE_AGENT_VAD_THRESHOLD_DB", defaults.threshold_db)),
+            noise_margin_db=float(os.environ.get("VOICE_AGENT_VAD_NOISE_MARGIN_DB", defaults.noise_margin_db)),
+            hangover_ms=int(os.environ.get("VOICE_AGENT_VAD_HANGOVER_MS", defaults.hangover_ms)),
+            preroll_ms=int(os.environ.get("VOICE_AGENT_VAD_PREROLL_MS", defaults.preroll_ms)),
+        )
+
+    def realtime_input_config(self) -> types.RealtimeInputConfig:
+        """Disables the model's automatic activity detection in favour of the explicit signals."""
+        return types.RealtimeInputConfig(automatic_activity_detection=types.AutomaticActivityDetection(disabled=True))
+
+
+class VoiceActivityDetector:
+    """Gates 16-bit mono PCM to speech segments. Keeps state across chunks of a stream."""
+
+    def __init__(self, config: VadConfig, sample_rate: int = 16000):
+        self.config = config
+        self.frame_bytes = sample_rate * config.frame_ms // 1000 * 2
+        self.hangover_frames = config.hangover_ms // config.frame_ms
+        self.preroll_frames = config.preroll_ms // config.frame_ms
+        self.noise_floor_db = config.threshold_db
+        self.active = False
+        self._silent_frames = 0
+        self._remainder = b""
+        self._preroll: list[bytes] = []
+        # Statistics for the session summary
+        self.bytes_in = 0
+        self.bytes_forwarded = 0
+
+    def _classify(self, frames: "np.ndarray") -> "np.ndarray":
+        """Speech decision for each frame (rows of int16 samples)."""
+        import numpy as np
+
+        samples = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(samples * samples, axis=1))
+        energy_db = 20 * np.log10(np.maximum(rms, 1e-9))
+        signs = np.signbit(frames)
+        zero_crossing_rate = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        threshold = max(self.config.threshold_db, self.noise_floor_db + self.config.noise_margin_db)
+        loud = energy_db > threshold
+        voiced = zero_crossing_rate < self.config.max_zero_crossing_rate
+        speech = loud & (voiced | (energy_db > threshold + self.config.noise_margin_db))
+
+        # Track the noise floor: follow quieter frames at once, rise slowly only while nobody speaks
+        quietest = float(energy_db.min())
+        if quietest < self.noise_floor_db:
+            self.noise_floor_db = quietest
+        elif not speech.any():
+            self.noise_floor_db += 0.05 * (quietest - self.noise_floor_db)
+        return speech
+
+    def process(self, pcm: bytes) -> list[bytes | VadSignal]:
+        """Return the audio to forward, interleaved with activity signals, in order."""
+        self.bytes_in += len(pcm)
+        data = self._remainder + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[usable:]
+        if not usable:
+            return []
+
+        # numpy is only imported if voice activity detection is enabled
+        import numpy as np
+
+        frames = np.frombuffer(data[:usable], dtype="<i2").reshape(-1, self.frame_bytes // 2)
+        output: list[bytes | VadSignal] = []
+        forwarded: list[bytes] = []
+        for index, is_speech in enumerate(self._classify(frames)):
+            frame = data[index * self.frame_bytes : (index + 1) * self.frame_bytes]
+            if is_speech:
+                self._silent_frames = 0
+                if not self.active:
+                    self.active = True
+                    output.append(VadSignal.START)
+                    forwarded.extend(self._preroll)
+                    self._preroll.clear()
+                forwarded.append(frame)
+            elif self.active:
+                self._silent_frames += 1
+                forwarded.append(frame)
+                if self._silent_frames > self.hangover_frames:
+                    self.active = False
+                    output.append(b"".join(forwarded))
+                    forwarded.clear()
+                    output.append(VadSignal.END)
+            elif self.preroll_frames:
+                self._preroll.append(frame)
+                del self._preroll[: -self.preroll_frames]
+
+        if forwarded:
+            output.append(b"".join(forwarded))
+        forwarded_bytes = sum(len(item) for item in output if isinstance(item, bytes))
+        self.bytes_forwarded += forwarded_bytes
+        vad_audio_bytes.add(forwarded_bytes, {"outcome": "forwarded"})
+        vad_audio_bytes.add(usable - forwarded_bytes, {"outcome": "suppressed"})
+        return [item for item in output if item]
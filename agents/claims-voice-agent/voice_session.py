@@ -0,0 +1,92 @@
+"""
+Lifecycle of a single voice session.
+
+Both messaging directions run in one task group. As soon as either direction ends - normally on a client
+disconnect or with an error - the other one is cancelled and awaited, then the live request queue and the
+live event stream are closed, so no model stream or task outlives the connection. Finally the call archive
+and the event log, if any, are finalized.
+"""
+
+import asyncio
+from collections.abc import Coroutine
+from typing import Any
+
+from audio_codec import AudioChannel
+from bootstrap import LiveEventStream
+from call_archive import CallRecorder
+from coalescing import OutboundCoalescer
+from event_log import EventLogRecorder
+from google.adk.agents import LiveRequestQueue
+from telemetry import TurnLatencyTracker
+from transcript import Transcript
+from vad import VoiceActivityDetector
+
+
+class _DirectionEnded(Exception):
+    """Raised when one messaging direction finishes to cancel the remaining one."""
+
+
+class VoiceSession:
+    """Owns the live model stream and the per-connection state of a voice session."""
+
+    def __init__(
+        self,
+        user_id: str,
+        live_events: LiveEventStream,
+        live_request_queue: LiveRequestQueue,
+        latency_tracker: TurnLatencyTracker,
+        audio_channel: AudioChannel,
+        outbound: OutboundCoalescer,
+        transcript: Transcript,
+        vad: VoiceActivityDetector | None = None,
+        recorder: CallRecorder | None = None,
+        event_log: EventLogRecorder | None = None,
+    ):
+        self.user_id = user_id
+        self.live_events = live_events
+        self.live_request_queue = live_request_queue
+        self.latency_tracker = latency_tracker
+        self.audio_channel = audio_channel
+        self.outbound = outbound
+        self.transcript = transcript
+        self.vad = vad
+        self.recorder = recorder
+        self.event_log = event_log
+        self._closed = False
+
+    @staticmethod
+    async def _direction(coro: Coroutine[Any, Any, None]) -> None:
+        await coro
+        raise _DirectionEnded()
+
+    async def run(self, *directions: Coroutine[Any, Any, None]) -> None:
+        """Run the messaging directions until the first one ends, then release all session resources."""
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                for direction in directions:
+                    task_group.create_task(self._direction(direction))
+        except* _DirectionEnded:
+            pass
+        except* Exception as group:
+            for error in group.exceptions:
+                print(f"Error in voice session of client #{self.user_id}: {error!r}")
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Close the live request queue and the live event stream. Safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        self.outbound.close()
+        self.live_request_queue.close()
+        # Closing the generator runs the cleanup of run_live, which closes the model connection
+        try:
+            await self.live_events.aclose()
+        except Exception as e:
+            print(f"Error closing live events of client #{self.user_id}: {e!r}")
+        self.transcript.end_turn()
+        if self.recorder:
+            self.recorder.close()
+        if self.event_log:
+            self.event_log.close()
@@ -29,6 +29,8 @@ const ws_url =
   ws_protocol + "//" + window.location.host + "/ws/" + sessionId;
 let websocket = null;
 let is_audio = false;
+// Issued by the server on connect, a reconnect with it continues the call
+let resumeToken = null;
 
 // Get DOM elements
 const messageForm = document.getElementById("messageForm");
@@ -39,7 +41,11 @@ let currentMessageId = null;
 // WebSocket handlers
 function connectWebsocket() {
   // Connect websocket
-  websocket = new WebSocket(ws_url + "?is_audio=" + is_audio);
+  let url = ws_url + "?is_audio=" + is_audio;
+  if (resumeToken) {
+    url += "&resume_token=" + encodeURIComponent(resumeToken);
+  }
+  websocket = new WebSocket(url);
 
   // Handle connection open
   websocket.onopen = function () {
@@ -58,6 +64,12 @@ function connectWebsocket() {
     const message_from_server = JSON.parse(event.data);
     console.log("[AGENT TO CLIENT] ", message_from_server);
 
+    // Remember the resume token of the call
+    if (message_from_server.resume_token) {
+      resumeToken = message_from_server.resume_token;
+      return;
+    }
+
     // Check if the turn is complete
     // if turn complete, add new message
     if (
@@ -6,6 +6,7 @@ interface AudioWebSocketMessage {
   is_user_input?: boolean;
   turn_complete?: boolean;
   interrupted?: boolean;
+  resume_token?: string;
 }
 
 interface UseAudioWebSocketProps {
@@ -32,6 +33,8 @@ export const useAudioWebSocket = ({
   const micStream = useRef<MediaStream | null>(null);
   const audioBuffer = useRef<Uint8Array[]>([]);
   const bufferTimer = useRef<NodeJS.Timeout | null>(null);
+  // Issued by the server on connect, a reconnect with it continues the call
+  const resumeToken = useRef<string | null>(null);
 
   const startAudioPlayerWorklet = useCallback(async () => {
     const audioContext = new AudioContext({ sampleRate: 24000 });
@@ -154,7 +157,10 @@ export const useAudioWebSocket = ({
     // Use dynamic URL to work in both local and cluster deployments
     const audioMode = forceAudioMode !== undefined ? forceAudioMode : isAudioMode;
     const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const directUrl = `${wsProtocol}//${window.location.host}/ws/${currentSessionId}?is_audio=${audioMode}`;
+    let directUrl = `${wsProtocol}//${window.location.host}/ws/${currentSessionId}?is_audio=${audioMode}`;
+    if (resumeToken.current) {
+      directUrl += `&resume_token=${encodeURIComponent(resumeToken.current)}`;
+    }
 
     console.log('Creating new WebSocket connection to:', directUrl);
     websocket.current = new WebSocket(directUrl);
@@ -179,6 +185,12 @@ export const useAudioWebSocket = ({
       const messageFromServer: AudioWebSocketMessage = JSON.parse(event.data);
       console.log('[AGENT TO CLIENT]', messageFromServer);
 
+      // Remember the resume token of the call
+      if (messageFromServer.resume_token) {
+        resumeToken.current = messageFromServer.resume_token;
+        return;
+      }
+
       if (messageFromServer.interrupted && audioPlayerNode.current) {
         audioPlayerNode.current.port.postMessage({ command: 'endOfAudio' });
         return;
@@ -0,0 +1,178 @@
+"""
+Offline resolution of German addresses to postal codes.
+
+The index maps street and city to postal codes (PLZ) without any external service. Its entries are sorted by
+normalized city and street and stored zlib-compressed in blocks of BLOCK_SIZE entries; only the first key of every
+block is kept uncompressed to find the block of a key. A lookup decompresses one or two blocks and takes a few
+microseconds.
+
+Streets are compared without house numbers, case, umlauts and the spelling of "Straße" ("Musterstr. 12" matches
+"Musterstraße"). A street that is not found exactly is completed by prefix ("Friedrich" → "Friedrichstraße"), and
+else matched fuzzily among the streets of the city with the same first letter. Cities are matched the same way.
+
+With ADDRESS_DATA_FILE set, the index is built from that CSV file (optionally gzip compressed) with the columns
+`street`, `postal_code` and `city`, e.g. an export of a German street directory. Without it, the index contains the
+addresses of the customers in the mock database.
+"""
+
+import csv
+import difflib
+import functools
+import gzip
+import itertools
+import os
+import re
+import threading
+import zlib
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+import orjson
+
+from mock_database import get_customers_db
+
+ADDRESS_DATA_FILE = os.environ.get("ADDRESS_DATA_FILE")
+
+BLOCK_SIZE = 64
+# Decompressed blocks kept for repeated lookups in the same area
+CACHED_BLOCKS = 256
+FUZZY_CUTOFF = 0.75
+MAX_RESULTS = 5
+# Separates city and street in the keys, sorts before all other characters
+_KEY_SEPARATOR = "\x00"
+
+# Blocks decompressed by the lookup running in a thread, i.e. the misses of the block cache
+_block_loads = threading.local()
+
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_RE_HOUSE_NUMBER = re.compile(r"\s+\d+\s*[a-z]?(\s*[-/]\s*\d+\s*[a-z]?)?$", re.IGNORECASE)
+_RE_STREET_WORD = re.compile(r"strasse\b|str\b\.?")
+
+
+def normalize_street(street: str) -> str:
+    street = _RE_HOUSE_NUMBER.sub("", street.lower().strip().translate(_UMLAUTS))
+    return "".join(character for character in _RE_STREET_WORD.sub("str", street) if character.isalnum())
+
+
+def normalize_city(city: str) -> str:
+    return "".join(character for character in city.lower().translate(_UMLAUTS) if character.isalnum())
+
+
+class AddressIndex:
+    """Compressed, sorted street index with exact, prefix and fuzzy lookups. Not changed after construction."""
+
+    def __init__(self, addresses: Iterable[tuple[str, str, str]]):
+        cities: dict[str, str] = {}
+        entries = set()
+        for street, postal_code, city in addresses:
+            city_key = normalize_city(city)
+            cities.setdefault(city_key, city)
+            entries.add((f"{city_key}{_KEY_SEPARATOR}{normalize_street(street)}", street, postal_code))
+        # Display names of the cities by normalized name
+        self.cities = cities
+        self.size = len(entries)
+
+        ordered = sorted(entries)
+        self._heads = [ordered[start][0] for start in range(0, len(ordered), BLOCK_SIZE)]
+        self._blocks = [
+            zlib.compress("\n".join("\t".join(entry) for entry in ordered[start : start + BLOCK_SIZE]).encode())
+            for start in range(0, len(ordered), BLOCK_SIZE)
+        ]
+        self._block = functools.lru_cache(maxsize=CACHED_BLOCKS)(self._decompress_block)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(map(len, self._blocks)) + sum(map(len, self._heads))
+
+    def _decompress_block(self, block: int) -> list[tuple[str, ...]]:
+        _block_loads.count = getattr(_block_loads, "count", 0) + 1
+        return [tuple(line.split("\t")) for line in zlib.decompress(self._blocks[block]).decode().split("\n")]
+
+    def _entries_from(self, key: str) -> Iterator[tuple[str, ...]]:
+        """The entries from the first key not below the key on, in order."""
+        # Entries of a key can continue from the end of the previous block
+        for block in range(max(0, bisect_left(self._heads, key) - 1), len(self._blocks)):
+            entries = self._block(block)
+            yield from itertools.islice(entries, bisect_left(entries, (key,)), None)
+
+    def _with_prefix(self, prefix: str) -> Iterator[tuple[str, ...]]:
+        return itertools.takewhile(lambda entry: entry[0].startswith(prefix), self._entries_from(prefix))
+
+    def _with_key(self, key: str) -> list[tuple[str, ...]]:
+        return list(itertools.takewhile(lambda entry: entry[0] == key, self._entries_from(key)))
+
+    def _resolve_city(self, city: str) -> str | None:
+        city_key = normalize_city(city)
+        if city_key in self.cities:
+            return city_key
+        candidates = [key for key in self.cities if key[:1] == city_key[:1]]
+        matches = difflib.get_close_matches(city_key, candidates, n=1, cutoff=FUZZY_CUTOFF)
+        return matches[0] if matches else None
+
+    def resolve(self, street: str, city: str) -> dict:
+        """The postal codes of a street in a city, with the kind of match."""
+        city_key = self._resolve_city(city)
+        street_key = normalize_street(street)
+        if city_key is None or not street_key:
+            return {"status": "not_found", "message": "City or street not found. Please verify the address."}
+        city_prefix = f"{city_key}{_KEY_SEPARATOR}"
+
+        match = "exact"
+        entries = self._with_key(city_prefix + street_key)
+        if not entries:
+            match = "prefix"
+            entries = list(itertools.islice(self._with_prefix(city_prefix + street_key), MAX_RESULTS))
+        if not entries:
+            match = "fuzzy"
+            candidates = {entry[0][len(city_prefix) :] for entry in self._with_prefix(city_prefix + street_key[0])}
+            similar = difflib.get_close_matches(street_key, candidates, n=MAX_RESULTS, cutoff=FUZZY_CUTOFF)
+            entries = [entry for key in similar for entry in self._with_key(city_prefix + key)]
+        if not entries:
+            return {"status": "not_found", "message": "Street not found in this city. Please verify the address."}
+        results = [
+            {"street": street_name, "postal_code": postal_code, "city": self.cities[city_key]}
+            for _, street_name, postal_code in entries[:MAX_RESULTS]
+        ]
+        return {"status": "success", "match": match, "results": results}
+
+
+def load_addresses(path: str | None) -> Iterator[tuple[str, str, str]]:
+    """(street, postal code, city) of an address file, or of the customer addresses of the mock database."""
+    if path is None:
+        for customer in get_customers_db().values():
+            address = customer["address"]
+            street = _RE_HOUSE_NUMBER.sub("", address["street"].strip())
+            yield street, address["postal_code"], address["city"]
+        return
+    with gzip.open(path, "rt") if path.endswith(".gz") else open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            yield row["street"], row["postal_code"], row["city"]
+
+
+_index: AddressIndex | None = None
+_load_lock = threading.Lock()
+
+
+def get_address_index() -> AddressIndex:
+    global _index
+    if _index is None:
+        with _load_lock:
+            if _index is None:
+                _index = AddressIndex(load_addresses(ADDRESS_DATA_FILE))
+    return _index
+
+
+class AddressLookup(NamedTuple):
+    response: str
+    # "exact", "prefix", "fuzzy" or "none"
+    match: str
+    # Whether all blocks were read from the cache
+    cache_hit: bool
+
+
+def find_postal_codes(street: str, city: str) -> AddressLookup:
+    """The encoded response of an address lookup, and how it was answered."""
+    _block_loads.count = 0
+    result = get_address_index().resolve(street, city)
+    return AddressLookup(orjson.dumps(result).decode(), result.get("match", "none"), _block_loads.count == 0)
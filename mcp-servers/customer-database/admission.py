@@ -0,0 +1,158 @@
+"""
+Admission control: per-client rate limits and load shedding.
+
+Every client gets a token bucket that refills with the rate of its priority class. A request without a token is
+rejected at once with 429 and a Retry-After header of the time until the next token, so a runaway batch or a retry
+storm costs the server almost nothing. Beyond the rate limits, the requests in flight are bounded: batch requests
+are shed at BATCH_MAX_IN_FLIGHT, live voice sessions only at MAX_IN_FLIGHT, so voice calls keep their latency while
+batch clients back off.
+
+Clients name their priority in the X-Client-Priority header ("interactive" for live voice sessions, "batch" is the
+default). The headers are set by the clients themselves, so "interactive" is only granted together with the shared
+secret INTERACTIVE_CLIENT_TOKEN in the X-Client-Token header, otherwise a request counts as batch. Clients are told
+apart by their address together with X-Client-Id or their MCP session. As a client can choose a new id for every
+request, all clients of one address share another bucket with PEER_RATE_FACTOR times the rate of their class.
+Readiness probes and the MCP event streams (GET) are never limited.
+"""
+
+import hmac
+import math
+import os
+import time
+from collections import OrderedDict
+
+import orjson
+from opentelemetry import metrics
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITY_HEADER = b"x-client-priority"
+CLIENT_ID_HEADER = b"x-client-id"
+TOKEN_HEADER = b"x-client-token"
+SESSION_HEADER = b"mcp-session-id"
+
+# Requests per second of a client, the bucket holds the requests of BURST_SECONDS
+RATE_LIMITS = {
+    INTERACTIVE: float(os.environ.get("RATE_LIMIT_INTERACTIVE_PER_SECOND", "50")),
+    BATCH: float(os.environ.get("RATE_LIMIT_BATCH_PER_SECOND", "10")),
+}
+BURST_SECONDS = 2.0
+# Shared secret of the interactive clients, without it every request counts as batch
+INTERACTIVE_TOKEN = os.environ.get("INTERACTIVE_CLIENT_TOKEN")
+# Rate of all clients of one address, as multiple of the rate of a single client
+PEER_RATE_FACTOR = float(os.environ.get("RATE_LIMIT_PEER_FACTOR", "10"))
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT_REQUESTS", "64"))
+BATCH_MAX_IN_FLIGHT = MAX_IN_FLIGHT // 2
+# Buckets of clients that were not seen for long are dropped beyond this number
+MAX_CLIENTS = 10_000
+UNLIMITED_PATHS = {"/ready"}
+
+_meter = metrics.get_meter(__name__)
+_requests = _meter.create_counter("mcp.admission.requests", description="Requests by priority and admission outcome")
+_in_flight = _meter.create_up_down_counter("mcp.admission.in_flight", description="Admitted requests in flight")
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token. Returns 0 if there was one, else the seconds until the next one."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def _header(scope: Scope, name: bytes) -> str | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _priority(scope: Scope) -> str:
+    if _header(scope, PRIORITY_HEADER) != INTERACTIVE or not INTERACTIVE_TOKEN:
+        return BATCH
+    token = _header(scope, TOKEN_HEADER) or ""
+    return INTERACTIVE if hmac.compare_digest(token.encode(), INTERACTIVE_TOKEN.encode()) else BATCH
+
+
+def _is_limited(scope: Scope) -> bool:
+    if scope["type"] != "http" or scope["path"] in UNLIMITED_PATHS:
+        return False
+    # The event stream of an MCP session stays open for the whole session
+    return not (scope["method"] == "GET" and scope["path"].startswith("/mcp"))
+
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting or rejecting requests before they reach the MCP server."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.in_flight = 0
+        # Runs on the event loop only, so the buckets need no lock
+        # Keyed by address, client id (None for the bucket of the whole address) and priority
+        self.buckets: OrderedDict[tuple[str, str | None, str], TokenBucket] = OrderedDict()
+
+    def _bucket(self, peer: str, client: str | None, priority: str) -> TokenBucket:
+        key = (peer, client, priority)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate = RATE_LIMITS[priority] * (PEER_RATE_FACTOR if client is None else 1)
+            bucket = self.buckets[key] = TokenBucket(rate, max(1.0, rate * BURST_SECONDS))
+            if len(self.buckets) > MAX_CLIENTS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not _is_limited(scope):
+            await self.app(scope, receive, send)
+            return
+
+        priority = _priority(scope)
+        peer = scope["client"][0] if scope.get("client") else "unknown"
+        client = _header(scope, CLIENT_ID_HEADER) or _header(scope, SESSION_HEADER) or ""
+
+        if self.in_flight >= (MAX_IN_FLIGHT if priority == INTERACTIVE else BATCH_MAX_IN_FLIGHT):
+            await self._reject(send, priority, "shed", 1.0)
+            return
+        retry_after = self._bucket(peer, client, priority).take() or self._bucket(peer, None, priority).take()
+        if retry_after:
+            await self._reject(send, priority, "rate_limited", retry_after)
+            return
+
+        _requests.add(1, {"priority": priority, "outcome": "admitted"})
+        self.in_flight += 1
+        _in_flight.add(1, {"priority": priority})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            _in_flight.add(-1, {"priority": priority})
+
+    async def _reject(self, send: Send, priority: str, outcome: str, retry_after: float) -> None:
+        _requests.add(1, {"priority": priority, "outcome": outcome})
+        body = orjson.dumps({"error": "Too many requests", "reason": outcome, "retry_after": round(retry_after, 3)})
+        start: Message = {
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        }
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,130 @@
+"""
+Paginated listing and streamed export of the customers.
+
+Listings are sorted by one of the SORT_ORDERS of the customer table, for which the table keeps the rows presorted,
+and can be filtered by exact values of the FILTER_FIELDS, which are compared as category codes. Pages are continued
+with a cursor holding the query and the sort key of the last row; as the key does not depend on the position, a
+listing continues correctly also after the customer data was reloaded.
+
+A page reads at most MAX_SCAN_ROWS rows: with a filter that matches few customers, a page can therefore have fewer
+customers than requested and still a cursor to continue. The export streams all matching customers as JSON lines,
+without building the response in memory.
+"""
+
+import base64
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass
+
+import orjson
+
+from customer_table import SORT_KEY_TYPES, SORT_ORDERS, Array, CategoryColumn, CustomerTable
+
+FILTER_FIELDS = ("first_name", "last_name", "city", "postal_code", "country")
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+MAX_SCAN_ROWS = 50_000
+# Customers per chunk of the export stream
+EXPORT_BATCH = 1000
+
+
+class ListingError(ValueError):
+    """Invalid listing parameters or cursor."""
+
+
+@dataclass(frozen=True)
+class ListingQuery:
+    sort: str = "customer_id"
+    descending: bool = False
+    filters: tuple[tuple[str, str], ...] = ()
+    # Sort key of the last row read by the previous page
+    after: tuple | None = None
+
+    def __post_init__(self) -> None:
+        # Also cursors are checked, they come from the client
+        if self.sort not in SORT_ORDERS:
+            raise ListingError(f"sort must be one of {', '.join(SORT_ORDERS)}")
+        if any(field not in FILTER_FIELDS for field, _ in self.filters):
+            raise ListingError(f"filters must be one of {', '.join(FILTER_FIELDS)}")
+        # A key of other types than the keys of the order cannot be compared with them
+        key_types = SORT_KEY_TYPES[self.sort]
+        if self.after is not None and (
+            len(self.after) != len(key_types)
+            or any(type(value) is not key_type for value, key_type in zip(self.after, key_types, strict=False))
+        ):
+            raise ListingError("Invalid cursor")
+
+    @classmethod
+    def from_params(cls, params: Mapping[str, str]) -> "ListingQuery":
+        """The query of a cursor, or of the sort, order and filter parameters of a first page."""
+        if cursor := params.get("cursor"):
+            try:
+                sort, descending, filters, after = orjson.loads(base64.urlsafe_b64decode(cursor))
+                return cls(
+                    sort, bool(descending), tuple((str(field), str(value)) for field, value in filters), tuple(after)
+                )
+            except ListingError:
+                raise
+            except (ValueError, TypeError) as e:
+                raise ListingError("Invalid cursor") from e
+
+        order = params.get("order", "asc")
+        if order not in ("asc", "desc"):
+            raise ListingError("order must be asc or desc")
+        filters = tuple((field, params[field]) for field in FILTER_FIELDS if field in params)
+        return cls(params.get("sort", "customer_id"), order == "desc", filters)
+
+    def cursor(self, after: tuple) -> str:
+        return base64.urlsafe_b64encode(orjson.dumps([self.sort, self.descending, self.filters, after])).decode()
+
+    def scan(self, table: CustomerTable) -> Iterator[tuple[int, bool]]:
+        """The rows after the cursor in order, and whether each matches the filters."""
+        codes: list[tuple[Array, int]] = []
+        for field, value in self.filters:
+            column: CategoryColumn = getattr(table, field)
+            code = column.code_of(value)
+            if code is None:
+                return
+            codes.append((column.codes, code))
+        for row in table.sorted_rows(self.sort, self.descending, self.after):
+            yield row, all(column_codes[row] == code for column_codes, code in codes)
+
+
+def parse_limit(params: Mapping[str, str]) -> int:
+    try:
+        limit = int(params.get("limit", DEFAULT_LIMIT))
+    except ValueError as e:
+        raise ListingError("limit must be a number") from e
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ListingError(f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def list_customers(table: CustomerTable, query: ListingQuery, limit: int) -> bytes:
+    """The encoded page: up to `limit` customers and the cursor of the next page, null after the last one."""
+    customers: list[dict] = []
+    last_row = None
+    more = False
+    scanned = 0
+    for row, matches in query.scan(table):
+        if len(customers) == limit or scanned == MAX_SCAN_ROWS:
+            more = True
+            break
+        scanned += 1
+        last_row = row
+        if matches:
+            customers.append(table[row].to_dict())
+    next_cursor = query.cursor(table.sort_key(query.sort, last_row)) if more and last_row is not None else None
+    return orjson.dumps({"customers": customers, "next_cursor": next_cursor})
+
+
+def export_customers(table: CustomerTable, query: ListingQuery) -> Iterator[bytes]:
+    """All matching customers as JSON lines, in chunks of EXPORT_BATCH customers."""
+    batch: list[bytes] = []
+    for row, matches in query.scan(table):
+        if matches:
+            batch.append(orjson.dumps(table[row].to_dict()))
+        if len(batch) == EXPORT_BATCH:
+            yield b"\n".join(batch) + b"\n"
+            batch.clear()
+    if batch:
+        yield b"\n".join(batch) + b"\n"
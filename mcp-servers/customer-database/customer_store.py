@@ -0,0 +1,188 @@
+"""
+Customer lookups on immutable snapshots of the customer data.
+
+The customers of a snapshot are stored in a compact `CustomerTable`, so also millions of customers fit into the
+memory of a pod. Only the customer that is found is converted to its dict and encoded. The encoded responses of the
+customers looked up most recently are cached with the snapshot, so that repeated lookups of a caller during a call
+are not encoded again. A change of the data builds a new snapshot, which replaces the old one as a whole, together
+with its cache.
+
+With CUSTOMER_DATA_FILE set, the customers are loaded from that file instead of the mock database: a JSON object
+keyed by name like `get_customers_db()`, a JSON list of customer records, JSON lines with one customer per line,
+which are read without loading the whole file, or a snapshot file of snapshot_file.py, which is mapped instead of
+loaded. A background thread watches the file and builds a new snapshot after
+every change. Readers keep the snapshot they started with, so a lookup never waits for a reload and never sees a
+partially built snapshot. A file that cannot be loaded keeps the previous snapshot.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterable, Iterator
+
+import orjson
+
+from customer_table import CustomerTable
+from license_plates import parse_spoken_plate
+from mock_database import get_customers_db
+from snapshot_file import SNAPSHOT_SUFFIX, open_snapshot
+
+CUSTOMER_DATA_FILE = os.environ.get("CUSTOMER_DATA_FILE")
+RELOAD_INTERVAL_SECONDS = float(os.environ.get("CUSTOMER_DATA_RELOAD_INTERVAL_SECONDS", "5"))
+# Encoded lookup responses kept per snapshot, 0 disables the cache
+CACHED_RESPONSES = int(os.environ.get("CUSTOMER_RESPONSE_CACHE_SIZE", "1024"))
+
+NOT_FOUND_RESPONSE = orjson.dumps(
+    {"status": "not_found", "message": "Customer not found in database. Please verify the name spelling."}
+).decode()
+PLATE_NOT_FOUND_MESSAGE = "No vehicle with this license plate in the database. Please verify the plate with the caller."
+
+
+class CustomerSnapshot:
+    """Immutable view of the customer data."""
+
+    def __init__(self, table: CustomerTable, version: int = 1, mapped: bool = False):
+        self.table = table
+        self.version = version
+        # Whether the table reads from a mapped snapshot file, shared with other processes
+        self.mapped = mapped
+        # Time to read the data source and build the snapshot, set by load()
+        self.load_seconds = 0.0
+        self._customer_response = functools.lru_cache(maxsize=CACHED_RESPONSES)(self._encode_customer_response)
+
+    @classmethod
+    def load(cls, path: str | None, version: int = 1) -> "CustomerSnapshot":
+        """A snapshot of the customers in a data file, or of the mock database without a file."""
+        started = time.perf_counter()
+        if path is not None and path.endswith(SNAPSHOT_SUFFIX):
+            snapshot = cls(open_snapshot(path), version, mapped=True)
+        else:
+            snapshot = cls(CustomerTable.from_records(load_customers(path)), version)
+        snapshot.load_seconds = time.perf_counter() - started
+        return snapshot
+
+    def find_by_name(self, name: str) -> str:
+        """The encoded response of a lookup by full name (case insensitive)."""
+        customer = self.table.find_by_name(name)
+        if customer is None:
+            return NOT_FOUND_RESPONSE
+        return self._customer_response(customer.row)
+
+    def _encode_customer_response(self, row: int) -> str:
+        return orjson.dumps({"status": "success", "customer": self.table[row].to_dict()}).decode()
+
+    def find_by_license_plate(self, plate: str) -> str:
+        """The encoded response of a lookup by a written or spoken license plate, with the vehicles and owners."""
+        normalized_plate = parse_spoken_plate(plate)
+        vehicles = self.table.find_by_license_plate(normalized_plate) if normalized_plate else []
+        if not vehicles:
+            return orjson.dumps(
+                {"status": "not_found", "normalized_plate": normalized_plate, "message": PLATE_NOT_FOUND_MESSAGE}
+            ).decode()
+        matches = []
+        for vehicle in vehicles:
+            policy = vehicle.policy()
+            matches.append(
+                {"vehicle": vehicle.to_dict(), "policy_id": policy.policy_id, "customer": policy.customer().to_dict()}
+            )
+        return orjson.dumps({"status": "success", "normalized_plate": normalized_plate, "matches": matches}).decode()
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "customers": len(self.table),
+            "size_bytes": self.table.nbytes,
+            "mapped": self.mapped,
+            "load_seconds": round(self.load_seconds, 4),
+            "cached_responses": self._customer_response.cache_info().currsize,
+        }
+
+
+def _read_json_lines(path: str) -> Iterator[dict]:
+    with open(path, "rb") as file:
+        for line in file:
+            if line.strip():
+                yield orjson.loads(line)
+
+
+def load_customers(path: str | None) -> Iterable[dict]:
+    """The customer records of a data file, or of the mock database without a file."""
+    if path is None:
+        return get_customers_db().values()
+    if path.endswith((".jsonl", ".ndjson")):
+        return _read_json_lines(path)
+    with open(path, "rb") as file:
+        data = orjson.loads(file.read())
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        return data.values()
+    raise ValueError(f"Expected an object or a list of customers in {path}")
+
+
+_snapshot: CustomerSnapshot | None = None
+_load_lock = threading.Lock()
+
+
+def get_snapshot() -> CustomerSnapshot:
+    """The current snapshot. Callers keep the returned object for a whole request."""
+    snapshot = _snapshot
+    if snapshot is None:
+        with _load_lock:
+            if _snapshot is None:
+                _swap(CustomerSnapshot.load(CUSTOMER_DATA_FILE))
+            snapshot = _snapshot
+    assert snapshot is not None
+    return snapshot
+
+
+def _swap(snapshot: CustomerSnapshot) -> None:
+    # Replacing the module reference is atomic, readers see either the old or the new snapshot
+    global _snapshot
+    _snapshot = snapshot
+    logging.info(f"Customer snapshot loaded: {snapshot.stats()}")
+
+
+def reload() -> CustomerSnapshot:
+    """Build a new snapshot from the data source and swap it in. The current one serves lookups meanwhile."""
+    with _load_lock:
+        version = _snapshot.version + 1 if _snapshot else 1
+        snapshot = CustomerSnapshot.load(CUSTOMER_DATA_FILE, version)
+        _swap(snapshot)
+        return snapshot
+
+
+def _file_signature(path: str) -> tuple[int, int, int] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class CustomerDataWatcher(threading.Thread):
+    """Reloads the customer data after changes of the data file, polling its inode, size and modification time."""
+
+    def __init__(self, path: str, interval_seconds: float = RELOAD_INTERVAL_SECONDS):
+        super().__init__(name="customer-data-watcher", daemon=True)
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self._stopped = threading.Event()
+        self._signature = _file_signature(path)
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval_seconds):
+            signature = _file_signature(self.path)
+            if signature is None or signature == self._signature:
+                continue
+            # Also a failed load is not retried before the next change, which fixes the file
+            self._signature = signature
+            try:
+                reload()
+            except Exception as e:
+                logging.warning(f"Reload of {self.path} failed, keeping the current customer snapshot: {e!r}")
+
+    def stop(self) -> None:
+        self._stopped.set()
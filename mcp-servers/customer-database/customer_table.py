@@ -0,0 +1,471 @@
+"""
+Compact columnar storage of the customer records.
+
+As nested dicts and lists, a customer costs a few kilobytes of object overhead, and values like "Deutschland",
+"Kfz-Versicherung" or "Berlin" are repeated in every record. The table stores every field in its own column
+instead:
+
+- categorical columns (names, city, country, policy type and status, car make and model) keep every distinct value
+  once and a small integer code per row,
+- dates and numbers are stored in typed arrays,
+- other strings are UTF-8 encoded into one buffer per column with an array of offsets,
+- the policies of a customer and the vehicles of a policy are ranges of rows in the policy and vehicle columns.
+
+Names and license plates are looked up in sorted arrays of their hashes. For listings, the rows are also kept
+sorted by each of the SORT_ORDERS. Rows are read through `CustomerView`, and the dict of a
+customer is only built for the customer that is returned. The schema is that of `get_customers_db()`, other fields
+are not kept.
+
+All columns and the index consist of flat buffers, see `CustomerTable.buffers()`. A table can therefore also read
+them from memory views of a snapshot file, see snapshot_file.py.
+"""
+
+import hashlib
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+from datetime import date
+
+from license_plates import normalize_plate
+
+# Smallest typecodes first, columns switch to the next one when a value does not fit
+_UNSIGNED_TYPECODES = ("B", "H", "I", "Q")
+
+# Orders of the customer listing, every one ends with the customer id and the row to be unique
+SORT_ORDERS = ("customer_id", "name", "birth_date")
+# Types of the values of the sort keys of each order, see `CustomerTable.sort_key`
+SORT_KEY_TYPES: dict[str, tuple[type, ...]] = {
+    "customer_id": (str, int),
+    "name": (str, str, str, int),
+    "birth_date": (int, str, int),
+}
+
+# Arrays while a table is built, memory views of the same layout when it is read from a snapshot file
+type Array = array | memoryview
+type Bytes = bytearray | memoryview
+type Buffer = Array | Bytes
+
+
+def normalize_name(name: str) -> str:
+    return name.lower().strip()
+
+
+def key_hash(key: str) -> int:
+    """Hash of an index key, the same in every process unlike `hash()`."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little", signed=True)
+
+
+def _hash_index(keys: Iterable[str]) -> tuple[array, array]:
+    """The hashes of the keys in ascending order and the row of each hash."""
+    hashes = array("q", map(key_hash, keys))
+    rows = sorted(range(len(hashes)), key=hashes.__getitem__)
+    return array("q", (hashes[row] for row in rows)), array("I", rows)
+
+
+def _index_rows(hashes: Array, rows: Array, key: str) -> Iterator[int]:
+    """The rows whose key has the hash of the key. Callers compare the keys, as hashes can collide."""
+    hash_value = key_hash(key)
+    position = bisect_left(hashes, hash_value)
+    while position < len(hashes) and hashes[position] == hash_value:
+        yield rows[position]
+        position += 1
+
+
+def _widen(values: array, value: int) -> array:
+    """The array, converted to a larger unsigned typecode if the value does not fit."""
+    while value >= 1 << (8 * values.itemsize):
+        values = array(_UNSIGNED_TYPECODES[_UNSIGNED_TYPECODES.index(values.typecode) + 1], values)
+    return values
+
+
+class CategoryColumn:
+    """Column of a value with few distinct values: every value is stored once, rows hold its code."""
+
+    def __init__(self) -> None:
+        # Distinct values in a list while building, in a string column when read from buffers
+        self.values: list[str] | StringColumn = []
+        self._codes: dict[str, int] = {}
+        self.codes: Array = array("B")
+
+    def append(self, value: str) -> None:
+        assert isinstance(self.values, list) and isinstance(self.codes, array)
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            value = sys.intern(value)
+            self.values.append(value)
+            self._codes[value] = code
+            self.codes = _widen(self.codes, code)
+        self.codes.append(code)
+
+    def __getitem__(self, row: int) -> str:
+        return self.values[self.codes[row]]
+
+    def code_of(self, value: str) -> int | None:
+        """The code of a value, None if no row has it."""
+        if isinstance(self.values, list):
+            return self._codes.get(value)
+        return next((code for code in range(len(self.values)) if self.values[code] == value), None)
+
+    @property
+    def nbytes(self) -> int:
+        if isinstance(self.values, StringColumn):
+            distinct = self.values.nbytes
+        else:
+            distinct = sys.getsizeof(self.values) + sys.getsizeof(self._codes) + sum(map(sys.getsizeof, self.values))
+        return self.codes.itemsize * len(self.codes) + distinct
+
+    def buffers(self) -> dict[str, Buffer]:
+        if isinstance(self.values, list):
+            values = StringColumn()
+            for value in self.values:
+                values.append(value)
+        else:
+            values = self.values
+        return {"codes": self.codes, "values.data": values.data, "values.offsets": values.offsets}
+
+    @classmethod
+    def from_buffers(cls, buffers: dict[str, memoryview]) -> "CategoryColumn":
+        column = cls()
+        column.codes = buffers["codes"]
+        column.values = StringColumn.from_buffers(
+            {"data": buffers["values.data"], "offsets": buffers["values.offsets"]}
+        )
+        return column
+
+
+class StringColumn:
+    """Column of strings that are mostly distinct, UTF-8 encoded into one buffer."""
+
+    def __init__(self) -> None:
+        self.data: Bytes = bytearray()
+        # Row i is data[offsets[i]:offsets[i + 1]]
+        self.offsets: Array = array("I", [0])
+
+    def append(self, value: str) -> None:
+        assert isinstance(self.data, bytearray) and isinstance(self.offsets, array)
+        self.data += value.encode()
+        self.offsets = _widen(self.offsets, len(self.data))
+        self.offsets.append(len(self.data))
+
+    def __getitem__(self, row: int) -> str:
+        return str(self.data[self.offsets[row] : self.offsets[row + 1]], "utf-8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+    def buffers(self) -> dict[str, Buffer]:
+        return {"data": self.data, "offsets": self.offsets}
+
+    @classmethod
+    def from_buffers(cls, buffers: dict[str, memoryview]) -> "StringColumn":
+        column = cls()
+        column.data = buffers["data"]
+        column.offsets = buffers["offsets"]
+        return column
+
+
+class DateColumn:
+    """Column of ISO dates, stored as day ordinals."""
+
+    def __init__(self) -> None:
+        self.ordinals: Array = array("I")
+
+    def append(self, value: str) -> None:
+        assert isinstance(self.ordinals, array)
+        self.ordinals.append(date.fromisoformat(value).toordinal())
+
+    def __getitem__(self, row: int) -> str:
+        return date.fromordinal(self.ordinals[row]).isoformat()
+
+    @property
+    def nbytes(self) -> int:
+        return self.ordinals.itemsize * len(self.ordinals)
+
+    def buffers(self) -> dict[str, Buffer]:
+        return {"ordinals": self.ordinals}
+
+    @classmethod
+    def from_buffers(cls, buffers: dict[str, memoryview]) -> "DateColumn":
+        column = cls()
+        column.ordinals = buffers["ordinals"]
+        return column
+
+
+class RangeColumn:
+    """Rows of a child table per row, e.g. the policies of a customer: row i owns [starts[i], starts[i + 1])."""
+
+    def __init__(self) -> None:
+        self.starts: Array = array("I", [0])
+
+    def append(self, count: int) -> None:
+        assert isinstance(self.starts, array)
+        self.starts.append(self.starts[-1] + count)
+
+    def __getitem__(self, row: int) -> range:
+        return range(self.starts[row], self.starts[row + 1])
+
+    def owner(self, child_row: int) -> int:
+        """The row whose range contains the child row."""
+        return bisect_right(self.starts, child_row) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.starts.itemsize * len(self.starts)
+
+    def buffers(self) -> dict[str, Buffer]:
+        return {"starts": self.starts}
+
+    @classmethod
+    def from_buffers(cls, buffers: dict[str, memoryview]) -> "RangeColumn":
+        column = cls()
+        column.starts = buffers["starts"]
+        return column
+
+
+class CustomerView:
+    """A customer row of a table. The dict of the customer is only built by `to_dict()`."""
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: "CustomerTable", row: int):
+        self.table = table
+        self.row = row
+
+    @property
+    def name(self) -> str:
+        return f"{self.table.first_name[self.row]} {self.table.last_name[self.row]}"
+
+    @property
+    def customer_id(self) -> str:
+        return self.table.customer_id[self.row]
+
+    def policies(self) -> list["PolicyView"]:
+        return [PolicyView(self.table, policy) for policy in self.table.customer_policies[self.row]]
+
+    def to_dict(self) -> dict:
+        table, row = self.table, self.row
+        return {
+            "first_name": table.first_name[row],
+            "last_name": table.last_name[row],
+            "birth_date": table.birth_date[row],
+            "customer_id": table.customer_id[row],
+            "phone": table.phone[row],
+            "email": table.email[row],
+            "address": {
+                "street": table.street[row],
+                "city": table.city[row],
+                "postal_code": table.postal_code[row],
+                "country": table.country[row],
+            },
+            "policies": [policy.to_dict() for policy in self.policies()],
+        }
+
+
+class PolicyView:
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: "CustomerTable", row: int):
+        self.table = table
+        self.row = row
+
+    @property
+    def policy_id(self) -> str:
+        return self.table.policy_id[self.row]
+
+    def customer(self) -> CustomerView:
+        return CustomerView(self.table, self.table.customer_policies.owner(self.row))
+
+    def to_dict(self) -> dict:
+        table, row = self.table, self.row
+        policy: dict = {
+            "policy_id": table.policy_id[row],
+            "type": table.policy_type[row],
+            "status": table.policy_status[row],
+            "start_date": table.policy_start_date[row],
+        }
+        vehicles = table.policy_vehicles[row]
+        # Policies without vehicles, e.g. other lines than motor insurance, have no vehicles field
+        if vehicles:
+            policy["vehicles"] = [VehicleView(table, vehicle).to_dict() for vehicle in vehicles]
+        return policy
+
+
+class VehicleView:
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: "CustomerTable", row: int):
+        self.table = table
+        self.row = row
+
+    def policy(self) -> PolicyView:
+        return PolicyView(self.table, self.table.policy_vehicles.owner(self.row))
+
+    def to_dict(self) -> dict:
+        table, row = self.table, self.row
+        return {
+            "license_plate": table.license_plate[row],
+            "make": table.vehicle_make[row],
+            "model": table.vehicle_model[row],
+            "year": table.vehicle_year[row],
+        }
+
+
+class CustomerTable:
+    """The customers in columns, with a hash index of the names. Not changed after `from_records()`."""
+
+    def __init__(self) -> None:
+        self.first_name = CategoryColumn()
+        self.last_name = CategoryColumn()
+        self.birth_date = DateColumn()
+        self.customer_id = StringColumn()
+        self.phone = StringColumn()
+        self.email = StringColumn()
+        self.street = StringColumn()
+        self.city = CategoryColumn()
+        self.postal_code = CategoryColumn()
+        self.country = CategoryColumn()
+        self.customer_policies = RangeColumn()
+
+        self.policy_id = StringColumn()
+        self.policy_type = CategoryColumn()
+        self.policy_status = CategoryColumn()
+        self.policy_start_date = DateColumn()
+        self.policy_vehicles = RangeColumn()
+
+        self.license_plate = StringColumn()
+        self.vehicle_make = CategoryColumn()
+        self.vehicle_model = CategoryColumn()
+        self.vehicle_year: Array = array("H")
+
+        # Hashes of the normalized names and plates in ascending order and the customer or vehicle row of each hash
+        self._name_hashes: Array = array("q")
+        self._name_rows: Array = array("I")
+        self._plate_hashes: Array = array("q")
+        self._plate_rows: Array = array("I")
+        # Customer rows in the SORT_ORDERS
+        self._order_customer_id: Array = array("I")
+        self._order_name: Array = array("I")
+        self._order_birth_date: Array = array("I")
+
+    @classmethod
+    def from_records(cls, customers: Iterable[dict]) -> "CustomerTable":
+        """A table of customer dicts in the format of `get_customers_db()`. Records are only read once."""
+        table = cls()
+        for customer in customers:
+            table._append(customer)
+        table._build_indexes()
+        return table
+
+    def _append(self, customer: dict) -> None:
+        address = customer["address"]
+        self.first_name.append(customer["first_name"])
+        self.last_name.append(customer["last_name"])
+        self.birth_date.append(customer["birth_date"])
+        self.customer_id.append(customer["customer_id"])
+        self.phone.append(customer["phone"])
+        self.email.append(customer["email"])
+        self.street.append(address["street"])
+        self.city.append(address["city"])
+        self.postal_code.append(address["postal_code"])
+        self.country.append(address["country"])
+        self.customer_policies.append(len(customer["policies"]))
+        for policy in customer["policies"]:
+            vehicles = policy.get("vehicles", [])
+            self.policy_id.append(policy["policy_id"])
+            self.policy_type.append(policy["type"])
+            self.policy_status.append(policy["status"])
+            self.policy_start_date.append(policy["start_date"])
+            self.policy_vehicles.append(len(vehicles))
+            for vehicle in vehicles:
+                self.license_plate.append(vehicle["license_plate"])
+                self.vehicle_make.append(vehicle["make"])
+                self.vehicle_model.append(vehicle["model"])
+                assert isinstance(self.vehicle_year, array)
+                self.vehicle_year.append(vehicle["year"])
+
+    def _build_indexes(self) -> None:
+        self._name_hashes, self._name_rows = _hash_index(normalize_name(self[row].name) for row in range(len(self)))
+        self._plate_hashes, self._plate_rows = _hash_index(
+            normalize_plate(self.license_plate[row]) for row in range(len(self.license_plate))
+        )
+        for order in SORT_ORDERS:
+            rows = sorted(range(len(self)), key=lambda row: self.sort_key(order, row))
+            setattr(self, f"_order_{order}", array("I", rows))
+
+    def __len__(self) -> int:
+        return len(self.first_name.codes)
+
+    def __getitem__(self, row: int) -> CustomerView:
+        return CustomerView(self, row)
+
+    def sort_key(self, order: str, row: int) -> tuple:
+        """The key of a customer row in one of the SORT_ORDERS, made of JSON values."""
+        if order == "name":
+            return self.last_name[row], self.first_name[row], self.customer_id[row], row
+        if order == "birth_date":
+            return self.birth_date.ordinals[row], self.customer_id[row], row
+        return self.customer_id[row], row
+
+    def sorted_rows(self, order: str, descending: bool = False, after: tuple | None = None) -> Iterator[int]:
+        """The customer rows in one of the SORT_ORDERS, starting after the row with the sort key `after`."""
+        rows: Array = getattr(self, f"_order_{order}")
+        if after is None:
+            positions = range(len(rows) - 1, -1, -1) if descending else range(len(rows))
+        elif descending:
+            positions = range(bisect_left(rows, after, key=lambda row: self.sort_key(order, row)) - 1, -1, -1)
+        else:
+            positions = range(bisect_right(rows, after, key=lambda row: self.sort_key(order, row)), len(rows))
+        for position in positions:
+            yield rows[position]
+
+    def find_by_name(self, name: str) -> CustomerView | None:
+        """The customer with the full name (case insensitive), the first one if several have the same name."""
+        key = normalize_name(name)
+        for row in _index_rows(self._name_hashes, self._name_rows, key):
+            if normalize_name(self[row].name) == key:
+                return self[row]
+        return None
+
+    def find_by_license_plate(self, plate: str) -> list[VehicleView]:
+        """The vehicles with the plate, compared in normalized form (see license_plates.py)."""
+        key = normalize_plate(plate)
+        rows = _index_rows(self._plate_hashes, self._plate_rows, key)
+        return [VehicleView(self, row) for row in rows if normalize_plate(self.license_plate[row]) == key]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of the columns and the index."""
+        columns = [value for value in vars(self).values() if hasattr(value, "nbytes")]
+        arrays = [value for value in vars(self).values() if isinstance(value, array | memoryview)]
+        return sum(column.nbytes for column in columns) + sum(values.itemsize * len(values) for values in arrays)
+
+    def buffers(self) -> dict[str, Buffer]:
+        """All buffers of the columns and the index, named `<column>` or `<column>.<buffer>`."""
+        buffers: dict[str, Buffer] = {}
+        for name, value in vars(self).items():
+            if isinstance(value, array):
+                buffers[name] = value
+            else:
+                buffers.update({f"{name}.{key}": buffer for key, buffer in value.buffers().items()})
+        return buffers
+
+    @classmethod
+    def from_buffers(cls, buffers: dict[str, memoryview]) -> "CustomerTable":
+        """A table on the buffers of `buffers()`, without copying them."""
+        table = cls()
+        for name, value in list(vars(table).items()):
+            if isinstance(value, array):
+                setattr(table, name, buffers[name])
+            else:
+                prefix = f"{name}."
+                column_buffers = {
+                    key.removeprefix(prefix): buffer for key, buffer in buffers.items() if key.startswith(prefix)
+                }
+                setattr(table, name, type(value).from_buffers(column_buffers))
+        return table
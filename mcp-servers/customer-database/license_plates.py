@@ -0,0 +1,299 @@
+"""
+Normalization of German license plates, written or spoken.
+
+Plates are compared in their normalized form: upper case letters and digits without separators, e.g. "BJD1234" for
+"B-JD-1234". Callers read plates out in many ways, and the transcription keeps them that way: "Berlin J D zwölf
+vierunddreißig", "B minus JD 1234" or "Be Jot De eins zwei drei vier" all mean B-JD-1234. `parse_spoken_plate`
+turns such a statement into the normalized plate:
+
+- a city at the start becomes its district code ("Berlin" → B),
+- spelled letters ("Jot", "Zett") and words of the German spelling alphabet ("Dora", "Martha") become letters,
+- number words become digits, where every word is a group of digits ("zwölf vierunddreißig" → 1234),
+- separators ("minus", "Strich", "-") and filler words ("äh", "mein Kennzeichen ist") are dropped.
+
+Tokens written in upper case ("HA", "ES") are taken literally, as they are district codes or letters already.
+"""
+
+import re
+
+# District codes of the larger German cities, as callers name the city instead of the code
+CITY_CODES = {
+    "aachen": "AC",
+    "augsburg": "A",
+    "berlin": "B",
+    "bielefeld": "BI",
+    "bochum": "BO",
+    "bonn": "BN",
+    "braunschweig": "BS",
+    "bremen": "HB",
+    "chemnitz": "C",
+    "cottbus": "CB",
+    "darmstadt": "DA",
+    "dortmund": "DO",
+    "dresden": "DD",
+    "duisburg": "DU",
+    "duesseldorf": "D",
+    "erfurt": "EF",
+    "essen": "E",
+    "frankfurt": "F",
+    "freiburg": "FR",
+    "gelsenkirchen": "GE",
+    "goettingen": "GÖ",
+    "hagen": "HA",
+    "halle": "HAL",
+    "hamburg": "HH",
+    "hannover": "H",
+    "heidelberg": "HD",
+    "ingolstadt": "IN",
+    "jena": "J",
+    "karlsruhe": "KA",
+    "kassel": "KS",
+    "kiel": "KI",
+    "koeln": "K",
+    "krefeld": "KR",
+    "leipzig": "L",
+    "luebeck": "HL",
+    "magdeburg": "MD",
+    "mainz": "MZ",
+    "mannheim": "MA",
+    "moenchengladbach": "MG",
+    "muenchen": "M",
+    "muenster": "MS",
+    "nuernberg": "N",
+    "oldenburg": "OL",
+    "osnabrueck": "OS",
+    "potsdam": "P",
+    "regensburg": "R",
+    "rostock": "HRO",
+    "saarbruecken": "SB",
+    "schwerin": "SN",
+    "stuttgart": "S",
+    "trier": "TR",
+    "ulm": "UL",
+    "wiesbaden": "WI",
+    "wolfsburg": "WOB",
+    "wuerzburg": "WÜ",
+    "wuppertal": "W",
+}
+
+# Letters as they are pronounced, and the words of the German spelling alphabet (DIN 5009, old and new)
+LETTER_WORDS = {
+    "a": "A",
+    "ah": "A",
+    "be": "B",
+    "ce": "C",
+    "ze": "C",
+    "de": "D",
+    "e": "E",
+    "eh": "E",
+    "ef": "F",
+    "ge": "G",
+    "ha": "H",
+    "i": "I",
+    "ih": "I",
+    "jot": "J",
+    "ka": "K",
+    "el": "L",
+    "em": "M",
+    "en": "N",
+    "o": "O",
+    "oh": "O",
+    "pe": "P",
+    "ku": "Q",
+    "er": "R",
+    "es": "S",
+    "te": "T",
+    "u": "U",
+    "uh": "U",
+    "vau": "V",
+    "we": "W",
+    "ix": "X",
+    "ypsilon": "Y",
+    "zett": "Z",
+    "ae": "Ä",
+    "oe": "Ö",
+    "ue": "Ü",
+    "anton": "A",
+    "aachen": "A",
+    "berta": "B",
+    "caesar": "C",
+    "chemnitz": "C",
+    "dora": "D",
+    "duesseldorf": "D",
+    "emil": "E",
+    "essen": "E",
+    "friedrich": "F",
+    "frankfurt": "F",
+    "gustav": "G",
+    "goslar": "G",
+    "heinrich": "H",
+    "hamburg": "H",
+    "ida": "I",
+    "ingelheim": "I",
+    "julius": "J",
+    "jena": "J",
+    "kaufmann": "K",
+    "konrad": "K",
+    "koeln": "K",
+    "ludwig": "L",
+    "leipzig": "L",
+    "martha": "M",
+    "muenchen": "M",
+    "nordpol": "N",
+    "nuernberg": "N",
+    "otto": "O",
+    "offenbach": "O",
+    "paula": "P",
+    "potsdam": "P",
+    "quelle": "Q",
+    "richard": "R",
+    "rostock": "R",
+    "samuel": "S",
+    "siegfried": "S",
+    "salzwedel": "S",
+    "theodor": "T",
+    "tuebingen": "T",
+    "ulrich": "U",
+    "unna": "U",
+    "viktor": "V",
+    "voelklingen": "V",
+    "wilhelm": "W",
+    "wuppertal": "W",
+    "xanthippe": "X",
+    "zacharias": "Z",
+    "zeppelin": "Z",
+    "zwickau": "Z",
+    "aerger": "Ä",
+    "oekonom": "Ö",
+    "uebermut": "Ü",
+}
+
+# Separators and filler words around the plate, which are not part of it
+IGNORED_WORDS = {
+    "minus",
+    "strich",
+    "bindestrich",
+    "querstrich",
+    "leerzeichen",
+    "und",
+    "dann",
+    "also",
+    "aeh",
+    "aehm",
+    "ehm",
+    "hm",
+    "ja",
+    "genau",
+    "das",
+    "mein",
+    "meins",
+    "kennzeichen",
+    "nummernschild",
+    "lautet",
+    "ist",
+    "wie",
+}
+
+_UNITS = {
+    "null": 0,
+    "ein": 1,
+    "eins": 1,
+    "zwei": 2,
+    "zwo": 2,
+    "drei": 3,
+    "vier": 4,
+    "fuenf": 5,
+    "sechs": 6,
+    "sieben": 7,
+    "acht": 8,
+    "neun": 9,
+}
+_TEENS = {
+    "zehn": 10,
+    "elf": 11,
+    "zwoelf": 12,
+    "dreizehn": 13,
+    "vierzehn": 14,
+    "fuenfzehn": 15,
+    "sechzehn": 16,
+    "siebzehn": 17,
+    "achtzehn": 18,
+    "neunzehn": 19,
+}
+_TENS = {
+    "zwanzig": 20,
+    "dreissig": 30,
+    "vierzig": 40,
+    "fuenfzig": 50,
+    "sechzig": 60,
+    "siebzig": 70,
+    "achtzig": 80,
+    "neunzig": 90,
+}
+
+_RE_TOKEN = re.compile(r"[^\W_]+")
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+
+def normalize_plate(plate: str) -> str:
+    """A written plate in normalized form, e.g. "BJD1234" for "B-JD 1234"."""
+    return "".join(character for character in plate.upper() if character.isalnum())
+
+
+def _below_hundred(word: str) -> int | None:
+    if word in _UNITS:
+        return _UNITS[word]
+    if word in _TEENS:
+        return _TEENS[word]
+    if word in _TENS:
+        return _TENS[word]
+    unit, separator, tens = word.partition("und")
+    if separator and unit in _UNITS and tens in _TENS:
+        return _UNITS[unit] + _TENS[tens]
+    return None
+
+
+def _below_thousand(word: str) -> int | None:
+    if not word:
+        return 0
+    hundreds, separator, rest = word.partition("hundert")
+    if not separator:
+        return _below_hundred(word)
+    factor = _below_hundred(hundreds) if hundreds else 1
+    remainder = _below_hundred(rest) if rest else 0
+    if factor is None or remainder is None:
+        return None
+    return factor * 100 + remainder
+
+
+def parse_number_word(word: str) -> int | None:
+    """The value of a German number word up to 9999, e.g. 1234 for "eintausendzweihundertvierunddreißig"."""
+    word = word.lower().translate(_UMLAUTS)
+    thousands, separator, rest = word.partition("tausend")
+    if not separator:
+        return _below_thousand(word) if word else None
+    factor = _below_thousand(thousands) if thousands else 1
+    remainder = _below_thousand(rest)
+    if not factor or remainder is None:
+        return None
+    return factor * 1000 + remainder
+
+
+def parse_spoken_plate(text: str) -> str:
+    """The normalized plate of a written or spoken statement, e.g. "BJD1234" for "Berlin J D zwölf vierunddreißig"."""
+    parts: list[str] = []
+    for token in _RE_TOKEN.findall(text):
+        word = token.lower().translate(_UMLAUTS)
+        if word in IGNORED_WORDS:
+            continue
+        if not parts and word in CITY_CODES:
+            parts.append(CITY_CODES[word])
+        elif token.isupper() or any(character.isdigit() for character in token):
+            parts.append(token.upper())
+        elif word in LETTER_WORDS:
+            parts.append(LETTER_WORDS[word])
+        elif (number := parse_number_word(word)) is not None:
+            parts.append(str(number))
+        else:
+            parts.append(token.upper())
+    return normalize_plate("".join(parts))
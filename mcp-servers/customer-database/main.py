@@ -5,37 +5,128 @@ Claims Tools MCP Server
 FastMCP server providing customer data and utility tools for insurance claims processing.
 """
 
+import asyncio
+import hmac
 import logging
 import os
+import threading
+import time
 
 from fastmcp import FastMCP
-from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from fastmcp.tools.base import ToolResult
+from mcp.types import TextContent
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
 
-from mock_database import find_customer_by_name
+from admission import AdmissionMiddleware
+from address_index import find_postal_codes, get_address_index
+from customer_listing import ListingError, ListingQuery, export_customers, list_customers, parse_limit
+from customer_store import CUSTOMER_DATA_FILE, CustomerDataWatcher, get_snapshot
+from tool_metrics import record_tool_call
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Configure OpenTelemetry (reads from OTEL_SERVICE_NAME, OTEL_EXPORTER_OTLP_ENDPOINT env vars)
-trace_provider = TracerProvider()
-if os.environ.get("OTEL_EXPORTER_OTLP_PROTOCOL", "grpc") == "grpc":
-    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter as OTLPSpanExporterGrpc
+# Set by the warm-up when the server can answer requests at full speed
+ready = threading.Event()
+# Bearer token of the customer listing and export, which are not available without it
+LISTING_TOKEN = os.environ.get("CUSTOMER_LISTING_TOKEN")
 
-    trace_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporterGrpc()))
-else:
-    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter as OTLPSpanExporterHttp
 
-    trace_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporterHttp()))
-trace.set_tracer_provider(trace_provider)
+def setup_telemetry() -> None:
+    """Configure OpenTelemetry traces and metrics (reads from OTEL_SERVICE_NAME, OTEL_EXPORTER_OTLP_ENDPOINT env vars)"""
+    # The SDK and only the exporter stack of the configured protocol are imported here, not at startup
+    from opentelemetry import metrics, trace
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    trace_provider = TracerProvider()
+    if os.environ.get("OTEL_EXPORTER_OTLP_PROTOCOL", "grpc") == "grpc":
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter as OTLPMetricExporterGrpc
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter as OTLPSpanExporterGrpc
+
+        trace_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporterGrpc()))
+        metric_reader = PeriodicExportingMetricReader(OTLPMetricExporterGrpc())
+    else:
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter as OTLPMetricExporterHttp
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter as OTLPSpanExporterHttp
+
+        trace_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporterHttp()))
+        metric_reader = PeriodicExportingMetricReader(OTLPMetricExporterHttp())
+    trace.set_tracer_provider(trace_provider)
+    metrics.set_meter_provider(MeterProvider(metric_readers=[metric_reader]))
+
+
+def warm_up() -> None:
+    """Set up telemetry and load the customer data and the address index while the server starts, then report ready."""
+    started = time.perf_counter()
+    setup_telemetry()
+    if CUSTOMER_DATA_FILE:
+        CustomerDataWatcher(CUSTOMER_DATA_FILE).start()
+    get_snapshot()
+    get_address_index()
+    ready.set()
+    logging.info(f"Warm-up finished after {time.perf_counter() - started:.2f}s")
+
 
 # Create the FastMCP server instance
 mcp = FastMCP("Claims Tools")
 
 
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready_endpoint(request: Request) -> JSONResponse:
+    """Readiness: telemetry is set up and the customer data is loaded. Also reports the current customer snapshot."""
+    if not ready.is_set():
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return JSONResponse({"status": "ready", "customer_snapshot": get_snapshot().stats()})
+
+
+def _listing_denied(request: Request) -> JSONResponse | None:
+    """The response to a listing request without the listing token, None if the request has it."""
+    if not LISTING_TOKEN:
+        return JSONResponse({"error": "not found"}, status_code=404)
+    token = request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(token.encode(), LISTING_TOKEN.encode()):
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    return None
+
+
+@mcp.custom_route("/customers", methods=["GET"])
+async def customers_endpoint(request: Request) -> Response:
+    """A page of customers, continued with the next_cursor of the previous page."""
+    if denied := _listing_denied(request):
+        return denied
+    try:
+        query = ListingQuery.from_params(request.query_params)
+        limit = parse_limit(request.query_params)
+    except ListingError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    page = await asyncio.to_thread(list_customers, get_snapshot().table, query, limit)
+    return Response(page, media_type="application/json")
+
+
+@mcp.custom_route("/customers/export", methods=["GET"])
+async def customers_export_endpoint(request: Request) -> Response:
+    """All matching customers as JSON lines, read from the snapshot current when the export started."""
+    if denied := _listing_denied(request):
+        return denied
+    try:
+        query = ListingQuery.from_params(request.query_params)
+    except ListingError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    # Starlette iterates synchronous iterators in a thread pool
+    return StreamingResponse(export_customers(get_snapshot().table, query), media_type="application/x-ndjson")
+
+
+def _backend(mapped: bool) -> str:
+    return "snapshot_file" if mapped else "memory"
+
+
 @mcp.tool()
-def get_user_data(name: str) -> dict:
+def get_user_data(name: str) -> ToolResult:
     """
     Retrieve customer data by name for insurance claims processing.
 
@@ -71,12 +162,96 @@ def get_user_data(name: str) -> dict:
         }
     """
     logging.info(f"Retrieving user data for: {name}")
-    return find_customer_by_name(name)
+    started = time.perf_counter()
+    snapshot = get_snapshot()
+    response = snapshot.find_by_name(name)
+    record_tool_call("get_user_data", started, response, _backend(snapshot.mapped), "name_index")
+    # The response is encoded in advance and sent as text content only. Without structured content, neither
+    # FastMCP nor the MCP SDK walk the customer record again to convert and validate it.
+    return ToolResult(content=[TextContent(type="text", text=response)])
+
+
+@mcp.tool()
+def find_by_license_plate(plate: str) -> ToolResult:
+    """
+    Find a vehicle and its owner by license plate.
+
+    The plate can be passed as the caller said it, e.g. "Berlin J D zwölf vierunddreißig", "B minus JD 1234" or
+    "B-JD-1234": city names, spelled letters and number words are converted to the plate.
+
+    Args:
+        plate: The license plate, written or as spoken by the caller
+
+    Returns:
+        Dictionary with the matching vehicles, or not_found.
+
+        Success response structure:
+        {
+            "status": "success",
+            "normalized_plate": str (e.g. "BJD1234"),
+            "matches": [
+                {
+                    "vehicle": {"license_plate": str, "make": str, "model": str, "year": int},
+                    "policy_id": str,
+                    "customer": dict (same structure as in get_user_data)
+                }
+            ]
+        }
+
+        Error response structure:
+        {
+            "status": "not_found",
+            "normalized_plate": str,
+            "message": str
+        }
+    """
+    logging.info(f"Finding vehicle by license plate: {plate}")
+    started = time.perf_counter()
+    snapshot = get_snapshot()
+    response = snapshot.find_by_license_plate(plate)
+    record_tool_call("find_by_license_plate", started, response, _backend(snapshot.mapped), "plate_index")
+    return ToolResult(content=[TextContent(type="text", text=response)])
+
+
+@mcp.tool()
+def resolve_address(street: str, city: str) -> ToolResult:
+    """
+    Resolve the postal code (PLZ) of a German address, offline.
+
+    House numbers, case, umlauts and abbreviations like "Str." are ignored. A street that is not found exactly is
+    completed by prefix or matched by similarity, the city as well.
+
+    Args:
+        street: Street name, optionally with house number (e.g. "Friedrichstr. 45")
+        city: City name (e.g. "Berlin")
+
+    Returns:
+        Dictionary with the matching streets and their postal codes, or not_found.
+
+        Success response structure:
+        {
+            "status": "success",
+            "match": "exact" | "prefix" | "fuzzy",
+            "results": [{"street": str, "postal_code": str, "city": str}]
+        }
+
+        Error response structure:
+        {
+            "status": "not_found",
+            "message": str
+        }
+    """
+    logging.info(f"Resolving address: {street}, {city}")
+    started = time.perf_counter()
+    lookup = find_postal_codes(street, city)
+    record_tool_call("resolve_address", started, lookup.response, "address_index", lookup.match, lookup.cache_hit)
+    return ToolResult(content=[TextContent(type="text", text=lookup.response)])
 
 
 def main():
     """Main entry point for the Claims Tools MCP server."""
-    mcp.run(transport="streamable-http", host="0.0.0.0", port=8000)
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    mcp.run(transport="streamable-http", host="0.0.0.0", port=8000, middleware=[Middleware(AdmissionMiddleware)])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark of the customer table.
+
+Builds a table of synthetic customers derived from the mock database and reports the memory per customer, compared
+to the nested dicts of `get_customers_db()`, and the time of a lookup:
+
+    uv run python memory_benchmark.py --rows 10000000
+
+With `--workers`, the table is also written to a snapshot file, which that many processes map and read from, and
+the private and shared memory of each process is reported.
+"""
+
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Iterator
+
+import orjson
+
+from customer_table import CustomerTable
+from mock_database import get_customers_db
+from snapshot_file import open_snapshot, write_snapshot
+
+# Distinct last names of the synthetic customers per last name of the mock database
+LAST_NAME_VARIANTS = 5000
+
+
+def synthetic_customers(rows: int) -> Iterator[dict]:
+    """Customers with the shape and the repeated values of the mock data, and distinct ids and contact data."""
+    templates = list(get_customers_db().values())
+    for row in range(rows):
+        template = templates[row % len(templates)]
+        policy = template["policies"][0]
+        vehicle = policy["vehicles"][0]
+        last_name = f"{template['last_name']}{row // len(templates) % LAST_NAME_VARIANTS}"
+        yield {
+            "first_name": template["first_name"],
+            "last_name": last_name,
+            "birth_date": template["birth_date"],
+            "customer_id": f"{row:08x}-{template['customer_id'][9:]}",
+            "phone": f"+49-151-{row:08d}",
+            "email": f"{template['first_name'].lower()}.{last_name.lower()}.{row}@email.de",
+            "address": dict(template["address"], street=f"{template['address']['street']}{row % 200}"),
+            "policies": [
+                dict(
+                    policy,
+                    policy_id=f"KFZ-{row:08d}-2024",
+                    vehicles=[dict(vehicle, license_plate=f"B-{row % 676:03d}-{row % 9999}")],
+                )
+            ],
+        }
+
+
+def resident_bytes() -> int:
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def mapped_worker(path: str) -> None:
+    """Open a snapshot file, look up customers across the whole table and print the memory of the process."""
+    started = time.perf_counter()
+    table = open_snapshot(path)
+    open_seconds = time.perf_counter() - started
+    for row in range(0, len(table), max(1, len(table) // 1000)):
+        customer = table.find_by_name(table[row].name)
+        assert customer is not None
+        orjson.dumps(customer.to_dict())
+    # The memory is measured while all workers map the file, otherwise pages only one of them uses count as private
+    print("ready", flush=True)
+    sys.stdin.readline()
+    with open("/proc/self/smaps_rollup") as file:
+        memory = {line.split(":")[0]: int(line.split()[1]) for line in file if line.endswith("kB\n")}
+    private, shared = memory["Private_Clean"] + memory["Private_Dirty"], memory["Shared_Clean"] + memory["Shared_Dirty"]
+    print(f"  opened in {open_seconds * 1000:.1f} ms, {private / 1024:.0f} MiB private, {shared / 1024:.0f} MiB shared")
+    sys.stdout.flush()
+    sys.stdin.readline()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Customers in the table")
+    parser.add_argument("--dict-rows", type=int, default=100_000, help="Customers in the dict comparison")
+    parser.add_argument("--workers", type=int, default=0, help="Processes reading a snapshot file of the table")
+    parser.add_argument("--mapped-worker", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.mapped_worker:
+        mapped_worker(arguments.mapped_worker)
+        return
+
+    resident_before = resident_bytes()
+    started = time.perf_counter()
+    table = CustomerTable.from_records(synthetic_customers(arguments.rows))
+    build_seconds = time.perf_counter() - started
+    gc.collect()
+    resident = resident_bytes() - resident_before
+    print(
+        f"Customer table: {table.nbytes / len(table):.0f} bytes per customer in columns, "
+        f"{resident / len(table):.0f} bytes per customer resident ({len(table):,} rows, built in {build_seconds:.1f}s)"
+    )
+
+    tracemalloc.start()
+    customers = list(synthetic_customers(arguments.dict_rows))
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del customers
+    gc.collect()
+    print(f"Nested dicts: {dict_bytes / arguments.dict_rows:.0f} bytes per customer ({arguments.dict_rows:,} rows)")
+
+    names = [table[row].name for row in range(0, len(table), max(1, len(table) // 1000))]
+    started = time.perf_counter()
+    for name in names:
+        customer = table.find_by_name(name)
+        assert customer is not None
+        orjson.dumps(customer.to_dict())
+    print(f"Lookup and encoding: {(time.perf_counter() - started) / len(names) * 1e6:.1f} us")
+
+    if arguments.workers:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "customers.snapshot")
+            write_snapshot(table, path)
+            print(f"Snapshot file: {os.path.getsize(path) / len(table):.0f} bytes per customer")
+            del table
+            workers = [
+                subprocess.Popen(
+                    [sys.executable, __file__, "--mapped-worker", path],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    text=True,
+                )
+                for _ in range(arguments.workers)
+            ]
+            # Workers wait for a line on stdin before and after measuring, so all of them map the file meanwhile
+            for worker in workers:
+                assert worker.stdout is not None
+                worker.stdout.readline()
+            for worker in workers:
+                assert worker.stdin is not None
+                worker.stdin.write("\n")
+                worker.stdin.flush()
+            print(f"{arguments.workers} workers on the snapshot file:")
+            for worker in workers:
+                assert worker.stdout is not None
+                print(worker.stdout.readline(), end="")
+            for worker in workers:
+                worker.communicate("\n")
+
+
+if __name__ == "__main__":
+    main()
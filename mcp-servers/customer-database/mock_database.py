@@ -1141,22 +1141,3 @@ def get_customers_db() -> dict:
             ],
         },
     }
-
-
-def find_customer_by_name(name: str) -> dict:
-    """
-    Find a customer by name (case insensitive).
-
-    Args:
-        name: Customer name to search for
-
-    Returns:
-        Dictionary with status and customer data if found, or error if not found.
-    """
-    customers_db = get_customers_db()
-    customer_key = name.lower().strip()
-
-    if customer_key in customers_db:
-        return {"status": "success", "customer": customers_db[customer_key]}
-    else:
-        return {"status": "not_found", "message": "Customer not found in database. Please verify the name spelling."}
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Customer snapshot files, mapped into memory instead of loaded.
+
+A snapshot file holds the buffers of a `CustomerTable`, including the name index, at fixed offsets. Opening it maps
+the file and reads the columns in place: nothing is parsed or copied, so a snapshot of millions of customers opens
+in milliseconds. The pages belong to the page cache, so every process serving the same file, e.g. several workers,
+shares one copy of the data, and the memory per worker stays flat as workers are added.
+
+A snapshot file is built from a data file (or the mock database without `--source`):
+
+    uv run python snapshot_file.py customers.snapshot --source customers.jsonl
+
+CUSTOMER_DATA_FILE can point to a snapshot file like to any other data file. Replace it with a rename, e.g. by
+building it next to the served file: lookups still running on the old snapshot keep reading the old file.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+import orjson
+
+from customer_table import Buffer, CustomerTable
+
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_MAGIC = b"CST1"
+# Length of the JSON header after the magic, which maps every buffer to its offset, length and item format
+HEADER_LENGTH = struct.Struct("<I")
+# Buffers start at multiples of 8 bytes, so all typed arrays are aligned
+ALIGNMENT = 8
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_snapshot(table: CustomerTable, path: str) -> None:
+    """Write the table to a snapshot file, atomically replacing an existing file."""
+    buffers: dict[str, Buffer] = table.buffers()
+    sections: dict[str, tuple[int, int, str]] = {}
+    offset = 0
+    for name, buffer in buffers.items():
+        view = memoryview(buffer)
+        sections[name] = (offset, view.nbytes, view.format)
+        offset = _aligned(offset + view.nbytes)
+    header = orjson.dumps({"byteorder": sys.byteorder, "sections": sections})
+    data_start = _aligned(len(SNAPSHOT_MAGIC) + HEADER_LENGTH.size + len(header))
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(SNAPSHOT_MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+        for name, buffer in buffers.items():
+            file.seek(data_start + sections[name][0])
+            file.write(buffer)
+    os.replace(temporary_path, path)
+
+
+def open_snapshot(path: str) -> CustomerTable:
+    """A table reading from the mapped snapshot file. The mapping is closed with the last reference to the table."""
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    if view[: len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"Not a customer snapshot: {path}")
+    header_start = len(SNAPSHOT_MAGIC) + HEADER_LENGTH.size
+    (header_length,) = HEADER_LENGTH.unpack_from(view, len(SNAPSHOT_MAGIC))
+    header = orjson.loads(view[header_start : header_start + header_length])
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError(f"Snapshot {path} was written with {header['byteorder']} byte order")
+
+    if missing := CustomerTable().buffers().keys() - header["sections"].keys():
+        raise ValueError(f"Snapshot {path} lacks {sorted(missing)}, rebuild it with this version")
+
+    data_start = _aligned(header_start + header_length)
+    buffers = {
+        name: view[data_start + offset : data_start + offset + length].cast(item_format)
+        for name, (offset, length, item_format) in header["sections"].items()
+    }
+    return CustomerTable.from_buffers(buffers)
+
+
+if __name__ == "__main__":
+    from customer_store import load_customers
+
+    parser = argparse.ArgumentParser(description="Build a customer snapshot file")
+    parser.add_argument("path", help=f"Snapshot file to write, ending with {SNAPSHOT_SUFFIX}")
+    parser.add_argument("--source", help="Data file with the customers, the mock database if not set")
+    arguments = parser.parse_args()
+    if not arguments.path.endswith(SNAPSHOT_SUFFIX):
+        parser.error(f"The snapshot file name must end with {SNAPSHOT_SUFFIX}")
+
+    started = time.perf_counter()
+    table = CustomerTable.from_records(load_customers(arguments.source))
+    write_snapshot(table, arguments.path)
+    print(f"Wrote {len(table):,} customers to {arguments.path} in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,84 @@
+"""
+Metrics and span attributes of the tool calls.
+
+Every tool call is counted and its latency and response size are recorded in histograms, with the tool, the
+outcome ("hit" or "miss") and the match strategy as attributes, so dashboards can alert on the p99 latency and the
+hit ratio of every tool. The same values and the backend the lookup ran on are set on the tools/call span of
+FastMCP.
+
+Recording stays cheap on the hot path: the outcome is read from the start of the encoded response, the span
+attributes are only set when the span is sampled, and the calls are counted locally and read by the metric reader
+at export time. Only the two histograms go through the SDK on every call, about 4 microseconds each.
+"""
+
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable
+
+from opentelemetry import metrics, trace
+from opentelemetry.metrics import CallbackOptions, Observation
+
+# All responses of the tools are encoded with the status first
+_SUCCESS_PREFIX = '{"status":"success"'
+# Latency buckets in seconds, from cached lookups to fuzzy matches on a loaded server
+_DURATION_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+_SIZE_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+
+# Calls by tool, outcome and strategy
+_calls: Counter[tuple[str, str, str]] = Counter()
+_calls_lock = threading.Lock()
+
+
+def _observe_calls(options: CallbackOptions) -> Iterable[Observation]:
+    with _calls_lock:
+        calls = list(_calls.items())
+    return [
+        Observation(count, {"mcp.tool.name": tool, "outcome": outcome, "strategy": strategy})
+        for (tool, outcome, strategy), count in calls
+    ]
+
+
+_meter = metrics.get_meter(__name__)
+_meter.create_observable_counter(
+    "mcp.tool.calls", callbacks=[_observe_calls], description="Tool calls by tool, outcome and match strategy"
+)
+_duration = _meter.create_histogram(
+    "mcp.tool.duration",
+    unit="s",
+    description="Duration of the lookup and encoding of a tool call",
+    explicit_bucket_boundaries_advisory=_DURATION_BUCKETS,
+)
+_response_size = _meter.create_histogram(
+    "mcp.tool.response.size",
+    unit="By",
+    description="Size of the encoded tool response",
+    explicit_bucket_boundaries_advisory=_SIZE_BUCKETS,
+)
+
+
+def record_tool_call(
+    tool: str, started: float, response: str, backend: str, strategy: str, cache_hit: bool | None = None
+) -> None:
+    """Record a tool call that started at `started` (perf_counter) and returned `response`."""
+    seconds = time.perf_counter() - started
+    outcome = "hit" if response.startswith(_SUCCESS_PREFIX) else "miss"
+    size = len(response.encode())
+    with _calls_lock:
+        _calls[tool, outcome, strategy] += 1
+    attributes = {"mcp.tool.name": tool, "outcome": outcome, "strategy": strategy}
+    _duration.record(seconds, attributes)
+    _response_size.record(size, attributes)
+
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.set_attributes(
+            {
+                "lookup.backend": backend,
+                "lookup.strategy": strategy,
+                "lookup.outcome": outcome,
+                "lookup.response_bytes": size,
+            }
+        )
+        if cache_hit is not None:
+            span.set_attribute("lookup.cache_hit", cache_hit)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Python components.
+
+Measures how long `import main` takes in a component's virtual environment, with a breakdown of the import time
+by top-level package, and optionally the time until a started server reports ready.
+
+Usage (from the repository root, after `uv sync` in the component):
+
+    python scripts/startup_benchmark.py agents/claims-voice-agent
+    python scripts/startup_benchmark.py agents/claims-voice-agent --ready-url http://localhost:8000/ready \\
+        -- uvicorn main:app --port 8000
+"""
+
+import argparse
+import collections
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_breakdown(component: str, python: str) -> tuple[float, collections.Counter, list[tuple[str, int]]]:
+    """Wall time of `import main`, self time per top-level package and cumulative time of main's imports (us)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", "import main"], cwd=component, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"import main failed:\n{result.stderr[-2000:]}")
+
+    by_package: collections.Counter = collections.Counter()
+    direct_imports = []
+    for line in result.stderr.splitlines():
+        if not (match := IMPORT_TIME_LINE.match(line)):
+            continue
+        self_us, cumulative_us, indent, module = int(match[1]), int(match[2]), len(match[3]), match[4]
+        by_package[module.split(".")[0]] += self_us
+        # Modules imported by main itself are indented by three spaces
+        if indent == 3:
+            direct_imports.append((module, cumulative_us))
+    return wall, by_package, direct_imports
+
+
+def time_to_ready(component: str, python: str, command: list[str], url: str, timeout: float) -> float:
+    """Seconds from starting the server command until the readiness URL returns 200."""
+    executable = os.path.join(os.path.dirname(python), command[0])
+    if os.path.exists(executable):
+        command = [executable, *command[1:]]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=component, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                sys.exit(f"Server exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                pass
+            time.sleep(0.05)
+        sys.exit(f"Not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("component", help="Component directory with main.py and a .venv")
+    parser.add_argument("--runs", type=int, default=3, help="Number of import measurements")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages in the breakdown")
+    parser.add_argument("--ready-url", help="Readiness URL to poll after starting the server command")
+    parser.add_argument("--timeout", type=float, default=120, help="Maximum wait for readiness in seconds")
+    # The server command follows "--" and runs in the component directory
+    argv = sys.argv[1:]
+    split = argv.index("--") if "--" in argv else len(argv)
+    arguments = parser.parse_args(argv[:split])
+    command = argv[split + 1 :]
+
+    python = os.path.join(arguments.component, ".venv", "bin", "python")
+    if not os.path.exists(python):
+        sys.exit(f"No virtual environment in {arguments.component}, run `uv sync` there first")
+    python = os.path.abspath(python)
+
+    runs = [import_breakdown(arguments.component, python) for _ in range(arguments.runs)]
+    walls = sorted(run[0] for run in runs)
+    _, by_package, direct_imports = runs[-1]
+    print(f"import main: median {walls[len(walls) // 2]:.2f}s, min {walls[0]:.2f}s over {len(walls)} runs")
+    print(f"\nSelf import time by package (last run, total {sum(by_package.values()) / 1e6:.2f}s):")
+    for package, microseconds in by_package.most_common(arguments.top):
+        print(f"  {microseconds / 1000:9.1f} ms  {package}")
+    print("\nCumulative import time of the modules imported by main:")
+    for module, microseconds in sorted(direct_imports, key=lambda item: -item[1])[: arguments.top]:
+        print(f"  {microseconds / 1000:9.1f} ms  {module}")
+
+    if arguments.ready_url:
+        if not command:
+            sys.exit("--ready-url needs a server command after --")
+        seconds = time_to_ready(arguments.component, python, command, arguments.ready_url, arguments.timeout)
+        print(f"\nTime to ready: {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()